@@ -0,0 +1,58 @@
+"""Gunicorn settings for production.
+
+ASGI (recommended with ASYNC_VIEWS=True):
+
+    pip install -r requirements-prod.txt
+    gunicorn ticketing_platform.asgi:application -c gunicorn.conf.py
+
+WSGI:
+
+    GUNICORN_WORKER_CLASS=gthread gunicorn ticketing_platform.wsgi:application -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+import signal
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+# Only used by the gthread worker class.
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Load the app once in the master and warm it before forking, so workers
+# start with imports done and templates compiled. Code changes then need a
+# full restart rather than a HUP.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0') == '1'
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+# Replace each worker after this many requests (0 = never), with jitter so
+# they do not all restart at once. Bounds slow memory growth; see also
+# MEMORY_RECYCLE_RSS_MB, which replaces only workers that have grown.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 50))
+
+
+def when_ready(server):
+    if preload_app:
+        from django.conf import settings
+        from tickets import warmup
+        if settings.WARMUP:
+            warmup.run(pre_fork=True)
+
+
+def post_worker_init(worker):
+    from django.conf import settings
+    from tickets import memory, warmup
+
+    # tickets.memory.recycle() asks for a graceful restart: the worker
+    # finishes its requests and the arbiter starts a fresh one.
+    memory.set_recycler(lambda: os.kill(worker.pid, signal.SIGTERM))
+    if settings.WARMUP:
+        # After a preloaded warmup this finds the work already done.
+        warmup.run()
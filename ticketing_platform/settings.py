@@ -42,14 +42,24 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tickets.middleware.RequestTimerMiddleware',
+    'tickets.middleware.SlowQueryMiddleware',
+    'tickets.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'tickets.middleware.StaticAssetsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tickets.middleware.MemoryMiddleware',
+    'tickets.middleware.SessionEpochMiddleware',
+    'tickets.middleware.ViewerMiddleware',
+    'tickets.middleware.AdmissionControlMiddleware',
+    'tickets.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'tickets.middleware.RatelimitMiddleware',
+    'tickets.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'ticketing_platform.urls'
@@ -69,8 +79,112 @@ TEMPLATES = [
     },
 ]
 
+# Render the hot row templates (ticket list and dashboard tables, comment
+# threads) with Jinja2 instead of the Django engine; needs the Jinja2
+# package. See tickets.jinja_env. Compiled templates are cached as bytecode
+# in JINJA2_BYTECODE_DIR.
+HOT_TEMPLATE_ENGINE = config('HOT_TEMPLATE_ENGINE', default='django')  # 'django' or 'jinja2'
+JINJA2_BYTECODE_DIR = config('JINJA2_BYTECODE_DIR', default=str(BASE_DIR / 'jinja2_cache'))
+if HOT_TEMPLATE_ENGINE == 'jinja2':
+    TEMPLATES.append({
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {'environment': 'tickets.jinja_env.environment'},
+    })
+
 WSGI_APPLICATION = 'ticketing_platform.wsgi.application'
 
+# Serve the dashboard and ticket detail from tickets.async_views, which run
+# their independent queries concurrently. Best under ASGI (see
+# gunicorn.conf.py); under WSGI each request gets its own event loop.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Live updates over Server-Sent Events (tickets.events). Needs an ASGI server.
+LIVE_UPDATES = config('LIVE_UPDATES', default=False, cast=bool)
+LIVE_UPDATES_MAX_CONNECTIONS = config('LIVE_UPDATES_MAX_CONNECTIONS', default=200, cast=int)  # per worker
+LIVE_UPDATES_POLL_INTERVAL = 1.0  # seconds between checks for new events
+LIVE_UPDATES_KEEPALIVE = 15  # seconds between keepalive comments
+LIVE_UPDATES_MAX_SECONDS = 300  # streams are recycled after this; clients reconnect
+LIVE_UPDATES_RETRY_MS = 3000  # browser reconnect delay
+
+# Concurrent requests for the same expensive shared read (the employee
+# dashboard's global queries) share one computation; see tickets.singleflight.
+# A result is served for SINGLEFLIGHT_STALE_SECONDS after it was computed
+# while a background refresh runs, at most one per key every
+# SINGLEFLIGHT_REFRESH_INTERVAL seconds. SINGLEFLIGHT_SHARED also coalesces
+# across worker processes through a lock in the shared cache.
+SINGLEFLIGHT_STALE_SECONDS = config('SINGLEFLIGHT_STALE_SECONDS', default=0, cast=float)
+SINGLEFLIGHT_REFRESH_INTERVAL = config('SINGLEFLIGHT_REFRESH_INTERVAL', default=1.0, cast=float)
+SINGLEFLIGHT_SHARED = config('SINGLEFLIGHT_SHARED', default=False, cast=bool)
+SINGLEFLIGHT_LOCK_TIMEOUT = 10  # seconds a worker waits for another's result
+
+# Read-through cache for Ticket objects (tickets.ticket_cache): an in-process
+# LRU in front of the shared cache, invalidated by a per-ticket version.
+TICKET_CACHE = config('TICKET_CACHE', default=False, cast=bool)
+TICKET_CACHE_LOCAL_SIZE = config('TICKET_CACHE_LOCAL_SIZE', default=1000, cast=int)  # tickets per worker
+TICKET_CACHE_TIMEOUT = 300  # seconds an entry is kept in the shared cache
+
+# Prometheus metrics at /metrics/, served only to requests that send
+# "Authorization: Bearer <METRICS_TOKEN>". Empty disables the endpoint.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Admission control (tickets.admission): at most ADMISSION_MAX_CONCURRENT
+# requests run at once per worker, up to ADMISSION_MAX_QUEUE more wait by
+# priority, and the rest get a 503 with Retry-After. Employee writes come
+# first, then other writes and employee reads, then user reads; anonymous
+# and polling reads come last.
+ADMISSION_CONTROL = config('ADMISSION_CONTROL', default=False, cast=bool)
+ADMISSION_MAX_CONCURRENT = config('ADMISSION_MAX_CONCURRENT', default=8, cast=int)
+ADMISSION_MAX_QUEUE = config('ADMISSION_MAX_QUEUE', default=32, cast=int)
+ADMISSION_QUEUE_TIMEOUT = config('ADMISSION_QUEUE_TIMEOUT', default=2.0, cast=float)  # seconds
+ADMISSION_RETRY_AFTER = 5  # seconds, sent with 503s
+# Long-lived streams and the metrics scrape are never queued or shed.
+ADMISSION_EXEMPT_ROUTES = ('ticket_events', 'queue_events', 'metrics')
+# Reads that regular users repeat in the background.
+ADMISSION_BACKGROUND_ROUTES = ('dashboard',)
+
+# Request profiling (tickets.profiling): superusers add "X-Profile: 1" or
+# "?_profile=1" to profile one request, and PROFILING_SAMPLE_RATE profiles a
+# share of all traffic. Profiles are browsable under Request profiles in the admin.
+PROFILING = config('PROFILING', default=False, cast=bool)
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+PROFILING_DIR = config('PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILING_MAX_PROFILES = config('PROFILING_MAX_PROFILES', default=200, cast=int)
+
+# Slow-query log (tickets.slow_queries): statements taking SLOW_QUERY_MS or
+# longer are written to logs/slow_queries.log and aggregated, with their
+# EXPLAIN QUERY PLAN, under Slow queries in the admin.
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=False, cast=bool)
+SLOW_QUERY_MS = config('SLOW_QUERY_MS', default=100, cast=float)
+
+# Warm each gunicorn worker (URL resolvers, templates, forms, translations)
+# before it accepts requests; see tickets.warmup and gunicorn.conf.py.
+WARMUP = config('WARMUP', default=True, cast=bool)
+
+# Memory instrumentation (tickets.memory): tracemalloc tracing with per-request
+# peak allocations in the metrics, and snapshots in MEMORY_SNAPSHOT_DIR for
+# `manage.py memory_report`. Tracing is slow; enable it to investigate growth.
+MEMORY_PROFILING = config('MEMORY_PROFILING', default=False, cast=bool)
+MEMORY_TRACE_FRAMES = config('MEMORY_TRACE_FRAMES', default=10, cast=int)
+MEMORY_SNAPSHOT_DIR = config('MEMORY_SNAPSHOT_DIR', default=str(BASE_DIR / 'memory'))
+MEMORY_MAX_SNAPSHOTS = config('MEMORY_MAX_SNAPSHOTS', default=20, cast=int)
+MEMORY_REQUEST_PEAK_WARN_MB = config('MEMORY_REQUEST_PEAK_WARN_MB', default=50, cast=float)
+# Replace a worker once its resident memory passes this many MB (0 = never).
+MEMORY_RECYCLE_RSS_MB = config('MEMORY_RECYCLE_RSS_MB', default=0, cast=int)
+
+# Compress text responses, streaming ones included, with brotli, zstd or gzip
+# (tickets.compression). Bodies smaller than this are sent as they are.
+RESPONSE_COMPRESSION = config('RESPONSE_COMPRESSION', default=True, cast=bool)
+RESPONSE_COMPRESSION_MIN_BYTES = config('RESPONSE_COMPRESSION_MIN_BYTES', default=1024, cast=int)
+
+# Admin for large tables (tickets.scalable_admin): estimated and capped
+# changelist counts, indexed search, and ticket inlines limited to the latest
+# ADMIN_INLINE_LIMIT comments and attachments.
+ADMIN_SCALABLE = config('ADMIN_SCALABLE', default=False, cast=bool)
+ADMIN_COUNT_LIMIT = config('ADMIN_COUNT_LIMIT', default=10000, cast=int)
+ADMIN_INLINE_LIMIT = config('ADMIN_INLINE_LIMIT', default=20, cast=int)
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -79,9 +193,119 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {},
     }
 }
 
+# SQLite production profile: WAL journal plus tuned pragmas, applied to every
+# new connection by tickets.sqlite.configure_connection.
+SQLITE_PRODUCTION = config('SQLITE_PRODUCTION', default=False, cast=bool)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=5000, cast=int),  # ms
+    'synchronous': 'normal',
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),  # bytes
+    'cache_size': -config('SQLITE_CACHE_SIZE_KB', default=64 * 1024, cast=int),  # negative = KiB
+    'temp_store': 'memory',
+}
+# Queue writes from concurrent requests in the same worker instead of letting
+# them fail with "database is locked".
+SQLITE_WRITE_SERIALIZATION = config('SQLITE_WRITE_SERIALIZATION', default=False, cast=bool)
+SQLITE_WRITE_LOCK_TIMEOUT = config('SQLITE_WRITE_LOCK_TIMEOUT', default=10, cast=float)  # seconds
+
+if SQLITE_PRODUCTION:
+    # Take the write lock when a transaction starts, so waiting writers go
+    # through busy_timeout instead of failing on a lock upgrade.
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+# Read replicas: comma-separated SQLite file paths kept in sync with the
+# primary (e.g. with `manage.py refresh_replicas`). Reads from the apps below
+# are spread across healthy replicas by tickets.routers.ReplicaRouter.
+DATABASE_REPLICAS = config('DATABASE_REPLICAS', default='', cast=Csv())
+DATABASE_REPLICA_ALIASES = []
+for _index, _path in enumerate(DATABASE_REPLICAS, start=1):
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICA_ALIASES.append(_alias)
+DATABASE_REPLICA_APPS = ['tickets', 'auth']
+# A replica further behind the primary than this is skipped until refreshed.
+DATABASE_REPLICA_MAX_LAG = config('DATABASE_REPLICA_MAX_LAG', default=30, cast=float)  # seconds
+DATABASE_REPLICA_CHECK_INTERVAL = 5  # seconds between replica health checks
+# After a write, the same browser reads from the primary for this long so
+# users see their own new tickets and comments.
+DATABASE_REPLICA_PIN_SECONDS = config('DATABASE_REPLICA_PIN_SECONDS', default=DATABASE_REPLICA_MAX_LAG, cast=float)
+
+# Optional sharding: comma-separated SQLite files. Tickets, with their
+# comments and attachments, are partitioned across them by a hash of the
+# ticket UUID; users and sessions stay on the primary. Create each shard
+# with `manage.py migrate --database=shard_N`, then `manage.py
+# sync_shard_users` to copy existing users.
+TICKET_SHARDS = config('TICKET_SHARDS', default='', cast=Csv())
+TICKET_SHARD_ALIASES = []
+for _index, _path in enumerate(TICKET_SHARDS):
+    _alias = f'shard_{_index}'
+    DATABASES[_alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': _path,
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+    }
+    TICKET_SHARD_ALIASES.append(_alias)
+
+DATABASE_ROUTERS = ['tickets.routers.ShardRouter', 'tickets.routers.ReplicaRouter']
+
+
+# Authentication backends. ProfileModelBackend loads the Profile together
+# with the user. ModelBackend stays so sessions created before the switch
+# remain valid; it can be dropped once those have expired.
+AUTHENTICATION_BACKENDS = [
+    'tickets.backends.ProfileModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+
+# Cache. The default is per-process; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared cache (e.g. django.core.cache.backends.redis.RedisCache) when running
+# several workers.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+
+# Sessions: 'db' (Django's default), 'cached_db' (reads served from CACHES,
+# writes go through to the database) or 'signed_cookies' (no server-side
+# storage at all). See tickets.sessions for how logout and role changes
+# invalidate sessions in each mode.
+SESSION_MODE = config('SESSION_MODE', default='db')
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_MODE]
+# Flash messages always travel in a cookie, so messages.success() after a POST
+# never writes the session.
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+
+# Rate limiting (tickets.ratelimit): sliding-window limits per user (or per IP
+# before login) and per endpoint. 'database' keeps the counters in the primary
+# database so every worker shares them; 'cache' uses CACHES, which is only
+# shared across workers with a backend such as Redis.
+RATELIMIT_ENABLE = config('RATELIMIT_ENABLE', default=True, cast=bool)
+RATELIMIT_BACKEND = config('RATELIMIT_BACKEND', default='database')
+RATELIMITS = {
+    'login': config('RATELIMIT_LOGIN', default='5/m'),
+    'register': config('RATELIMIT_REGISTER', default='5/m'),
+    'ticket_create': config('RATELIMIT_TICKET_CREATE', default='10/m'),
+    'comment': config('RATELIMIT_COMMENT', default='30/m'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -118,6 +342,21 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Self-hosted static pipeline (tickets.static_pipeline). STATIC_VENDORED
+# loads Bootstrap and its icons from the pruned local bundle built by
+# `manage.py build_static` instead of the CDN. STATIC_MANIFEST makes
+# collectstatic write content-hashed names plus gzip/brotli variants, which
+# SERVE_STATIC serves from STATIC_ROOT with year-long immutable caching.
+STATIC_VENDORED = config('STATIC_VENDORED', default=False, cast=bool)
+STATIC_MANIFEST = config('STATIC_MANIFEST', default=False, cast=bool)
+SERVE_STATIC = config('SERVE_STATIC', default=False, cast=bool)
+if STATIC_MANIFEST:
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'tickets.static_pipeline.CompressedManifestStaticFilesStorage'},
+    }
 
 # Media files (User uploads)
 MEDIA_URL = '/media/'
@@ -127,6 +366,21 @@ MEDIA_ROOT = BASE_DIR / 'media'
 ALLOWED_ATTACHMENT_EXTENSIONS = ['.png', '.jpeg', '.jpg', '.pdf', '.docx', '.doc', '.xlsx', '.xls', '.har', '.csv']
 MAX_ATTACHMENT_SIZE = 5 * 1024 * 1024  # 5 MB
 
+# Archive tier (see `manage.py archive_tickets`)
+ARCHIVE_AFTER_DAYS = config('ARCHIVE_AFTER_DAYS', default=90, cast=int)
+ARCHIVE_STATUSES = ['resolved', 'closed']
+ARCHIVE_BATCH_SIZE = config('ARCHIVE_BATCH_SIZE', default=500, cast=int)
+
+# Retention (see `manage.py purge_tickets` and `manage.py reconcile_media`).
+# Tickets in one of `statuses` not updated for `days` are deleted, from both
+# the hot and the archive tables, together with their attachment files.
+TICKET_RETENTION_POLICIES = [
+    {'statuses': ['closed'], 'days': config('RETENTION_CLOSED_DAYS', default=730, cast=int)},
+]
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=200, cast=int)
+# Media files younger than this are never treated as orphans (uploads in flight).
+RETENTION_ORPHAN_GRACE_HOURS = 24
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/6.0/ref/settings/#default-auto-field
 
@@ -201,6 +455,14 @@ LOGGING = {
             'backupCount': 5,
             'formatter': 'verbose',
         },
+        'slow_query_file': {
+            'level': 'WARNING',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOGS_DIR / 'slow_queries.log',
+            'maxBytes': 1024 * 1024 * 10,  # 10 MB
+            'backupCount': 5,
+            'formatter': 'verbose',
+        },
     },
     'loggers': {
         'django': {
@@ -223,6 +485,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'tickets.slow_queries': {
+            'handlers': ['slow_query_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
         'django.db.backends': {
             'handlers': ['debug_console'],
             'level': 'DEBUG',
@@ -235,6 +502,25 @@ LOGGING = {
     },
 }
 
+# LOG_MODE=queue moves log formatting and file I/O (including rotation) off
+# the request thread: each handler below is wrapped by tickets.log.queue_handler,
+# which writes JSON lines from a background thread and samples or drops
+# records instead of blocking when it falls behind.
+LOG_MODE = config('LOG_MODE', default='sync')
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_QUEUE_SAMPLE_RATE = 0.1  # share of sub-WARNING records kept once the queue is 80% full
+
+if LOG_MODE == 'queue':
+    for name in ('console', 'file', 'error_file', 'security_file', 'slow_query_file'):
+        handler = LOGGING['handlers'][name]
+        LOGGING['handlers'][name] = {
+            '()': 'tickets.log.queue_handler',
+            'level': handler['level'],
+            'handler': handler,
+            'queue_size': LOG_QUEUE_SIZE,
+            'sample_rate': LOG_QUEUE_SAMPLE_RATE,
+        }
+
 # Production security settings (only active when DEBUG=False)
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
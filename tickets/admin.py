@@ -1,18 +1,34 @@
-from django.contrib import admin
-from .models import Profile, Ticket, Comment, Attachment
+from django.contrib import admin, messages
+from django.urls import reverse
+from django.utils.html import format_html
+from . import profiling
+from .models import Profile, Ticket, Comment, Attachment, ArchivedTicket, ArchivedComment, RequestProfile, SlowQuery
+from .scalable_admin import LatestRowsInlineMixin, ScalableAdminMixin, bulk_update
 
 
-class CommentInline(admin.TabularInline):
+class CommentInline(LatestRowsInlineMixin, admin.TabularInline):
     model = Comment
     extra = 0
     readonly_fields = ('author', 'created_at')
+    parent_field = 'ticket'
+    latest_ordering = ('-created_at',)
 
 
-class AttachmentInline(admin.TabularInline):
+class AttachmentInline(LatestRowsInlineMixin, admin.TabularInline):
     model = Attachment
     extra = 0
     readonly_fields = ('original_filename', 'file_size', 'uploaded_by', 'uploaded_at')
     fields = ('file', 'original_filename', 'file_size', 'uploaded_by', 'uploaded_at')
+    parent_field = 'ticket'
+
+
+def _status_action(status, label):
+    @admin.action(permissions=['change'], description=f'Mark selected tickets as {label.lower()}')
+    def action(modeladmin, request, queryset):
+        count = bulk_update(queryset, status=status)
+        modeladmin.message_user(request, f'{count} ticket(s) marked as {label.lower()}.', messages.SUCCESS)
+    action.__name__ = f'mark_{status}'
+    return action
 
 
 @admin.register(Profile)
@@ -23,25 +39,152 @@ class ProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'title', 'status', 'priority', 'created_by', 'assigned_to', 'created_at')
     list_filter = ('status', 'priority', 'created_at')
+    list_select_related = ('created_by', 'assigned_to')
     search_fields = ('title', 'description', 'created_by__username')
-    readonly_fields = ('created_at', 'updated_at')
+    prefix_search_fields = ('title',)
+    user_search_fields = ('created_by', 'assigned_to')
+    exact_search_fields = ('id',)
+    scalable_search_help_text = 'Title prefix, exact username of the creator or assignee, or ticket ID.'
+    autocomplete_fields = ('created_by', 'assigned_to')
+    readonly_fields = ('created_at', 'updated_at', 'all_comments', 'all_attachments')
     inlines = [CommentInline, AttachmentInline]
+    actions = [*(_status_action(status, label) for status, label in Ticket.STATUS_CHOICES), 'unassign']
+
+    @admin.action(permissions=['change'], description='Unassign selected tickets')
+    def unassign(self, request, queryset):
+        count = bulk_update(queryset, assigned_to=None)
+        self.message_user(request, f'{count} ticket(s) unassigned.', messages.SUCCESS)
+
+    def _all_link(self, obj, model, noun):
+        if obj is None or obj._state.adding:
+            return '-'
+        count = model.objects.using(obj._state.db).filter(ticket=obj).count()
+        url = reverse(f'admin:tickets_{model._meta.model_name}_changelist')
+        return format_html('<a href="{}?ticket={}">View all {} {}</a>', url, obj.pk, f'{count:,}', noun)
+
+    @admin.display(description='Comments')
+    def all_comments(self, obj):
+        return self._all_link(obj, Comment, 'comments')
+
+    @admin.display(description='Attachments')
+    def all_attachments(self, obj):
+        return self._all_link(obj, Attachment, 'attachments')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('ticket', 'author', 'is_internal', 'created_at')
     list_filter = ('is_internal', 'created_at')
+    list_select_related = ('ticket', 'author')
     search_fields = ('body', 'author__username')
+    user_search_fields = ('author',)
+    exact_search_fields = ('id', 'ticket')
+    scalable_search_help_text = 'Exact username of the author, comment ID or ticket ID.'
+    autocomplete_fields = ('ticket', 'author')
     readonly_fields = ('created_at',)
 
 
 @admin.register(Attachment)
-class AttachmentAdmin(admin.ModelAdmin):
+class AttachmentAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('original_filename', 'ticket', 'comment', 'uploaded_by', 'file_size', 'uploaded_at')
     list_filter = ('uploaded_at',)
+    list_select_related = ('ticket', 'comment__author', 'comment__ticket', 'uploaded_by')
     search_fields = ('original_filename', 'uploaded_by__username')
+    user_search_fields = ('uploaded_by',)
+    exact_search_fields = ('id', 'ticket', 'comment')
+    scalable_search_help_text = 'Exact username of the uploader, attachment ID, ticket ID or comment ID.'
+    autocomplete_fields = ('ticket', 'comment')
     readonly_fields = ('original_filename', 'file_size', 'uploaded_by', 'uploaded_at')
+
+
+class ReadOnlyAdminMixin:
+    """Archive rows are written only by `manage.py archive_tickets`."""
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class ArchivedCommentInline(ReadOnlyAdminMixin, admin.TabularInline):
+    model = ArchivedComment
+    extra = 0
+    fields = ('author', 'body', 'is_internal', 'created_at')
+
+
+@admin.register(ArchivedTicket)
+class ArchivedTicketAdmin(ReadOnlyAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'title', 'status', 'priority', 'created_by', 'assigned_to', 'created_at', 'archived_at')
+    list_filter = ('status', 'priority', 'archived_at')
+    search_fields = ('title', 'created_by__username')
+    inlines = [ArchivedCommentInline]
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Profiles are written by ProfilingMiddleware; they can be viewed and deleted."""
+
+    list_display = ('created_at', 'method', 'path', 'view_name', 'username', 'status_code', 'duration_ms', 'trigger')
+    list_filter = ('trigger', 'view_name', 'method')
+    search_fields = ('path', 'username')
+    fields = ('created_at', 'method', 'path', 'view_name', 'username', 'status_code', 'duration_ms', 'trigger',
+              'call_tree', 'hot_functions')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def _render(self, obj, render):
+        try:
+            stats = profiling.load(obj)
+        except (OSError, EOFError):
+            return 'The profile file is missing.'
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', render(stats))
+
+    @admin.display(description='Call tree (by cumulative time)')
+    def call_tree(self, obj):
+        return self._render(obj, profiling.call_tree)
+
+    @admin.display(description='Functions by own time')
+    def hot_functions(self, obj):
+        return self._render(obj, profiling.hot_functions)
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    """Slow statements aggregated by fingerprint, worst total time first."""
+
+    list_display = ('short_sql', 'count', 'total_ms', 'average_ms', 'max_ms', 'full_scan', 'view_name', 'last_seen')
+    list_filter = ('full_scan', 'database', 'view_name')
+    search_fields = ('normalized_sql', 'call_site')
+    fields = ('normalized_sql', 'fingerprint', 'database', 'view_name', 'call_site', 'count', 'total_ms', 'max_ms',
+              'first_seen', 'last_seen', 'full_scan', 'query_plan', 'example_sql', 'example_params')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='SQL')
+    def short_sql(self, obj):
+        return obj.normalized_sql[:120]
+
+    @admin.display(description='Average ms')
+    def average_ms(self, obj):
+        return round(obj.total_ms / obj.count, 1)
+
+    @admin.display(description='EXPLAIN QUERY PLAN')
+    def query_plan(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.plan or '-')
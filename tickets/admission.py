@@ -0,0 +1,134 @@
+"""Per-worker admission control (``ADMISSION_CONTROL``).
+
+At most ``ADMISSION_MAX_CONCURRENT`` requests run at once in a worker.
+Others wait in a queue of ``ADMISSION_MAX_QUEUE`` slots, ordered by
+priority and then by arrival. When the queue is full, a newcomer that
+outranks the lowest waiter takes its slot and the waiter is shed. Otherwise
+the newcomer itself is shed. A request that waits longer than
+``ADMISSION_QUEUE_TIMEOUT`` is shed too. Shed requests get a 503 at once
+instead of queueing behind work the worker cannot finish in time.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from . import metrics
+
+# Lower numbers are admitted first.
+EMPLOYEE_WRITE = 0
+WRITE = 1  # other writes, and employee reads
+READ = 2
+BACKGROUND = 3  # anonymous reads, and polling reads from regular users
+
+PRIORITY_NAMES = {EMPLOYEE_WRITE: 'employee_write', WRITE: 'write', READ: 'read', BACKGROUND: 'background'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def route_name(request):
+    try:
+        return resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+
+
+def request_priority(request):
+    """Return the request's priority, or None if it is exempt from admission control."""
+    route = route_name(request)
+    if route in settings.ADMISSION_EXEMPT_ROUTES:
+        return None
+    is_write = request.method not in SAFE_METHODS
+    if request.viewer.is_employee:
+        return EMPLOYEE_WRITE if is_write else WRITE
+    if is_write:
+        return WRITE
+    if not request.user.is_authenticated or route in settings.ADMISSION_BACKGROUND_ROUTES:
+        return BACKGROUND
+    if request.headers.get('HX-Request') == 'true':
+        return BACKGROUND
+    return READ
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'shed')
+
+    def __init__(self, priority, seq):
+        self.priority = priority
+        self.seq = seq
+        self.shed = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdmissionController:
+    def __init__(self, limit, queue_size):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.active = 0
+        self._waiting = []  # heap of _Waiter
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    def acquire(self, priority, timeout):
+        """Wait up to ``timeout`` seconds for a slot; return False if the request is shed."""
+        with self._cond:
+            if self.active < self.limit and not self._waiting:
+                self.active += 1
+                return True
+
+            if len(self._waiting) >= self.queue_size:
+                lowest = max(self._waiting, default=None)
+                if lowest is None or lowest.priority <= priority:
+                    _shed(priority, 'queue_full')
+                    return False
+                lowest.shed = True
+                self._remove(lowest)
+                _shed(lowest.priority, 'displaced')
+
+            waiter = _Waiter(priority, next(self._seq))
+            heapq.heappush(self._waiting, waiter)
+            deadline = time.monotonic() + timeout
+            while True:
+                if waiter.shed:
+                    return False
+                if self.active < self.limit and self._waiting[0] is waiter:
+                    heapq.heappop(self._waiting)
+                    self.active += 1
+                    # Another slot may be free for the next waiter too.
+                    self._cond.notify_all()
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(waiter)
+                    _shed(priority, 'timeout')
+                    return False
+                self._cond.wait(remaining)
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    def _remove(self, waiter):
+        # Called with the condition held; wakes the others so the new head can run.
+        self._waiting.remove(waiter)
+        heapq.heapify(self._waiting)
+        self._cond.notify_all()
+
+
+def _shed(priority, reason):
+    metrics.incr('admission_shed_total', priority=PRIORITY_NAMES[priority], reason=reason)
+
+
+controller = AdmissionController(settings.ADMISSION_MAX_CONCURRENT, settings.ADMISSION_MAX_QUEUE)
+
+metrics.register_gauge('admission_active_requests', lambda: controller.active)
+metrics.register_gauge('admission_queue_depth', lambda: controller.queue_depth)
@@ -0,0 +1,33 @@
+"""Helpers for running blocking ORM work from async code."""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .profiling import profiled_thread
+
+
+def _with_own_connection(func):
+    def run():
+        try:
+            return profiled_thread(func)
+        finally:
+            # Worker threads are not request threads; nothing else would
+            # close their connections.
+            close_old_connections()
+    return run
+
+
+async def run_query(func):
+    """Run the blocking callable ``func`` on its own worker thread.
+
+    Unlike Django's async ORM methods, which all share one thread, calls
+    made this way can overlap.
+    """
+    return await sync_to_async(_with_own_connection(func), thread_sensitive=False)()
+
+
+async def run_queries(queries):
+    """Run ``{name: callable}`` concurrently and return ``{name: result}``."""
+    results = await asyncio.gather(*(run_query(query) for query in queries.values()))
+    return dict(zip(queries, results))
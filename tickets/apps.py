@@ -3,3 +3,22 @@ from django.apps import AppConfig
 
 class TicketsConfig(AppConfig):
     name = 'tickets'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+        from . import memory
+        from .slow_queries import install_wrapper
+        from .sqlite import configure_connection
+        from . import sharding  # noqa: F401  (registers the shard user-sync signals)
+        from . import sessions  # noqa: F401  (registers the session epoch signals and checks)
+        from . import events  # noqa: F401  (registers the live update signals)
+        from . import ticket_cache  # noqa: F401  (registers the ticket cache invalidation signals)
+        from . import profiling  # noqa: F401  (removes profile files with their rows)
+
+        connection_created.connect(configure_connection, dispatch_uid='tickets.sqlite.configure_connection')
+        connection_created.connect(install_wrapper, dispatch_uid='tickets.slow_queries.install_wrapper')
+
+        if settings.MEMORY_PROFILING:
+            # As early as possible, so module-level allocations are traced too.
+            memory.start()
@@ -0,0 +1,78 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Ticket, Comment, Attachment, ArchivedTicket, ArchivedComment, ArchivedAttachment,
+)
+
+logger = logging.getLogger(__name__)
+
+TICKET_FIELDS = ('id', 'title', 'description', 'status', 'priority', 'created_by_id',
+                 'assigned_to_id', 'created_at', 'updated_at')
+COMMENT_FIELDS = ('id', 'ticket_id', 'author_id', 'body', 'is_internal', 'created_at')
+ATTACHMENT_FIELDS = ('id', 'ticket_id', 'comment_id', 'file', 'original_filename', 'file_size',
+                     'uploaded_by_id', 'uploaded_at')
+
+
+def archivable_tickets(older_than_days=None, using='default'):
+    """Return closed tickets with no activity in the last ``older_than_days`` days.
+
+    ``updated_at`` stands in for the close date; tickets that received a
+    comment after the cutoff are kept hot.
+    """
+    if older_than_days is None:
+        older_than_days = settings.ARCHIVE_AFTER_DAYS
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return (
+        Ticket.objects.using(using)
+        .filter(status__in=settings.ARCHIVE_STATUSES, updated_at__lt=cutoff)
+        .exclude(comments__created_at__gte=cutoff)
+        .order_by('updated_at')
+    )
+
+
+def archive_batch(ticket_ids, using='default'):
+    """Move one batch of tickets, with comments and attachment rows, into the archive.
+
+    Runs in a single short transaction. Attachment files stay where they are;
+    the archived rows point at the same storage paths.
+    """
+    with transaction.atomic(using=using):
+        tickets = Ticket.objects.using(using).filter(pk__in=ticket_ids)
+        comments = Comment.objects.using(using).filter(ticket_id__in=ticket_ids)
+        attachments = Attachment.objects.using(using).filter(
+            Q(ticket_id__in=ticket_ids) | Q(comment__ticket_id__in=ticket_ids)
+        )
+
+        ArchivedTicket.objects.using(using).bulk_create(
+            ArchivedTicket(**row) for row in tickets.values(*TICKET_FIELDS)
+        )
+        ArchivedComment.objects.using(using).bulk_create(
+            ArchivedComment(**row) for row in comments.values(*COMMENT_FIELDS)
+        )
+        ArchivedAttachment.objects.using(using).bulk_create(
+            ArchivedAttachment(**row) for row in attachments.values(*ATTACHMENT_FIELDS)
+        )
+
+        # Cascades to the hot comments and attachments.
+        deleted, _ = tickets.delete()
+    return deleted
+
+
+def archive_tickets(older_than_days=None, batch_size=None, using='default'):
+    """Archive every eligible ticket in batches; yields the size of each batch."""
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    while True:
+        ticket_ids = list(
+            archivable_tickets(older_than_days, using).values_list('pk', flat=True)[:batch_size]
+        )
+        if not ticket_ids:
+            return
+        archive_batch(ticket_ids, using)
+        logger.info('Archived %d tickets on %s', len(ticket_ids), using)
+        yield len(ticket_ids)
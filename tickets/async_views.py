@@ -0,0 +1,136 @@
+"""Async versions of the hot read views, enabled with ``ASYNC_VIEWS``.
+
+Django's async ORM methods all run on one shared thread, so awaiting several
+of them with ``asyncio.gather`` still runs the queries one after another.
+The independent queries here go through ``tickets.aio.run_queries``
+instead, which gives each its own worker thread and database connection; a
+page then takes about as long as its slowest query rather than the sum.
+
+Writes (comment and update POSTs) are handed to the synchronous views in
+``tickets.views`` so form handling, attachment files and notification email
+stay off the event loop.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.shortcuts import render
+
+from . import events, ticket_cache, views
+from .aio import run_queries, run_query
+from .models import Ticket
+from .viewer import Viewer
+
+
+async def _viewer(request):
+    user = await request.auser()
+    return user, await sync_to_async(Viewer.from_user)(user)
+
+
+@login_required
+async def dashboard(request):
+    user, viewer = await _viewer(request)
+    context = await run_queries(views.dashboard_queries(user, viewer.is_employee))
+    context['is_employee'] = viewer.is_employee
+    return await sync_to_async(render)(request, 'tickets/dashboard.html', context)
+
+
+@login_required
+async def ticket_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(views.ticket_detail)(request, pk)
+
+    user, viewer = await _viewer(request)
+    is_employee = viewer.is_employee
+    try:
+        ticket = await run_query(lambda: ticket_cache.get_ticket(pk))
+    except Ticket.DoesNotExist:
+        return await sync_to_async(views._archived_ticket_detail)(request, pk)
+
+    if not views.can_view_ticket(ticket, user, is_employee):
+        return await sync_to_async(views.deny_ticket)(request)
+
+    results = await run_queries(views.ticket_detail_queries(ticket, is_employee))
+    context = views.ticket_detail_context(ticket, is_employee, results)
+    return await sync_to_async(render)(request, 'tickets/ticket_detail.html', context)
+
+
+def _event_cursor(request):
+    value = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """A ``text/event-stream`` response that frees its subscription when closed.
+
+    ``events.stream`` unsubscribes when it finishes, but only once it has
+    started; a client that goes away before the first chunk would otherwise
+    leave its subscription, and its slot, behind. The server closes every
+    response it gets, and unsubscribing twice is harmless.
+    """
+
+    def __init__(self, subscription, after, visible):
+        super().__init__(events.stream(subscription, after, visible), content_type='text/event-stream')
+        self.subscription = subscription
+
+    def close(self):
+        try:
+            events.broker.unsubscribe(self.subscription)
+        finally:
+            super().close()
+
+
+def _event_response(subscription, after, visible=lambda event: True):
+    response = EventStreamResponse(subscription, after, visible)
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _busy():
+    response = HttpResponse('Too many live connections', status=503)
+    response['Retry-After'] = '30'
+    return response
+
+
+async def ticket_events(request, pk):
+    """SSE stream of status/priority/assignee changes and new comments on one ticket."""
+    if not settings.LIVE_UPDATES:
+        raise Http404
+    user, viewer = await _viewer(request)
+    if not user.is_authenticated:
+        return HttpResponseForbidden()
+    try:
+        ticket = await run_query(lambda: ticket_cache.get_ticket(pk))
+    except Ticket.DoesNotExist:
+        raise Http404
+    if not viewer.is_employee and ticket.created_by_id != user.pk:
+        return HttpResponseForbidden()
+
+    try:
+        subscription = events.broker.subscribe(ticket_id=ticket.pk)
+    except events.TooManySubscribers:
+        return _busy()
+
+    def visible(event):
+        return viewer.is_employee or not event.payload.get('is_internal')
+
+    return _event_response(subscription, _event_cursor(request), visible)
+
+
+async def queue_events(request):
+    """SSE stream of ticket changes for the employee dashboard queue."""
+    if not settings.LIVE_UPDATES:
+        raise Http404
+    user, viewer = await _viewer(request)
+    if not viewer.is_employee:
+        return HttpResponseForbidden()
+    try:
+        subscription = events.broker.subscribe(kinds=('ticket',))
+    except events.TooManySubscribers:
+        return _busy()
+    return _event_response(subscription, _event_cursor(request))
@@ -0,0 +1,228 @@
+"""Content encodings shared by the static pipeline and response compression.
+
+gzip is always available. brotli and zstd are used when the optional
+``brotli`` and ``zstandard`` packages are installed.
+
+``compress_response`` is CompressionMiddleware's work: with
+``RESPONSE_COMPRESSION`` it compresses text responses in the encoding the
+client prefers, and streaming responses chunk by chunk, flushing after each
+chunk so an event stream is never held back. Bodies under
+``RESPONSE_COMPRESSION_MIN_BYTES``, types that are already compressed
+(images, PDFs, Office files) and responses that already have an encoding
+are sent as they are.
+
+Compressing pages that carry a secret next to text an attacker can inject
+opens them to BREACH, which guesses the secret from the compressed length.
+Three things stand in its way. Django masks the CSRF token differently in
+every response. Requests another site makes the browser send
+(``Sec-Fetch-Site: cross-site``) are never compressed. gzip and zstd output
+also carries 1 to 100 random bytes of padding, so that lengths vary from
+response to response.
+"""
+import gzip
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# encoding -> (file suffix, compress(bytes) at the highest useful level),
+# in order of preference.
+ENCODINGS = {}
+if brotli is not None:
+    ENCODINGS['br'] = ('.br', lambda data: brotli.compress(data, quality=11))
+if zstandard is not None:
+    ENCODINGS['zstd'] = ('.zst', lambda data: zstandard.ZstdCompressor(level=19).compress(data))
+ENCODINGS['gzip'] = ('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+
+# Levels for compressing responses as they are sent: most of the size win of
+# the maximum levels, at a small fraction of the CPU time.
+RESPONSE_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+MAX_PADDING = 100
+_ZSTD_SKIPPABLE_MAGIC = 0x184D2A50
+
+
+def accepted_encodings(header):
+    """Return the codings an ``Accept-Encoding`` header allows (q > 0), lowercased."""
+    accepted, rejected, wildcard = set(), set(), False
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding == '*':
+            wildcard = quality > 0
+        elif quality > 0:
+            accepted.add(coding)
+        else:
+            rejected.add(coding)
+    if wildcard:
+        accepted |= set(ENCODINGS) - rejected
+    return accepted
+
+
+def negotiate(header, available=None):
+    """Return the preferred encoding allowed by ``header``, out of ``available`` (default: all)."""
+    accepted = accepted_encodings(header or '')
+    for encoding in ENCODINGS:
+        if encoding in accepted and (available is None or encoding in available):
+            return encoding
+    return None
+
+
+def _padding():
+    return secrets.token_hex(MAX_PADDING)[:secrets.randbelow(MAX_PADDING) + 1].encode()
+
+
+class _GzipStream:
+    """gzip with a random file name in the header, which no client looks at."""
+
+    def __init__(self):
+        self._deflate = zlib.compressobj(RESPONSE_LEVELS['gzip'], zlib.DEFLATED, -zlib.MAX_WBITS)
+        self._crc = 0
+        self._size = 0
+        # magic, deflate, FNAME flag, no mtime, no extra flags, unknown OS
+        self.header = b'\x1f\x8b\x08\x08\x00\x00\x00\x00\x00\xff' + _padding() + b'\x00'
+
+    def compress(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        self._size += len(data)
+        return self._deflate.compress(data)
+
+    def flush(self):
+        return self._deflate.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._deflate.flush() + struct.pack('<II', self._crc, self._size & 0xFFFFFFFF)
+
+
+class _BrotliStream:
+    header = b''
+
+    def __init__(self):
+        self._brotli = brotli.Compressor(quality=RESPONSE_LEVELS['br'])
+
+    def compress(self, data):
+        return self._brotli.process(data)
+
+    def flush(self):
+        return self._brotli.flush()
+
+    def finish(self):
+        return self._brotli.finish()
+
+
+class _ZstdStream:
+    """zstd preceded by a skippable frame of random padding, which decoders pass over."""
+
+    def __init__(self):
+        self._zstd = zstandard.ZstdCompressor(level=RESPONSE_LEVELS['zstd']).compressobj()
+        padding = _padding()
+        self.header = struct.pack('<II', _ZSTD_SKIPPABLE_MAGIC, len(padding)) + padding
+
+    def compress(self, data):
+        return self._zstd.compress(data)
+
+    def flush(self):
+        return self._zstd.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._zstd.flush()
+
+
+STREAMS = {'br': _BrotliStream, 'zstd': _ZstdStream, 'gzip': _GzipStream}
+
+
+def compress_bytes(encoding, data):
+    """Compress a whole body as ``compress_response`` would."""
+    stream = STREAMS[encoding]()
+    return stream.header + stream.compress(data) + stream.finish()
+
+
+def _compress_chunks(encoding, chunks):
+    stream = STREAMS[encoding]()
+    yield stream.header
+    for chunk in chunks:
+        metrics.incr('compression_bytes_in_total', len(chunk), encoding=encoding)
+        data = stream.compress(chunk) + stream.flush()
+        metrics.incr('compression_bytes_out_total', len(data), encoding=encoding)
+        yield data
+    yield stream.finish()
+
+
+async def _acompress_chunks(encoding, chunks):
+    stream = STREAMS[encoding]()
+    yield stream.header
+    async for chunk in chunks:
+        metrics.incr('compression_bytes_in_total', len(chunk), encoding=encoding)
+        data = stream.compress(chunk) + stream.flush()
+        metrics.incr('compression_bytes_out_total', len(data), encoding=encoding)
+        yield data
+    yield stream.finish()
+
+
+def is_compressible(content_type):
+    return content_type.split(';')[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def compress_response(request, response):
+    """Compress ``response`` in place for ``request`` when it is worth it and safe."""
+    if response.has_header('Content-Encoding') or not is_compressible(response.get('Content-Type', '')):
+        return response
+    if not response.streaming and len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+        return response
+    # From here on the response would be compressed for some clients.
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if request.headers.get('Sec-Fetch-Site') == 'cross-site':
+        return response
+    encoding = negotiate(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+
+    if response.streaming:
+        if response.is_async:
+            response.streaming_content = _acompress_chunks(encoding, response.streaming_content)
+        else:
+            response.streaming_content = _compress_chunks(encoding, response.streaming_content)
+        # The length is not known in advance; the response is sent chunked.
+        del response['Content-Length']
+    else:
+        compressed = compress_bytes(encoding, response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        metrics.incr('compression_bytes_in_total', len(response.content), encoding=encoding)
+        metrics.incr('compression_bytes_out_total', len(compressed), encoding=encoding)
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+
+    # A strong ETag names exact bytes; these now differ from the uncompressed ones.
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    response['Content-Encoding'] = encoding
+    metrics.incr('compression_responses_total', encoding=encoding)
+    return response
@@ -0,0 +1,217 @@
+"""Live updates for ticket pages and the employee queue (Server-Sent Events).
+
+Ticket and comment saves append a ``TicketEvent`` row once their transaction
+commits. Each worker process runs one poller task that reads new rows every
+``LIVE_UPDATES_POLL_INTERVAL`` seconds and hands them to the streams open in
+that process. However many browsers are connected, a worker makes one small
+query per interval, and every worker sees every event.
+
+Streams end after ``LIVE_UPDATES_MAX_SECONDS``; the browser reconnects with
+``Last-Event-ID`` and picks up where it left off.
+"""
+import asyncio
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .aio import run_query
+from .models import Comment, Ticket, TicketEvent
+from .templatetags.ticket_extras import priority_badge, status_badge
+
+logger = logging.getLogger(__name__)
+
+# Events a slow client may fall behind by before its stream is closed.
+SUBSCRIBER_QUEUE_SIZE = 100
+REPLAY_LIMIT = 100
+# How long event rows are kept for reconnecting clients.
+EVENT_RETENTION = timedelta(minutes=10)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def ticket_payload(ticket, created=False):
+    return {
+        'ticket': str(ticket.pk),
+        'title': ticket.title,
+        'created': created,
+        'status': ticket.status,
+        'status_display': ticket.get_status_display(),
+        'status_badge': status_badge(ticket.status),
+        'priority': ticket.priority,
+        'priority_display': ticket.get_priority_display(),
+        'priority_badge': priority_badge(ticket.priority),
+        'assigned_to': ticket.assigned_to.username if ticket.assigned_to_id else None,
+        'created_by': ticket.created_by.username,
+        'created_at': ticket.created_at.isoformat(),
+    }
+
+
+def comment_payload(comment):
+    return {
+        'ticket': str(comment.ticket_id),
+        'id': comment.pk,
+        'author': comment.author.username,
+        'body': comment.body,
+        'is_internal': comment.is_internal,
+        'created_at': comment.created_at.isoformat(),
+    }
+
+
+def record(ticket_id, kind, payload):
+    TicketEvent.objects.using(DEFAULT_DB_ALIAS).create(ticket_id=ticket_id, kind=kind, payload=payload)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw or not settings.LIVE_UPDATES:
+        return
+    payload = ticket_payload(instance, created)
+    transaction.on_commit(lambda: record(instance.pk, 'ticket', payload), using=using)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    if raw or not created or not settings.LIVE_UPDATES:
+        return
+    payload = comment_payload(instance)
+    transaction.on_commit(lambda: record(instance.ticket_id, 'comment', payload), using=using)
+
+
+def format_event(event):
+    """Serialize a TicketEvent as one SSE message."""
+    return f'id: {event.pk}\nevent: {event.kind}\ndata: {json.dumps(event.payload)}\n\n'
+
+
+def latest_event_id():
+    return (
+        TicketEvent.objects.using(DEFAULT_DB_ALIAS)
+        .order_by('-pk').values_list('pk', flat=True).first()
+    ) or 0
+
+
+class Subscription:
+    """One open stream: events for a single ticket, or of some kinds for all tickets."""
+
+    def __init__(self, ticket_id=None, kinds=('ticket', 'comment')):
+        self.ticket_id = ticket_id
+        self.kinds = kinds
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        if self.ticket_id is not None and event.ticket_id != self.ticket_id:
+            return False
+        return event.kind in self.kinds
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # The stream closes and the client resumes from its Last-Event-ID.
+            self.overflowed = True
+
+    def replay(self, after):
+        """Return stored events after ``after`` that this subscription wants."""
+        events = TicketEvent.objects.using(DEFAULT_DB_ALIAS).filter(pk__gt=after, kind__in=self.kinds)
+        if self.ticket_id is not None:
+            events = events.filter(ticket_id=self.ticket_id)
+        return list(events.order_by('pk')[:REPLAY_LIMIT])
+
+
+class Broker:
+    """Fans events out to the streams open in this process."""
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._poller = None
+
+    def __len__(self):
+        return len(self._subscriptions)
+
+    def subscribe(self, ticket_id=None, kinds=('ticket', 'comment')):
+        if len(self._subscriptions) >= settings.LIVE_UPDATES_MAX_CONNECTIONS:
+            raise TooManySubscribers
+        subscription = Subscription(ticket_id, kinds)
+        self._subscriptions.add(subscription)
+        if self._poller is None:
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscriptions.discard(subscription)
+        if not self._subscriptions and self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    def dispatch(self, event):
+        for subscription in list(self._subscriptions):
+            if subscription.matches(event):
+                subscription.deliver(event)
+
+    async def _poll(self):
+        cursor = await run_query(latest_event_id)
+        last_prune = timezone.now()
+        while True:
+            await asyncio.sleep(settings.LIVE_UPDATES_POLL_INTERVAL)
+            try:
+                events = await run_query(lambda: list(
+                    TicketEvent.objects.using(DEFAULT_DB_ALIAS).filter(pk__gt=cursor).order_by('pk')[:500]
+                ))
+                for event in events:
+                    cursor = event.pk
+                    self.dispatch(event)
+                if timezone.now() - last_prune > EVENT_RETENTION:
+                    last_prune = timezone.now()
+                    await run_query(prune_events)
+            except Exception:
+                logger.exception('Live update poller failed; retrying')
+
+
+def prune_events():
+    cutoff = timezone.now() - EVENT_RETENTION
+    TicketEvent.objects.using(DEFAULT_DB_ALIAS).filter(created_at__lt=cutoff).delete()
+
+
+broker = Broker()
+
+
+async def stream(subscription, after=0, visible=lambda event: True):
+    """Yield SSE messages for ``subscription``, starting after event ``after``."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.LIVE_UPDATES_MAX_SECONDS
+    last = after
+    try:
+        yield f'retry: {settings.LIVE_UPDATES_RETRY_MS}\n\n'
+        if after:
+            for event in await run_query(lambda: subscription.replay(after)):
+                last = event.pk
+                if visible(event):
+                    yield format_event(event)
+        while not subscription.overflowed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=min(settings.LIVE_UPDATES_KEEPALIVE, remaining)
+                )
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ': keepalive\n\n'
+                continue
+            # Already sent by the replay above.
+            if event.pk <= last:
+                continue
+            last = event.pk
+            if visible(event):
+                yield format_event(event)
+    finally:
+        broker.unsubscribe(subscription)
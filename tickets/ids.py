@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_last_rand = 0
+
+_RAND_BITS = 74
+_RAND_MASK = (1 << _RAND_BITS) - 1
+
+
+def uuid7():
+    """Return a time-ordered UUID (RFC 9562 version 7).
+
+    The first 48 bits are the Unix timestamp in milliseconds, so new tickets
+    are appended to the right-hand edge of the primary key index instead of
+    landing at a random page. Within the same millisecond the random part is
+    incremented, which keeps IDs generated by one process strictly increasing.
+    """
+    global _last_ms, _last_rand
+
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            rand = int.from_bytes(os.urandom(10), 'big') & _RAND_MASK
+        else:
+            # Same millisecond (or the clock went backwards): keep ordering
+            # by bumping the previous value with a random increment.
+            ms = _last_ms
+            rand = _last_rand + (int.from_bytes(os.urandom(4), 'big') | 1)
+            if rand > _RAND_MASK:
+                ms += 1
+                rand &= _RAND_MASK
+        _last_ms, _last_rand = ms, rand
+
+    rand_a = rand >> 62
+    rand_b = rand & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (rand_a << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_timestamp(value):
+    """Return the creation time (in Unix seconds) encoded in a UUIDv7, or None."""
+    if value.version != 7:
+        return None
+    return (value.int >> 80) / 1000
@@ -0,0 +1,52 @@
+"""Jinja2 environment for the hot row templates (``HOT_TEMPLATE_ENGINE=jinja2``).
+
+The table rows of the ticket list and dashboard, and the comment thread of
+the ticket detail page, are the loops that dominate rendering time on large
+pages. ``{% hot_rows %}`` (see ``ticket_extras``) renders them from
+``tickets/jinja2/`` with this environment instead of from
+``tickets/templates/``. The rest of each page stays a Django template. Both
+copies of a row template must produce the same markup.
+
+The environment provides what the row templates use: ``url()``, the
+``ticket_extras`` badge filters, and Django's ``date`` and ``linebreaks``.
+``csrf_input`` and ``csrf_token`` come from Django's Jinja2 backend.
+Compiled templates are cached as bytecode in ``JINJA2_BYTECODE_DIR``, so a
+new worker skips the compilation as well as the parsing.
+"""
+from pathlib import Path
+
+from django.conf import settings
+from django.template.defaultfilters import linebreaks_filter
+from django.urls import reverse
+from django.utils import formats, timezone
+from jinja2 import Environment, FileSystemBytecodeCache
+
+from .templatetags.ticket_extras import priority_badge, status_badge
+
+
+def url(name, *args, **kwargs):
+    return reverse(name, args=args or None, kwargs=kwargs or None)
+
+
+def date(value, format_string=None):
+    """Django's ``date`` filter: the value in the current time zone, in ``format_string``."""
+    if not value:
+        return ''
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return formats.date_format(value, format_string)
+
+
+def environment(**options):
+    bytecode_dir = Path(settings.JINJA2_BYTECODE_DIR)
+    bytecode_dir.mkdir(parents=True, exist_ok=True)
+    options.setdefault('bytecode_cache', FileSystemBytecodeCache(str(bytecode_dir)))
+    env = Environment(**options)
+    env.globals['url'] = url
+    env.filters.update({
+        'status_badge': status_badge,
+        'priority_badge': priority_badge,
+        'date': date,
+        'linebreaks': linebreaks_filter,
+    })
+    return env
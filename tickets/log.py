@@ -0,0 +1,160 @@
+"""Structured, non-blocking logging (``LOG_MODE=queue``).
+
+In queue mode each file and console handler in ``settings.LOGGING`` is
+wrapped by ``queue_handler``. The request thread only puts the record on a
+bounded queue. A background ``QueueListener`` thread formats it as one JSON
+line and does the file I/O, including rotation. When the queue backs up,
+records below WARNING are sampled; when it is full, records are dropped
+rather than blocking the request. Both are counted in
+``log_records_dropped_total``.
+
+Threads do not survive ``fork()``, so a process forked after the handlers
+are built (a gunicorn worker under ``GUNICORN_PRELOAD=1``) starts its own
+listeners, on fresh queues, before it runs anything else.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import weakref
+
+from django.utils.module_loading import import_string
+
+# Handlers built by queue_handler, restarted in forked children.
+_handlers = weakref.WeakSet()
+
+# Record attributes copied into JSON events when a log call passes them in ``extra``.
+EVENT_FIELDS = ('action', 'ticket_id', 'user', 'duration_ms')
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for name in EVENT_FIELDS:
+            if hasattr(record, name):
+                event[name] = getattr(record, name)
+        if record.exc_info:
+            event['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler that samples, then drops, records instead of blocking."""
+
+    def __init__(self, queue_size, sample_rate, high_water=0.8):
+        super().__init__(queue.Queue(queue_size))
+        self.queue_size = queue_size
+        self.sample_rate = sample_rate
+        self.high_water = int(queue_size * high_water)
+
+    def emit(self, record):
+        if (record.levelno < logging.WARNING and self.queue.qsize() >= self.high_water
+                and random.random() >= self.sample_rate):
+            _dropped('sampled')
+            return
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            _dropped('full')
+        except Exception:
+            self.handleError(record)
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+    def prepare(self, record):
+        # Resolve the message and traceback now: the arguments may be model
+        # instances that must not be touched from the listener thread.
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _dropped(reason):
+    from . import metrics
+    metrics.incr('log_records_dropped_total', reason=reason)
+
+
+def queue_handler(handler, queue_size=10000, sample_rate=0.1):
+    """Build the handler described by ``handler`` (a LOGGING handler dict) behind a queue.
+
+    Used as a ``'()'`` factory in ``settings.LOGGING``. The wrapped handler
+    writes JSON lines from a background thread that is stopped, after
+    draining the queue, at exit.
+    """
+    options = dict(handler)
+    options.pop('formatter', None)
+    target_class = import_string(options.pop('class'))
+    level = options.pop('level', logging.NOTSET)
+    target = target_class(**options)
+    target.setLevel(level)
+    target.setFormatter(JsonFormatter())
+
+    wrapper = DroppingQueueHandler(queue_size, sample_rate)
+    listener = logging.handlers.QueueListener(wrapper.queue, target, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop, listener)
+    wrapper.listener = listener
+    _handlers.add(wrapper)
+    return wrapper
+
+
+def _restart_listeners():
+    """Start a new listener thread for each queue handler in a forked child.
+
+    The parent's thread is gone, and its queue may have been copied
+    mid-``put`` with its lock held; records still on it are the parent's to
+    write. The child gets an empty queue and a thread of its own.
+    """
+    for wrapper in list(_handlers):
+        listener = wrapper.listener
+        wrapper.queue = listener.queue = queue.Queue(wrapper.queue_size)
+        listener._thread = None
+        listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listeners)
+
+
+def _stop(listener):
+    if listener._thread is None:
+        return
+    try:
+        listener.stop()
+    except queue.Full:
+        # No room for the stop sentinel; the listener is a daemon thread, so
+        # exit without waiting for it.
+        pass
+
+
+def event(request, action, ticket=None):
+    """Return ``extra`` fields for a structured log event about ``request``.
+
+    ``duration_ms`` is the time since RequestTimerMiddleware saw the request.
+    """
+    fields = {'action': action, 'user': request.user.get_username()}
+    if ticket is not None:
+        fields['ticket_id'] = str(ticket.pk)
+    started = getattr(request, 'started', None)
+    if started is not None:
+        fields['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+    return fields
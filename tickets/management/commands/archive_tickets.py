@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tickets.archive import archivable_tickets, archive_tickets
+
+
+class Command(BaseCommand):
+    help = 'Move closed tickets (with comments and attachment metadata) into the archive tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Archive tickets closed longer than this (default: ARCHIVE_AFTER_DAYS).')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Tickets per transaction (default: ARCHIVE_BATCH_SIZE).')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches, to let other writers in.')
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Database alias to archive (repeatable). Defaults to every ticket shard.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many tickets would move.')
+
+    def handle(self, *args, **options):
+        databases = options['databases'] or settings.TICKET_SHARD_ALIASES or ['default']
+
+        for alias in databases:
+            if options['dry_run']:
+                count = archivable_tickets(options['days'], alias).count()
+                self.stdout.write(f'{alias}: {count} tickets would be archived.')
+                continue
+
+            total = 0
+            for moved in archive_tickets(options['days'], options['batch_size'], alias):
+                total += moved
+                self.stdout.write(f'{alias}: archived {total} tickets...')
+                if options['sleep']:
+                    time.sleep(options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f'{alias}: archived {total} tickets.'))
@@ -0,0 +1,83 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from tickets.compression import ENCODINGS
+from tickets.models import Comment, Ticket
+
+# (name, bits per second, round trip seconds): Chrome DevTools' throttling presets.
+LINKS = [('Fast 3G', 1_600_000, 0.5625), ('Slow 3G', 400_000, 2.0)]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the body size and server time of the main pages with and without response compression, '
+        'and estimate their time-to-last-byte on slow links.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per page and encoding.')
+        parser.add_argument('--tickets', type=int, default=200, help='Tickets to create.')
+        parser.add_argument('--comments', type=int, default=40, help='Comments on the ticket shown in detail.')
+
+    def handle(self, *args, **options):
+        # Everything the benchmark creates is rolled back at the end.
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                self._run(options['requests'], options['tickets'], options['comments'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, count, tickets, comments):
+        user = User.objects.create_user('bench-compression')
+        user.profile.role = 'employee'
+        user.profile.save()
+        Ticket.objects.bulk_create(
+            Ticket(title=f'Printer on floor {n} jams', description='Paper jam in tray 2.', created_by=user)
+            for n in range(tickets)
+        )
+        ticket = Ticket.objects.create(title='Long ticket', description='Steps to reproduce. ' * 100,
+                                       created_by=user)
+        Comment.objects.bulk_create(
+            Comment(ticket=ticket, author=user, body=f'Update {n}: tried restarting the spooler again.')
+            for n in range(comments)
+        )
+        client = Client()
+        client.force_login(user)
+        pages = [
+            ('dashboard', reverse('dashboard')),
+            ('ticket_list', reverse('ticket_list')),
+            ('ticket_detail', reverse('ticket_detail', args=[ticket.pk])),
+        ]
+
+        self.stdout.write(f'Median of {count} requests; time-to-last-byte = RTT + server time + body / bandwidth')
+        header = f'{"page":<15}{"encoding":<10}{"body":>10}{"server":>10}'
+        self.stdout.write(header + ''.join(f'{name:>12}' for name, _, _ in LINKS))
+        for name, url in pages:
+            for encoding in ('identity', *ENCODINGS):
+                size, seconds = self._measure(client, url, encoding, count)
+                row = f'{name:<15}{encoding:<10}{size:>9,}B{seconds * 1000:>8.1f}ms'
+                for _, bandwidth, rtt in LINKS:
+                    row += f'{(rtt + seconds + size * 8 / bandwidth) * 1000:>10.0f}ms'
+                self.stdout.write(row)
+
+    def _measure(self, client, url, encoding, count):
+        sizes, times = [], []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.get(url, secure=True, HTTP_ACCEPT_ENCODING=encoding)
+            times.append(time.perf_counter() - started)
+            sizes.append(len(response.content))
+            assert response.get('Content-Encoding', 'identity') == encoding, (url, encoding)
+        return int(statistics.median(sizes)), statistics.median(times)
@@ -0,0 +1,81 @@
+import logging
+import logging.handlers
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from tickets import metrics
+from tickets.log import queue_handler
+
+VERBOSE = '{levelname} {asctime} {module} {process:d} {thread:d} {message}'
+
+
+class Command(BaseCommand):
+    help = 'Measure the time log calls add to a request with synchronous and queued file logging.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Simulated requests per mode.')
+        parser.add_argument('--records', type=int, default=3, help='Log records per request.')
+        parser.add_argument('--request-ms', type=float, default=2.0,
+                            help='Time each request spends waiting on I/O (the database) between log calls.')
+        parser.add_argument('--max-bytes', type=int, default=256 * 1024,
+                            help='Rotate log files at this size, so rotation happens during the run.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            file_options = {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'maxBytes': options['max_bytes'],
+                'backupCount': 5,
+                'level': 'INFO',
+            }
+
+            sync = logging.handlers.RotatingFileHandler(
+                Path(directory) / 'sync.log', maxBytes=options['max_bytes'], backupCount=5)
+            sync.setFormatter(logging.Formatter(VERBOSE, style='{'))
+            queued = queue_handler(dict(file_options, filename=Path(directory) / 'queue.log'))
+
+            self.stdout.write(
+                f'{options["requests"]} requests x {options["records"]} records, rotating every '
+                f'{options["max_bytes"] // 1024} KB; time spent in log calls per request'
+            )
+            self.stdout.write(f'{"mode":<16}{"mean":>10}{"p99":>10}{"max":>10}{"dropped":>10}')
+            for label, handler, eager in (('sync (before)', sync, True), ('queue', queued, False)):
+                metrics.reset()
+                timings = self._run(handler, eager, options['requests'], options['records'],
+                                    options['request_ms'] / 1000 / options['records'])
+                if handler is queued:
+                    # Let the listener finish writing before the files are removed.
+                    queued.queue.join()
+                dropped = sum(metrics.value('log_records_dropped_total', reason=reason)
+                              for reason in ('sampled', 'full'))
+                self.stdout.write(
+                    f'{label:<16}{statistics.mean(timings):>8.1f}us'
+                    f'{statistics.quantiles(timings, n=100)[98]:>8.1f}us{max(timings):>8.1f}us{dropped:>10}'
+                )
+            sync.close()
+
+    def _run(self, handler, eager, requests, records, pause):
+        logger = logging.getLogger('tickets.bench_logging')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        logger.handlers = [handler]
+        title, user = 'Printer on fire', 'bench-user'
+        timings = []
+        for request in range(requests):
+            elapsed = 0
+            for record in range(records):
+                time.sleep(pause)
+                started = time.perf_counter()
+                if eager:
+                    logger.info(f'Ticket updated: "{title}" by {user} (request {request}, record {record})')
+                else:
+                    logger.info('Ticket updated: "%s" by %s (request %d, record %d)', title, user, request, record,
+                                extra={'action': 'ticket_update', 'user': user, 'ticket_id': request})
+                elapsed += time.perf_counter() - started
+            timings.append(elapsed * 1e6)
+        logger.handlers = []
+        return timings
@@ -0,0 +1,76 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from tickets.models import Comment, Ticket
+
+# (label, SESSION_ENGINE, MESSAGE_STORAGE). The first row is the previous
+# configuration: Django's defaults.
+MODES = [
+    ('db (before)', 'django.contrib.sessions.backends.db',
+     'django.contrib.messages.storage.fallback.FallbackStorage'),
+    ('db', 'django.contrib.sessions.backends.db',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('cached_db', 'django.contrib.sessions.backends.cached_db',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies',
+     'django.contrib.messages.storage.cookie.CookieStorage'),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Count the queries (and session queries) per request on the main views for each session mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20, help='Requests per view and mode.')
+
+    def handle(self, *args, **options):
+        # Everything the benchmark creates is rolled back at the end.
+        try:
+            with transaction.atomic():
+                self._run(options['requests'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, count):
+        user = User.objects.create_user('bench-sessions', password='bench-sessions-pw')
+        ticket = Ticket.objects.create(title='Session benchmark', description='-', created_by=user)
+        # So ticket_detail does the same work in every mode, including the first.
+        Comment.objects.create(ticket=ticket, author=user, body='First comment')
+        views = [
+            ('dashboard', 'GET', reverse('dashboard')),
+            ('ticket_list', 'GET', reverse('ticket_list')),
+            ('ticket_detail', 'GET', reverse('ticket_detail', args=[ticket.pk])),
+            ('add comment', 'POST', reverse('ticket_detail', args=[ticket.pk])),
+        ]
+
+        self.stdout.write(f'Average queries per request over {count} requests (session queries in brackets)')
+        self.stdout.write(f'{"mode":<16}' + ''.join(f'{name:>16}' for name, _, _ in views))
+        for label, engine, message_storage in MODES:
+            with override_settings(SESSION_ENGINE=engine, MESSAGE_STORAGE=message_storage,
+                                   ALLOWED_HOSTS=['testserver']):
+                client = Client()
+                client.force_login(user, backend='tickets.backends.ProfileModelBackend')
+                cells = []
+                for _, method, url in views:
+                    total, session = self._measure(client, method, url, count)
+                    cells.append(f'{total / count:.1f} [{session / count:.1f}]')
+            self.stdout.write(f'{label:<16}' + ''.join(f'{cell:>16}' for cell in cells))
+
+    def _measure(self, client, method, url, count):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(count):
+                if method == 'POST':
+                    client.post(url, {'add_comment': '1', 'body': 'benchmark comment'}, secure=True)
+                else:
+                    client.get(url, secure=True)
+        session = sum('django_session' in query['sql'] for query in queries.captured_queries)
+        return len(queries.captured_queries), session
@@ -0,0 +1,110 @@
+import importlib.util
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.jinja2 import Jinja2
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from tickets.models import Comment, Ticket
+from tickets.views import ticket_comments
+
+CASES = [
+    ('ticket list, 100 rows', 'tickets/rows/ticket_list.html'),
+    ('dashboard, 100 rows', 'tickets/rows/dashboard_tickets.html'),
+    ('thread, 1,000 comments', 'tickets/rows/comments.html'),
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+def django_engine():
+    return DjangoTemplates({'NAME': 'django', 'DIRS': [], 'APP_DIRS': True, 'OPTIONS': {}})
+
+
+def jinja2_engine():
+    return Jinja2({
+        'NAME': 'jinja2', 'DIRS': [], 'APP_DIRS': True,
+        'OPTIONS': {'environment': 'tickets.jinja_env.environment'},
+    })
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the Django and Jinja2 engines on the hot row templates: 100-row ticket tables and a '
+        '1,000-comment thread. Reports compile time and median render time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=20, help='Renders per template and engine.')
+
+    def handle(self, *args, **options):
+        with_jinja2 = importlib.util.find_spec('jinja2') is not None
+        if not with_jinja2:
+            self.stderr.write('Jinja2 is not installed; only the Django engine is measured.')
+        # Everything the benchmark creates is rolled back at the end.
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                self._run(options['runs'], with_jinja2)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, runs, with_jinja2):
+        user = User.objects.create_user('bench-templates')
+        user.profile.role = 'employee'
+        user.profile.save()
+        Ticket.objects.bulk_create(
+            Ticket(title=f'Printer on floor {n} jams', description='-', created_by=user, assigned_to=user)
+            for n in range(100)
+        )
+        ticket = Ticket.objects.create(title='Long thread', description='-', created_by=user)
+        Comment.objects.bulk_create(
+            Comment(ticket=ticket, author=user, body=f'Update {n}:\ntried restarting the spooler again.',
+                    is_internal=n % 5 == 0)
+            for n in range(1000)
+        )
+        request = RequestFactory().get('/')
+        request.user = user
+        context = {
+            'is_employee': True,
+            'tickets': list(Ticket.objects.select_related('created_by', 'assigned_to')
+                            .exclude(pk=ticket.pk).order_by('-created_at')[:100]),
+            'comments': list(ticket_comments(ticket, is_employee=True)),
+        }
+
+        bytecode_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(JINJA2_BYTECODE_DIR=bytecode_dir):
+                self._report(runs, with_jinja2, request, context)
+        finally:
+            shutil.rmtree(bytecode_dir)
+
+    def _report(self, runs, with_jinja2, request, context):
+        self.stdout.write(f'Median of {runs} renders, in ms; compile is the first get_template in a new engine')
+        self.stdout.write(f'{"template":<26}{"engine":<20}{"compile":>10}{"render":>10}')
+        for label, name in CASES:
+            modes = [('django', django_engine)]
+            if with_jinja2:
+                # The first engine compiles and writes the bytecode cache; the second only loads it.
+                modes += [('jinja2', jinja2_engine), ('jinja2 (bytecode)', jinja2_engine)]
+            for engine_label, make_engine in modes:
+                engine = make_engine()
+                started = time.perf_counter()
+                template = engine.get_template(name)
+                compile_ms = (time.perf_counter() - started) * 1000
+                times = []
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    template.render(context, request)
+                    times.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(f'{label:<26}{engine_label:<20}{compile_ms:>10.2f}'
+                                  f'{statistics.median(times):>10.2f}')
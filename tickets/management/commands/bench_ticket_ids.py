@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from tickets.ids import uuid7
+
+# Mirrors the columns that matter for index layout: the char(32) primary key
+# Django uses for UUIDField on SQLite, and the indexed FK column on comments.
+SCHEMA = """
+CREATE TABLE ticket (id char(32) NOT NULL PRIMARY KEY, created_at datetime NOT NULL);
+CREATE TABLE comment (id integer PRIMARY KEY AUTOINCREMENT, ticket_id char(32) NOT NULL);
+CREATE INDEX comment_ticket_id ON comment (ticket_id);
+"""
+
+
+class Command(BaseCommand):
+    help = 'Compare insert throughput and index size of UUIDv4 and UUIDv7 ticket IDs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=1_000_000, help='Number of tickets to insert per run.')
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Rows per transaction.')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        batch_size = options['batch_size']
+
+        self.stdout.write(f'Inserting {count:,} tickets (one comment each) per ID scheme...')
+        self.stdout.write(f'{"scheme":<8} {"rows/s":>12} {"pk index":>12} {"fk index":>12} {"db file":>12}')
+        for name, factory in (('uuid4', uuid.uuid4), ('uuid7', uuid7)):
+            result = self._run(factory, count, batch_size)
+            self.stdout.write(
+                f'{name:<8} {result["rate"]:>12,.0f} {self._mb(result["pk_bytes"]):>12} '
+                f'{self._mb(result["fk_bytes"]):>12} {self._mb(result["file_bytes"]):>12}'
+            )
+
+    def _run(self, factory, count, batch_size):
+        fd, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(path, isolation_level=None)
+            conn.executescript(SCHEMA)
+            started = time.perf_counter()
+            inserted = 0
+            while inserted < count:
+                size = min(batch_size, count - inserted)
+                ids = [factory().hex for _ in range(size)]
+                conn.execute('BEGIN')
+                conn.executemany(
+                    "INSERT INTO ticket (id, created_at) VALUES (?, datetime('now'))",
+                    ((pk,) for pk in ids),
+                )
+                conn.executemany('INSERT INTO comment (ticket_id) VALUES (?)', ((pk,) for pk in ids))
+                conn.execute('COMMIT')
+                inserted += size
+            elapsed = time.perf_counter() - started
+
+            try:
+                sizes = dict(conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'))
+            except sqlite3.OperationalError:
+                # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB.
+                sizes = {}
+            conn.close()
+            return {
+                'rate': count / elapsed,
+                'pk_bytes': sizes.get('sqlite_autoindex_ticket_1', 0),
+                'fk_bytes': sizes.get('comment_ticket_id', 0),
+                'file_bytes': os.path.getsize(path),
+            }
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def _mb(size):
+        return f'{size / (1024 * 1024):.1f} MB'
@@ -0,0 +1,83 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from tickets import warmup
+from tickets.models import Comment, Ticket
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure the first requests a fresh worker serves, with and without warmup.'
+    # Checks load the URLconf, which is part of what is being measured.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode.')
+        parser.add_argument('--child', choices=('cold', 'warm'), help='Internal: measure in this process.')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(self._measure(options['child'] == 'warm')))
+            return
+
+        self.stdout.write(f'{options["runs"]} fresh processes per mode; median ms')
+        self.stdout.write(f'{"mode":<14}{"warmup":>10}{"1st dashboard":>16}{"1st detail":>12}'
+                          f'{"steady":>10}')
+        for mode in ('cold', 'warm'):
+            runs = [self._spawn(mode) for _ in range(options['runs'])]
+            medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            self.stdout.write(
+                f'{mode:<14}{medians["warmup"]:>10.1f}{medians["dashboard"]:>16.1f}'
+                f'{medians["detail"]:>12.1f}{medians["steady"]:>10.1f}'
+            )
+
+    def _spawn(self, mode):
+        output = subprocess.run(
+            [sys.executable, sys.argv[0], 'bench_warmup', '--child', mode],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def _measure(self, warm):
+        timings = {'warmup': 0.0}
+        if warm:
+            started = time.perf_counter()
+            warmup.run()
+            timings['warmup'] = (time.perf_counter() - started) * 1000
+            # A worker's requests run on other threads, which open their own.
+            connections.close_all()
+        try:
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+                user = User.objects.create_user('bench-warmup')
+                user.profile.role = 'employee'
+                user.profile.save()
+                ticket = Ticket.objects.create(title='Warmup benchmark', description='-', created_by=user)
+                Comment.objects.create(ticket=ticket, author=user, body='First comment')
+                client = Client()
+                client.force_login(user)
+                for key, url in (('dashboard', '/dashboard/'), ('detail', f'/tickets/{ticket.pk}/')):
+                    # Plain paths: reverse() would build the URL resolvers first.
+                    started = time.perf_counter()
+                    client.get(url, secure=True)
+                    timings[key] = (time.perf_counter() - started) * 1000
+                started = time.perf_counter()
+                for _ in range(10):
+                    client.get(reverse('dashboard'), secure=True)
+                timings['steady'] = (time.perf_counter() - started) * 100
+                raise Rollback
+        except Rollback:
+            pass
+        return timings
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import static_pipeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Prune the vendored Bootstrap and Bootstrap Icons stylesheets against the project\'s templates '
+        'and bundle them with the site styles into tickets/dist/app.css. With --download, first fetch any '
+        'missing vendor files from the CDN, checked against vendor.lock.json. Run collectstatic afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--download', action='store_true',
+                            help='Fetch missing vendor files (and record new ones in the lock file).')
+
+    def handle(self, *args, **options):
+        if options['download']:
+            for name in static_pipeline.download():
+                self.stdout.write(f'Downloaded {name}')
+
+        missing = [name for name, _ in static_pipeline.BUNDLE_SOURCES
+                   if not (static_pipeline.STATIC_DIR / name).is_file()]
+        if missing:
+            raise CommandError(f'Missing {", ".join(missing)}; run with --download.')
+
+        self.stdout.write(f'{"source":<48}{"before":>12}{"after":>12}')
+        total_before = total_after = 0
+        for name, before, after in static_pipeline.build_bundle():
+            self.stdout.write(f'{name:<48}{before / 1024:>9.1f}KiB{after / 1024:>9.1f}KiB')
+            total_before += before
+            total_after += after
+        self.stdout.write(f'{static_pipeline.BUNDLE:<48}{total_before / 1024:>9.1f}KiB{total_after / 1024:>9.1f}KiB')
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from tickets import query_plans
+from tickets.sharding import is_sharded
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the hot ticket queries against a seeded, production-sized dataset and fail on full '
+        'table or index scans, temporary B-trees or unused indexes. The seeded rows are rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to check.')
+        parser.add_argument('--tickets', type=int, default=50_000, help='Tickets to seed.')
+        parser.add_argument('--users', type=int, default=500, help='Users to seed.')
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help='Check against the existing data instead, using --employee and --user.',
+        )
+        parser.add_argument('--employee', help='Username to run employee queries as (with --no-seed).')
+        parser.add_argument('--user', help='Username to run regular user queries as (with --no-seed).')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        if connections[using].vendor != 'sqlite':
+            raise CommandError(f'Database "{using}" is not SQLite.')
+        if is_sharded():
+            raise CommandError('Query plans are checked on one database; run against an unsharded copy.')
+
+        with transaction.atomic(using=using):
+            if options['no_seed']:
+                if not (options['employee'] and options['user']):
+                    raise CommandError('--no-seed needs --employee and --user.')
+                users = User.objects.using(using)
+                employee = users.get(username=options['employee'])
+                user = users.get(username=options['user'])
+            else:
+                self.stdout.write(f'Seeding {options["tickets"]:,} tickets...')
+                employee, user = query_plans.seed(options['tickets'], options['users'], using=using)
+            results = query_plans.check_all(employee, user, using)
+            # Drop the seeded rows and their statistics.
+            transaction.set_rollback(True, using=using)
+
+        for result in results:
+            status = self.style.SUCCESS('ok') if result.ok else self.style.ERROR('FAIL')
+            self.stdout.write(f'{status:<4} {result.query.name}')
+            for problem in result.problems:
+                self.stdout.write(f'     {problem}')
+            if options['verbosity'] > 1:
+                for sql, plan in result.statements:
+                    self.stdout.write(f'     {sql}')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'       {line}')
+
+        failed = sum(not result.ok for result in results)
+        if failed:
+            raise CommandError(f'{failed} of {len(results)} hot queries have plan regressions.')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} hot query plans use their indexes.'))
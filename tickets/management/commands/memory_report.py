@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets import memory
+
+
+class Command(BaseCommand):
+    help = (
+        'List tracemalloc snapshots, show the largest allocations in one, or diff two to see where '
+        'memory grew. Snapshots can be given as paths or as names in MEMORY_SNAPSHOT_DIR.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('snapshots', nargs='*', help='One snapshot to summarise, or an older and a newer one.')
+        parser.add_argument('--group-by', choices=memory.GROUP_BY, default='lineno',
+                            help='Group allocations by line, file or full traceback (default: lineno).')
+        parser.add_argument('--limit', type=int, default=25, help='Entries to show.')
+
+    def handle(self, *args, **options):
+        paths = [self._resolve(name) for name in options['snapshots']]
+        if not paths:
+            snapshots = memory.list_snapshots()
+            if not snapshots:
+                self.stdout.write(f'No snapshots in {memory.snapshot_dir()}.')
+            for path in snapshots:
+                self.stdout.write(f'{path.name}  {path.stat().st_size / 1024:,.0f} KiB')
+        elif len(paths) == 1:
+            self.stdout.write(memory.top_report(paths[0], options['group_by'], options['limit']))
+        elif len(paths) == 2:
+            self.stdout.write(memory.diff_report(paths[0], paths[1], options['group_by'], options['limit']))
+        else:
+            raise CommandError('Give at most two snapshots.')
+
+    def _resolve(self, name):
+        for path in (Path(name), memory.snapshot_dir() / name):
+            if path.is_file():
+                return path
+        raise CommandError(f'No snapshot named "{name}".')
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.retention import purge_expired, ticket_databases
+
+
+class Command(BaseCommand):
+    help = 'Delete tickets past their retention policy (TICKET_RETENTION_POLICIES) in small batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', dest='statuses',
+                            help='Override the configured policies: purge this status (repeatable). Requires --days.')
+        parser.add_argument('--days', type=int, help='Age in days for --status.')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Tickets per transaction (default: RETENTION_BATCH_SIZE).')
+        parser.add_argument('--max-rate', type=float, default=None, help='Maximum tickets deleted per second.')
+        parser.add_argument('--database', action='append', dest='databases',
+                            help='Database alias to purge (repeatable). Defaults to every ticket shard.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many tickets would be deleted.')
+
+    def handle(self, *args, **options):
+        policies = None
+        if options['statuses']:
+            if options['days'] is None:
+                raise CommandError('--status requires --days.')
+            policies = [{'statuses': options['statuses'], 'days': options['days']}]
+
+        for alias in options['databases'] or ticket_databases():
+            total = 0
+            for tier, policy, count in purge_expired(
+                policies, options['batch_size'], options['max_rate'], options['dry_run'], alias
+            ):
+                total += count
+                if options['dry_run']:
+                    self.stdout.write(
+                        f'{alias} ({tier}): {count} {"/".join(policy["statuses"])} tickets older than '
+                        f'{policy["days"]} days would be deleted.'
+                    )
+            if not options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(f'{alias}: deleted {total} tickets.'))
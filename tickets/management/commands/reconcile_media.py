@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from tickets.retention import find_orphans
+
+
+class Command(BaseCommand):
+    help = 'Find (and optionally delete) attachment files in storage that no Attachment row references.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true', help='Delete the orphaned files.')
+        parser.add_argument('--resume', action='store_true', help='Continue from where the last run stopped.')
+        parser.add_argument('--grace-hours', type=float, default=None,
+                            help='Ignore files modified more recently (default: RETENTION_ORPHAN_GRACE_HOURS).')
+        parser.add_argument('--batch-size', type=int, default=500, help='Files checked per database query.')
+        parser.add_argument('--max-rate', type=float, default=None, help='Maximum files checked per second.')
+
+    def handle(self, *args, **options):
+        grace = None
+        if options['grace_hours'] is not None:
+            grace = timedelta(hours=options['grace_hours'])
+
+        count = 0
+        for name in find_orphans(default_storage, options['batch_size'], grace, options['resume'],
+                                 options['max_rate']):
+            count += 1
+            if options['delete']:
+                default_storage.delete(name)
+                self.stdout.write(f'Deleted {name}')
+            else:
+                self.stdout.write(f'Orphan: {name}')
+
+        action = 'Deleted' if options['delete'] else 'Found'
+        self.stdout.write(self.style.SUCCESS(f'{action} {count} orphaned files.'))
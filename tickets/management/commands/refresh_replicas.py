@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from tickets.routers import refresh_replica
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to every configured read replica file.'
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError('refresh_replicas only supports SQLite databases.')
+        if not settings.DATABASE_REPLICA_ALIASES:
+            self.stdout.write('No replicas configured (set DATABASE_REPLICAS).')
+            return
+
+        for alias in settings.DATABASE_REPLICA_ALIASES:
+            path = str(connections[alias].settings_dict['NAME'])
+            refresh_replica(str(primary.settings_dict['NAME']), path)
+            self.stdout.write(f'Refreshed {alias} ({path}).')
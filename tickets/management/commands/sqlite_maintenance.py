@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Run periodic SQLite maintenance: PRAGMA optimize, ANALYZE and WAL checkpoints. '
+        'Intended to be scheduled (e.g. hourly from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database alias to maintain.')
+        parser.add_argument('--analyze', action='store_true', help='Run a full ANALYZE instead of PRAGMA optimize.')
+        parser.add_argument(
+            '--checkpoint',
+            default='PASSIVE',
+            type=str.upper,
+            choices=CHECKPOINT_MODES + ('NONE',),
+            help='WAL checkpoint mode (default: PASSIVE). Use NONE to skip.',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'Database "{options["database"]}" is not SQLite.')
+
+        with connection.cursor() as cursor:
+            if options['analyze']:
+                cursor.execute('ANALYZE')
+                self.stdout.write('ANALYZE complete.')
+            else:
+                cursor.execute('PRAGMA optimize')
+                self.stdout.write('PRAGMA optimize complete.')
+
+            mode = options['checkpoint']
+            if mode != 'NONE':
+                cursor.execute(f'PRAGMA wal_checkpoint({mode})')
+                busy, log_frames, checkpointed = cursor.fetchone()
+                self.stdout.write(
+                    f'WAL checkpoint ({mode}): busy={busy} log_frames={log_frames} checkpointed={checkpointed}'
+                )
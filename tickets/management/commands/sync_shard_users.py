@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from tickets.sharding import copy_user_to_shards
+
+
+class Command(BaseCommand):
+    help = 'Copy every user from the primary database to each ticket shard.'
+
+    def handle(self, *args, **options):
+        if not settings.TICKET_SHARD_ALIASES:
+            self.stdout.write('Sharding is not enabled (set TICKET_SHARDS).')
+            return
+
+        count = 0
+        for user in User.objects.using('default').iterator():
+            copy_user_to_shards(user)
+            count += 1
+        self.stdout.write(f'Copied {count} users to {len(settings.TICKET_SHARD_ALIASES)} shards.')
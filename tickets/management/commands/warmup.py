@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from tickets import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Warm up this process (URL resolvers, templates, forms, translations and '
+        'shared dashboard results) and report how long each step took. With --imports, also report '
+        'where startup import time goes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imports', type=int, default=0, metavar='N',
+                            help='Show the N slowest packages and modules to import at startup.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"step":<14}{"items":>8}{"time":>12}')
+        for name, items, seconds in warmup.run():
+            self.stdout.write(f'{name:<14}{"failed" if items is None else items:>8}{seconds * 1000:>10.1f}ms')
+
+        limit = options['imports']
+        if limit:
+            total, packages, modules = warmup.import_times()
+            self.stdout.write(f'\nStartup imports: {total / 1000:.1f} ms')
+            self.stdout.write(f'{"package (own time)":<48}{"time":>12}')
+            for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+                self.stdout.write(f'{package:<48}{micros / 1000:>10.1f}ms')
+            self.stdout.write(f'\n{"module (cumulative)":<48}{"time":>12}')
+            for module, micros in sorted(modules.items(), key=lambda item: -item[1])[:limit]:
+                self.stdout.write(f'{module:<48}{micros / 1000:>10.1f}ms')
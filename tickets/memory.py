@@ -0,0 +1,210 @@
+"""Memory instrumentation for long-running workers.
+
+With ``MEMORY_PROFILING=True`` tracemalloc traces every allocation (keeping
+``MEMORY_TRACE_FRAMES`` frames each) from startup, and MemoryMiddleware
+records how much each request allocated at its peak, per view, in the
+metrics. Requests peaking above ``MEMORY_REQUEST_PEAK_WARN_MB`` are logged.
+
+Snapshots of the traced allocations are written to ``MEMORY_SNAPSHOT_DIR``:
+one after the worker's first request (the baseline), one whenever a
+superuser sends ``X-Memory-Snapshot: 1``, and one before the worker is
+recycled. Only the newest ``MEMORY_MAX_SNAPSHOTS`` are kept. ``manage.py
+memory_report`` lists them and diffs any two, grouped by line, file or
+traceback, to show where memory grew.
+
+With ``MEMORY_RECYCLE_RSS_MB`` set, a worker whose resident memory passes
+that size asks to be replaced once its current request is done. Tracing is
+not needed for this. Under gunicorn the hook in ``gunicorn.conf.py`` turns
+the request into a graceful restart of that worker.
+
+tracemalloc slows allocation-heavy code down noticeably; enable it to
+investigate, not permanently. Peaks are per process, so they are
+approximate when requests overlap in a threaded or async worker.
+"""
+import linecache
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = '.tracemalloc'
+GROUP_BY = ('lineno', 'filename', 'traceback')
+# Allocations made by the instrumentation itself or the import system.
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+_state = {'requests': 0, 'recycling': False}
+# Set by the server (see gunicorn.conf.py) to replace this worker gracefully.
+_recycler = None
+
+
+def start():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACE_FRAMES)
+
+
+def rss_bytes():
+    """Return the process's resident set size."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Not Linux: fall back to the peak, in KiB on Linux/BSD and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def traced_bytes():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def snapshot_dir():
+    return Path(settings.MEMORY_SNAPSHOT_DIR)
+
+
+def take_snapshot(label):
+    """Write a snapshot of the traced allocations to disk and return its path.
+
+    The oldest snapshots beyond ``MEMORY_MAX_SNAPSHOTS`` are deleted.
+    """
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    path = snapshot_dir() / f'{os.getpid()}-{stamp}-{label}{SNAPSHOT_SUFFIX}'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    snapshot.dump(path)
+    logger.info('Memory snapshot written to %s', path)
+    # Other workers share the directory and may prune the same files.
+    for stale in list_snapshots()[:-max(settings.MEMORY_MAX_SNAPSHOTS, 1)]:
+        stale.unlink(missing_ok=True)
+    return path
+
+
+def list_snapshots():
+    """Return snapshot paths, oldest first."""
+    directory = snapshot_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob(f'*{SNAPSHOT_SUFFIX}'), key=lambda path: path.stat().st_mtime)
+
+
+def _where(frame):
+    filename = frame.filename
+    for prefix in sorted(map(str, [settings.BASE_DIR, *sys.path]), key=len, reverse=True):
+        if prefix and filename.startswith(prefix + '/'):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{filename}:{frame.lineno}'
+
+
+def _size(size):
+    return f'{size / 1024:,.1f} KiB'
+
+
+def _delta(size):
+    return f'{size / 1024:+,.1f} KiB'
+
+
+def top_report(path, group_by='lineno', limit=25):
+    """Render the largest allocations in one snapshot."""
+    snapshot = tracemalloc.Snapshot.load(path)
+    stats = snapshot.statistics(group_by)
+    lines = [f'{_size(sum(stat.size for stat in stats))} in {path.name}']
+    for stat in stats[:limit]:
+        lines.append(f'{_size(stat.size):>14} {stat.count:>9,} blocks  {_where(stat.traceback[0])}')
+        if group_by == 'traceback':
+            lines += [f'{"":>40}{_where(frame)}' for frame in stat.traceback[1:]]
+    return '\n'.join(lines)
+
+
+def diff_report(old_path, new_path, group_by='lineno', limit=25):
+    """Render what grew (or shrank) most between two snapshots."""
+    old = tracemalloc.Snapshot.load(old_path)
+    new = tracemalloc.Snapshot.load(new_path)
+    stats = new.compare_to(old, group_by)
+    total = sum(stat.size_diff for stat in stats)
+    lines = [f'{_delta(total)} from {old_path.name} to {new_path.name}']
+    for stat in stats[:limit]:
+        lines.append(
+            f'{_delta(stat.size_diff):>14} {stat.count_diff:>+9,} blocks'
+            f'  {_size(stat.size):>14} now  {_where(stat.traceback[0])}'
+        )
+        if group_by == 'traceback':
+            lines += [f'{"":>56}{_where(frame)}' for frame in stat.traceback[1:]]
+    return '\n'.join(lines)
+
+
+def set_recycler(func):
+    global _recycler
+    _recycler = func
+
+
+def recycle(reason):
+    """Ask for this worker to be replaced, once. Returns True if it was asked."""
+    with _lock:
+        if _state['recycling']:
+            return False
+        _state['recycling'] = True
+    metrics.incr('memory_recycles_total', reason=reason)
+    logger.warning('Recycling worker %d (%s): RSS %s', os.getpid(), reason, _size(rss_bytes()))
+    take_snapshot('recycle')
+    if _recycler is None:
+        logger.warning('No recycler is installed (not running under gunicorn); worker keeps running')
+        return False
+    _recycler()
+    return True
+
+
+def track_request(get_response, request):
+    """Run the request and record its peak traced allocation. Returns the response."""
+    if not (settings.MEMORY_PROFILING and tracemalloc.is_tracing()):
+        return get_response(request)
+
+    with _lock:
+        _state['requests'] += 1
+        first = _state['requests'] == 1
+    if first:
+        take_snapshot('baseline')
+
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    response = get_response(request)
+    peak = max(0, tracemalloc.get_traced_memory()[1] - before)
+
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else ''
+    metrics.incr('memory_requests_total', view=view)
+    metrics.incr('memory_request_peak_bytes_total', peak, view=view)
+    with _lock:
+        if peak > metrics.value('memory_request_peak_bytes_max', view=view):
+            metrics.set_gauge('memory_request_peak_bytes_max', peak, view=view)
+    if peak > settings.MEMORY_REQUEST_PEAK_WARN_MB * 1024 * 1024:
+        logger.warning('Request to %s (%s) peaked at %s of new allocations', request.path, view or '-',
+                       _size(peak))
+    return response
+
+
+def over_limit():
+    limit = settings.MEMORY_RECYCLE_RSS_MB
+    return bool(limit) and rss_bytes() > limit * 1024 * 1024
+
+
+metrics.register_gauge('memory_rss_bytes', rss_bytes)
+metrics.register_gauge('memory_traced_bytes', traced_bytes)
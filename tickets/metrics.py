@@ -0,0 +1,83 @@
+"""Process-local counters and gauges, exported in Prometheus text format.
+
+Each worker process keeps its own values; the scraper sums them. The
+``metrics`` view is only served when ``METRICS_TOKEN`` is set, to requests
+that send it as ``Authorization: Bearer <token>``.
+"""
+import hmac
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+# name -> callable returning the current value, read at export time.
+_collectors = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def incr(name, amount=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_gauge(name, func):
+    """Export ``func()`` as gauge ``name`` on every scrape."""
+    _collectors[name] = func
+
+
+def value(name, **labels):
+    with _lock:
+        key = _key(name, labels)
+        return _counters.get(key, _gauges.get(key, 0))
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+
+
+def _line(name, labels, value):
+    labels = dict(labels, pid=os.getpid())
+    rendered = ','.join(f'{label}="{labels[label]}"' for label in sorted(labels))
+    return f'{name}{{{rendered}}} {value}'
+
+
+def render():
+    with _lock:
+        counters = sorted(_counters.items())
+        gauges = dict(_gauges)
+    for name, func in _collectors.items():
+        gauges[_key(name, {})] = func()
+
+    lines = []
+    for kind, items in (('counter', counters), ('gauge', sorted(gauges.items()))):
+        declared = set()
+        for (name, labels), value in items:
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+            lines.append(_line(name, dict(labels), value))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    token = settings.METRICS_TOKEN
+    if not token:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4')
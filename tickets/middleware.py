@@ -1,5 +1,19 @@
+import cProfile
+import time
+from urllib.parse import urlsplit
+
 from django_ratelimit.exceptions import Ratelimited
+from django.conf import settings
+from django.contrib.auth import logout
 from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+from . import admission, compression, memory, metrics, profiling, slow_queries, static_pipeline
+from .routers import use_primary
+from .sessions import session_is_current
+from .viewer import Viewer
+
+REPLICA_PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
 
 
 class RatelimitMiddleware:
@@ -11,5 +25,226 @@ class RatelimitMiddleware:
 
     def process_exception(self, request, exception):
         if isinstance(exception, Ratelimited):
-            return HttpResponse('Too Many Requests', status=429)
+            response = HttpResponse('Too Many Requests', status=429)
+            retry_after = getattr(exception, 'retry_after', None)
+            if retry_after is not None:
+                response['Retry-After'] = str(retry_after)
+            return response
         return None
+
+
+class ReplicaPinningMiddleware:
+    """Give users read-your-writes consistency when read replicas are enabled.
+
+    Write requests read from the primary, and leave a short-lived cookie so
+    the follow-up requests (e.g. the redirect after adding a comment) do too,
+    until the replicas have caught up.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICA_ALIASES:
+            return self.get_response(request)
+
+        is_write = request.method not in SAFE_METHODS
+        if is_write or REPLICA_PIN_COOKIE in request.COOKIES:
+            with use_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+
+        if is_write:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class ViewerMiddleware:
+    """Attach ``request.viewer``, built lazily from ``request.user`` on first use."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.viewer = SimpleLazyObject(lambda: Viewer.from_user(request.user))
+        return self.get_response(request)
+
+
+class SessionEpochMiddleware:
+    """Log out sessions invalidated by a role change (or a signed-cookie logout).
+
+    Must come after AuthenticationMiddleware. The epoch is read from the
+    profile that ProfileModelBackend already loads with the user, so the
+    check costs no extra query.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated and not session_is_current(request):
+            logout(request)
+        return self.get_response(request)
+
+
+class AdmissionControlMiddleware:
+    """Limit concurrent requests per worker and shed the excess with a fast 503.
+
+    Must come after ViewerMiddleware: requests are prioritised by route and
+    role (see tickets.admission).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.ADMISSION_CONTROL:
+            return self.get_response(request)
+        priority = admission.request_priority(request)
+        if priority is None:
+            return self.get_response(request)
+
+        if not admission.controller.acquire(priority, settings.ADMISSION_QUEUE_TIMEOUT):
+            response = HttpResponse('Service temporarily overloaded', status=503)
+            response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+        metrics.incr('admission_admitted_total', priority=admission.PRIORITY_NAMES[priority])
+        try:
+            return self.get_response(request)
+        finally:
+            admission.controller.release()
+
+
+class RequestTimerMiddleware:
+    """Record when the request arrived, for ``duration_ms`` in log events (see tickets.log)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.started = time.monotonic()
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it or are sampled (see tickets.profiling).
+
+    The profile id is returned in an ``X-Profile-Id`` header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        trigger = profiling.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this process.
+            return self.get_response(request)
+        profilers = [profiler]
+        token = profiling.request_profilers.set(profilers)
+        try:
+            response = profiling.profiled_request(self.get_response, request)
+        finally:
+            profiler.disable()
+            profiling.request_profilers.reset(token)
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        profile = profiling.save(profilers, request, response, duration_ms, trigger)
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+class MemoryMiddleware:
+    """Track per-request peak allocations and recycle bloated workers (see tickets.memory).
+
+    A superuser can ask for a snapshot after their request with an
+    ``X-Memory-Snapshot: 1`` header; its filename is returned in the same header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (settings.MEMORY_PROFILING or settings.MEMORY_RECYCLE_RSS_MB):
+            return self.get_response(request)
+
+        response = memory.track_request(self.get_response, request)
+        if request.headers.get('X-Memory-Snapshot') == '1' and request.user.is_superuser:
+            path = memory.take_snapshot('requested')
+            if path is not None:
+                response['X-Memory-Snapshot'] = path.name
+        if memory.over_limit():
+            memory.recycle('rss')
+        return response
+
+
+class SlowQueryMiddleware:
+    """Tag slow queries with the view being served (see tickets.slow_queries)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.SLOW_QUERY_LOG:
+            return self.get_response(request)
+        token = slow_queries.set_view('')
+        try:
+            return self.get_response(request)
+        finally:
+            slow_queries.reset_view(token)
+            # Rows held back by a transaction that rolled back.
+            slow_queries.flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if settings.SLOW_QUERY_LOG:
+            slow_queries.set_view(request.resolver_match.view_name)
+
+
+class StaticAssetsMiddleware:
+    """Serve ``STATIC_ROOT`` under ``STATIC_URL`` with SERVE_STATIC (see tickets.static_pipeline).
+
+    Placed right after SecurityMiddleware, so static requests get its
+    headers but skip sessions, authentication and the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SERVE_STATIC and request.method in ('GET', 'HEAD'):
+            prefix = urlsplit(settings.STATIC_URL).path
+            if request.path_info.startswith(prefix):
+                response = static_pipeline.serve(request, request.path_info[len(prefix):])
+                if response is not None:
+                    return response
+        return self.get_response(request)
+
+
+class CompressionMiddleware:
+    """Compress text responses, streaming ones included, with RESPONSE_COMPRESSION (see tickets.compression).
+
+    Placed above every middleware that reads or changes the response body.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if settings.RESPONSE_COMPRESSION:
+            compression.compress_response(request, response)
+        return response
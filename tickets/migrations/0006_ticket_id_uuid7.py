@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:55
+
+import tickets.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0005_alter_comment_is_internal_alter_ticket_priority_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='id',
+            field=models.UUIDField(default=tickets.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_maintenancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='session_epoch',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:21
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0014_hot_query_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(django.db.models.functions.comparison.Collate('title', 'NOCASE'), name='ticket_title_nocase_idx'),
+        ),
+    ]
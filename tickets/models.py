@@ -1,9 +1,10 @@
 import os
-import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.functions import Collate
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from .ids import uuid7
 from .validators import validate_file_extension, validate_file_size
 
 
@@ -15,10 +16,31 @@ class Profile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
+    # Bumped whenever existing sessions must stop working (role change, or
+    # logout with signed-cookie sessions); see tickets.sessions.
+    session_epoch = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.username} - {self.get_role_display()}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_role = getattr(self, '_loaded_role', None)
+        if loaded_role is not None and loaded_role != self.role:
+            # A role change signs the user out everywhere, so no session keeps
+            # acting with the old permissions.
+            self.session_epoch += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'session_epoch'}
+        super().save(*args, **kwargs)
+        self._loaded_role = self.role
+
     @property
     def is_employee(self):
         return self.role == 'employee'
@@ -31,11 +53,19 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # Only write a profile that was loaded alongside the user, and never on
+    # partial saves such as the last_login update at login.
+    if created or update_fields is not None:
+        return
+    profile = instance._state.fields_cache.get('profile')
+    if profile is not None:
+        profile.save()
 
 
 class Ticket(models.Model):
+    is_archived = False
+
     STATUS_CHOICES = [
         ('open', 'Open'),
         ('in_progress', 'In Progress'),
@@ -51,7 +81,7 @@ class Ticket(models.Model):
         ('urgent', 'Urgent'),
     ]
 
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     title = models.CharField(max_length=200)
     description = models.TextField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', db_index=True)
@@ -63,9 +93,18 @@ class Ticket(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # Every list of tickets is ordered by created_at; these let each one
+        # walk an index in order instead of sorting (see tickets.query_plans).
         indexes = [
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['priority', 'created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['created_by', 'created_at']),
+            models.Index(fields=['assigned_to', 'created_at']),
+            models.Index(fields=['updated_at']),
+            # Title prefix search in the admin (tickets.scalable_admin):
+            # istartswith is a LIKE that SQLite can answer from a NOCASE index.
+            models.Index(Collate('title', 'NOCASE'), name='ticket_title_nocase_idx'),
         ]
 
     def __str__(self):
@@ -81,6 +120,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['ticket', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.ticket}"
@@ -95,20 +137,8 @@ def attachment_upload_path(instance, filename):
     return f'attachments/{filename}'
 
 
-class Attachment(models.Model):
-    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
-    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
-    file = models.FileField(
-        upload_to=attachment_upload_path,
-        validators=[validate_file_extension, validate_file_size]
-    )
-    original_filename = models.CharField(max_length=255)
-    file_size = models.PositiveIntegerField()
-    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
-    uploaded_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        ordering = ['uploaded_at']
+class AttachmentDisplayMixin:
+    """Display helpers shared by live and archived attachments."""
 
     def __str__(self):
         return f"{self.original_filename} ({self.file_size_display})"
@@ -149,3 +179,168 @@ class Attachment(models.Model):
             return 'bi-file-code'
         else:
             return 'bi-file-earmark'
+
+
+class Attachment(AttachmentDisplayMixin, models.Model):
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
+    file = models.FileField(
+        upload_to=attachment_upload_path,
+        validators=[validate_file_extension, validate_file_size]
+    )
+    original_filename = models.CharField(max_length=255)
+    file_size = models.PositiveIntegerField()
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['uploaded_at']
+
+
+# Archive tier: closed tickets older than ARCHIVE_AFTER_DAYS are moved here by
+# `manage.py archive_tickets`, keeping their original IDs so URLs still work.
+# These tables are read-only from the application's point of view.
+
+class ArchivedTicket(models.Model):
+    is_archived = True
+
+    id = models.UUIDField(primary_key=True, editable=False)
+    title = models.CharField(max_length=200)
+    description = models.TextField()
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    priority = models.CharField(max_length=10, choices=Ticket.PRIORITY_CHOICES)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    assigned_to = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(db_index=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedComment(models.Model):
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE, related_name='comments')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    body = models.TextField()
+    is_internal = models.BooleanField(default=False)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"Comment by {self.author.username} on {self.ticket}"
+
+
+class ArchivedAttachment(AttachmentDisplayMixin, models.Model):
+    ticket = models.ForeignKey(ArchivedTicket, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
+    comment = models.ForeignKey(ArchivedComment, on_delete=models.CASCADE, related_name='attachments', null=True, blank=True)
+    # Same storage path as the original upload; archiving never moves files.
+    file = models.FileField(upload_to=attachment_upload_path)
+    original_filename = models.CharField(max_length=255)
+    file_size = models.PositiveIntegerField()
+    uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    uploaded_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['uploaded_at']
+
+
+class MaintenanceCheckpoint(models.Model):
+    """Progress marker that lets long maintenance passes resume where they stopped."""
+
+    name = models.CharField(max_length=100, unique=True)
+    value = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
+class RateLimitCounter(models.Model):
+    """Hit count for one key in one fixed window (see tickets.ratelimit)."""
+
+    key = models.CharField(max_length=200)
+    bucket = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    expires_at = models.FloatField(db_index=True)  # unix time
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'bucket'], name='unique_ratelimit_bucket'),
+        ]
+
+    def __str__(self):
+        return f'{self.key} @ {self.bucket}: {self.count}'
+
+
+class TicketEvent(models.Model):
+    """A ticket or comment change, fanned out to live-update streams by tickets.events."""
+
+    KIND_CHOICES = [
+        ('ticket', 'Ticket changed'),
+        ('comment', 'Comment added'),
+    ]
+
+    ticket_id = models.UUIDField(db_index=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.kind} on {self.ticket_id}'
+
+
+class RequestProfile(models.Model):
+    """A cProfile capture of one request, written by ProfilingMiddleware (see tickets.profiling)."""
+
+    TRIGGER_CHOICES = [
+        ('requested', 'Requested'),
+        ('sampled', 'Sampled'),
+    ]
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    username = models.CharField(max_length=150, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    filename = models.CharField(max_length=100)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} ms)'
+
+
+class SlowQuery(models.Model):
+    """Slow executions of one normalized SQL statement (see tickets.slow_queries)."""
+
+    fingerprint = models.CharField(max_length=16, unique=True)
+    normalized_sql = models.TextField()
+    example_sql = models.TextField()
+    example_params = models.TextField(blank=True)
+    database = models.CharField(max_length=50)
+    view_name = models.CharField(max_length=200, blank=True)
+    call_site = models.CharField(max_length=300, blank=True)
+    plan = models.TextField(blank=True)
+    full_scan = models.BooleanField(default=False, db_index=True)
+    count = models.PositiveIntegerField(default=1)
+    total_ms = models.FloatField()
+    max_ms = models.FloatField()
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return self.normalized_sql[:80]
@@ -0,0 +1,173 @@
+"""On-demand request profiling (``PROFILING``).
+
+ProfilingMiddleware runs cProfile over a request when a superuser asks for
+it, with an ``X-Profile: 1`` header or a ``?_profile=1`` parameter, and over
+a random ``PROFILING_SAMPLE_RATE`` share of all other requests. The capture
+covers everything below the middleware: the view, ORM queries, form
+construction and template rendering. cProfile only traces the thread it
+was started on, so work a request hands to other threads (the async views'
+``tickets.aio.run_query`` calls, which run every one of their queries) is
+profiled on its own thread by ``profiled_thread`` and added to the request's
+profile. Those calls show as further roots of the call tree. The async view
+code that runs on the event loop between them is not traced.
+
+Profiles are kept in ``PROFILING_DIR`` as pstats files, indexed by
+``RequestProfile`` rows. Only the newest ``PROFILING_MAX_PROFILES`` are kept.
+The admin shows each one as a call tree and as a list of the functions
+with the most own time.
+"""
+import cProfile
+import io
+import pstats
+import random
+import sys
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .ids import uuid7
+from .models import RequestProfile
+
+# Call tree nodes below this share of the request's time are left out.
+MIN_TREE_FRACTION = 0.005
+MAX_TREE_DEPTH = 40
+HOT_FUNCTIONS = 40
+
+# The profilers of the request being profiled, set by ProfilingMiddleware.
+request_profilers = ContextVar('request_profilers', default=None)
+
+
+def trigger(request):
+    """Return why ``request`` should be profiled ('requested' or 'sampled'), or None."""
+    if not settings.PROFILING:
+        return None
+    asked = request.headers.get('X-Profile') == '1' or request.GET.get('_profile') == '1'
+    if asked and request.user.is_superuser:
+        return 'requested'
+    if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def profiled_request(get_response, request):
+    """The root of every call tree.
+
+    Calls made directly from the middleware are recorded without a caller,
+    and Django's handler wrapper is also called by every other middleware,
+    so the tree needs one function that is only ever called from here.
+    """
+    return get_response(request)
+
+
+def profiled_thread(func):
+    """Call ``func``, adding a profile of it to the request's if one is being taken.
+
+    For work that the request runs on another thread; contextvars carry the
+    request's profilers there.
+    """
+    profilers = request_profilers.get()
+    if profilers is None:
+        return func()
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already running.
+        return func()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        profilers.append(profiler)
+
+
+def profile_path(filename):
+    return Path(settings.PROFILING_DIR) / filename
+
+
+def save(profilers, request, response, duration_ms, trigger):
+    """Write the combined profile to disk and drop the oldest beyond PROFILING_MAX_PROFILES."""
+    filename = f'{uuid7().hex}.prof'
+    path = profile_path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    pstats.Stats(*profilers).dump_stats(path)
+
+    match = getattr(request, 'resolver_match', None)
+    profiles = RequestProfile.objects.using(DEFAULT_DB_ALIAS)
+    record = profiles.create(
+        method=request.method,
+        path=request.get_full_path()[:500],
+        view_name=match.view_name if match else '',
+        username=request.user.get_username() if hasattr(request, 'user') else '',
+        status_code=response.status_code,
+        duration_ms=duration_ms,
+        trigger=trigger,
+        filename=filename,
+    )
+    stale = profiles.order_by('-created_at', '-pk').values_list('pk', flat=True)[settings.PROFILING_MAX_PROFILES:]
+    profiles.filter(pk__in=list(stale)).delete()
+    return record
+
+
+@receiver(post_delete, sender=RequestProfile)
+def remove_profile_file(sender, instance, **kwargs):
+    profile_path(instance.filename).unlink(missing_ok=True)
+
+
+def load(profile):
+    return pstats.Stats(str(profile_path(profile.filename)))
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':
+        return name  # a builtin, e.g. "<method 'execute' of 'sqlite3.Cursor' objects>"
+    for prefix in sorted(map(str, [settings.BASE_DIR, *sys.path]), key=len, reverse=True):
+        if prefix and filename.startswith(prefix + '/'):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{filename}:{line}({name})'
+
+
+def call_tree(stats):
+    """Render ``stats`` as an indented call tree, children sorted by cumulative time.
+
+    cProfile records caller/callee pairs rather than whole call paths, so a
+    function's time is split between the paths that reach it in proportion
+    to the time each caller spent in it. Deep nodes are estimates.
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((edge[3], func))
+    roots = sorted(((data[3], func) for func, data in stats.stats.items() if not data[4]), reverse=True)
+    total = sum(cumulative for cumulative, _ in roots) or 1
+
+    lines = []
+
+    def walk(cumulative, func, depth, path):
+        if cumulative / total < MIN_TREE_FRACTION or depth > MAX_TREE_DEPTH:
+            return
+        lines.append(f'{cumulative * 1000:9.1f} ms {cumulative / total:6.1%}  {"  " * depth}{_label(func)}')
+        if func in path:
+            return  # recursion: the time is already counted above
+        share = cumulative / stats.stats[func][3] if stats.stats[func][3] else 0
+        for child_time, child in sorted(callees[func], reverse=True):
+            walk(child_time * share, child, depth + 1, path | {func})
+
+    for cumulative, func in roots:
+        walk(cumulative, func, 0, frozenset())
+    return '\n'.join(lines)
+
+
+def hot_functions(stats):
+    """Render the functions with the most own time, pstats style."""
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats('tottime').print_stats(HOT_FUNCTIONS)
+    return output.getvalue()
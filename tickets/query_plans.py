@@ -0,0 +1,250 @@
+"""Query-plan regression checks for the hot ticket queries (SQLite).
+
+Each query registered with ``hot_query`` is run through the same view code
+that serves it, and every SELECT it issues is passed through
+``EXPLAIN QUERY PLAN``. A plan fails the check when it:
+
+- scans a whole table instead of searching or walking an index;
+- walks a whole index: in index order, but with a WHERE condition on the
+  table or without a LIMIT, so the walk does not stop after a page;
+- builds a temporary B-tree to sort, group or deduplicate rows;
+- does not use an index the registration expects.
+
+``manage.py check_query_plans`` runs the checks against a seeded,
+production-sized dataset inside a transaction that is rolled back, and
+``assert_query_plans`` does the same from a test. A model change that drops
+an index, or a view change that orders or filters differently, shows up as a
+failing plan rather than as a slow page under load.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .models import Attachment, Comment, Ticket
+from .routers import use_primary
+from .sharding import gather
+from .slow_queries import explain, full_scans
+
+# Share of seeded tickets per status and priority, roughly what a help desk
+# accumulates: most tickets are closed, a few are urgent.
+SEED_STATUSES = {'closed': 60, 'resolved': 20, 'open': 10, 'in_progress': 6, 'waiting_on_asker': 4}
+SEED_PRIORITIES = {'low': 30, 'medium': 45, 'high': 20, 'urgent': 5}
+SEED_UNASSIGNED = 0.1
+SEED_DAYS = 730
+
+_registry = []
+
+
+class HotQuery:
+    """A registered hot query: ``run(employee, user)`` issues its SQL.
+
+    ``indexes`` lists ``(model, fields)`` pairs; each must be used by at
+    least one of the query's plans. Statements reading from a model in
+    ``small_sorts`` may sort in a temporary B-tree, for result sets that are
+    always a handful of rows. Statements reading from a model in
+    ``index_walks`` may walk a whole index of it: for counts over the whole
+    table, which read the narrowest covering index, and for ordered pages
+    filtered on a condition most rows meet, which stop after one LIMIT.
+    """
+
+    def __init__(self, name, run, indexes=(), small_sorts=(), index_walks=()):
+        self.name = name
+        self.run = run
+        self.indexes = tuple(indexes)
+        self.small_sorts = tuple(small_sorts)
+        self.index_walks = tuple(index_walks)
+
+    def __repr__(self):
+        return f'<HotQuery {self.name}>'
+
+
+def hot_query(name, indexes=(), small_sorts=(), index_walks=()):
+    """Register the decorated ``run(employee, user)`` function as a hot query."""
+    def decorator(run):
+        _registry.append(HotQuery(name, run, indexes, small_sorts, index_walks))
+        return run
+    return decorator
+
+
+def registered():
+    return list(_registry)
+
+
+class PlanResult:
+    def __init__(self, query, statements, problems):
+        self.query = query
+        self.statements = statements  # [(sql, plan)]
+        self.problems = problems
+
+    @property
+    def ok(self):
+        return not self.problems
+
+
+def index_names(connection, model, fields):
+    """Return the names of indexes on ``model`` whose columns are exactly ``fields``."""
+    table = model._meta.db_table
+    columns = [model._meta.get_field(name).column for name in fields]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return {name for name, info in constraints.items() if info['index'] and info['columns'] == columns}
+
+
+def plan_problems(plan, sql='', allow_sort=False, allow_walk=False):
+    """Return what is wrong with the EXPLAIN QUERY PLAN output for ``sql``."""
+    problems = []
+    for table, index in full_scans(plan, sql):
+        if not index:
+            problems.append('full table scan')
+        elif not allow_walk:
+            problems.append('full index scan')
+    if 'USE TEMP B-TREE' in plan and not allow_sort:
+        problems.append('temporary B-tree')
+    return problems
+
+
+def capture(connection, run, *args):
+    """Call ``run(*args)`` and return the ``(sql, params)`` of every SELECT it sends to ``connection``."""
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with use_primary(), connection.execute_wrapper(wrapper):
+        run(*args)
+    return statements
+
+
+def check(query, employee, user, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    statements = []
+    problems = []
+    small_sorts = [f'FROM "{model._meta.db_table}"' for model in query.small_sorts]
+    index_walks = [f'FROM "{model._meta.db_table}"' for model in query.index_walks]
+    for sql, params in capture(connection, query.run, employee, user):
+        plan = explain(connection, sql, params)
+        statements.append((sql, plan))
+        allow_sort = any(table in sql for table in small_sorts)
+        allow_walk = any(table in sql for table in index_walks)
+        problems += [f'{problem}: {sql}' for problem in plan_problems(plan, sql, allow_sort, allow_walk)]
+    plans = '\n'.join(plan for _, plan in statements)
+    for model, fields in query.indexes:
+        names = index_names(connection, model, fields)
+        if not names:
+            problems.append(f'no index on {model._meta.db_table}({", ".join(fields)})')
+        elif not any(f'INDEX {name}' in plans for name in names):
+            problems.append(f'index on {model._meta.db_table}({", ".join(fields)}) not used')
+    return PlanResult(query, statements, problems)
+
+
+def check_all(employee, user, using=DEFAULT_DB_ALIAS):
+    return [check(query, employee, user, using) for query in registered()]
+
+
+def seed(tickets=50_000, users=500, comments_per_ticket=2, using=DEFAULT_DB_ALIAS):
+    """Insert a production-sized dataset and ANALYZE it; return ``(employee, user)``.
+
+    Meant to run inside a transaction that is rolled back afterwards.
+    """
+    rng = random.Random(0)
+    now = timezone.now()
+    User.objects.using(using).bulk_create(
+        User(username=f'plan-check-{n}', email=f'plan-check-{n}@example.com') for n in range(users)
+    )
+    people = list(User.objects.using(using).filter(username__startswith='plan-check-'))
+    employees = people[:max(1, users // 20)]
+
+    statuses = rng.choices(list(SEED_STATUSES), weights=list(SEED_STATUSES.values()), k=tickets)
+    priorities = rng.choices(list(SEED_PRIORITIES), weights=list(SEED_PRIORITIES.values()), k=tickets)
+    rows = []
+    for n in range(tickets):
+        ticket = Ticket(
+            title=f'Seeded ticket {n}',
+            description='Seeded for query plan checks.',
+            status=statuses[n],
+            priority=priorities[n],
+            created_by=rng.choice(people),
+            assigned_to=None if rng.random() < SEED_UNASSIGNED else rng.choice(employees),
+        )
+        rows.append(ticket)
+    Ticket.objects.using(using).bulk_create(rows, batch_size=1000)
+    # created_at is auto_now_add, so spread it over SEED_DAYS afterwards.
+    for ticket in rows:
+        ticket.created_at = ticket.updated_at = now - timedelta(seconds=rng.randrange(SEED_DAYS * 86400))
+    Ticket.objects.using(using).bulk_update(rows, ['created_at', 'updated_at'], batch_size=1000)
+
+    Comment.objects.using(using).bulk_create(
+        (Comment(ticket=ticket, author=rng.choice(people), body='Seeded comment.',
+                 is_internal=rng.random() < 0.2)
+         for ticket in rows for _ in range(comments_per_ticket)),
+        batch_size=1000,
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute('ANALYZE')
+    return employees[0], people[-1]
+
+
+def assert_query_plans(employee=None, user=None, using=DEFAULT_DB_ALIAS):
+    """Raise AssertionError listing every failing plan (a test helper).
+
+    Without ``employee`` and ``user`` a production-sized dataset is seeded
+    first; call it inside a test's transaction so the rows are rolled back.
+    """
+    if employee is None or user is None:
+        employee, user = seed(using=using)
+    failures = [f'{result.query.name}: {problem}'
+                for result in check_all(employee, user, using) for problem in result.problems]
+    if failures:
+        raise AssertionError('Query plan regressions:\n' + '\n'.join(failures))
+
+
+# The registered hot queries. Each goes through the view helpers that serve
+# it, so a change to those helpers is checked too.
+
+def _dashboard(name, is_employee, indexes, index_walks=()):
+    from .views import dashboard_queries
+
+    def run(employee, user):
+        dashboard_queries(employee if is_employee else user, is_employee)[name]()
+    hot_query(f'dashboard {"employee" if is_employee else "user"} {name}', indexes, index_walks=index_walks)(run)
+
+
+def _ticket_list(name, employee_view, indexes, index_walks=(), **filters):
+    from .views import TICKET_LIST_PAGE_SIZE, _ticket_list_version, ticket_list_querysets
+
+    def run(employee, user):
+        viewer = employee if employee_view else user
+        querysets = ticket_list_querysets(viewer, employee_view, **filters)
+        _ticket_list_version(querysets)
+        list(Paginator(gather(querysets), TICKET_LIST_PAGE_SIZE).get_page(1))
+    hot_query(f'ticket_list {name}', indexes, index_walks=index_walks)(run)
+
+
+_dashboard('tickets', True, [(Ticket, ['created_at'])])
+_dashboard('unassigned_tickets', True, [(Ticket, ['assigned_to', 'created_at'])])
+_dashboard('my_assigned', True, [(Ticket, ['assigned_to', 'created_at'])])
+# The employee stats and the unfiltered list's count and version cover every
+# ticket, so they read a whole (covering) index by design.
+_dashboard('stats', True, [], index_walks=[Ticket])
+_dashboard('tickets', False, [(Ticket, ['created_by', 'created_at'])])
+_dashboard('stats', False, [])
+
+_ticket_list('employee', True, [(Ticket, ['created_at'])], index_walks=[Ticket])
+_ticket_list('employee by status', True, [(Ticket, ['status', 'created_at'])], status_filter='open')
+_ticket_list('employee by priority', True, [(Ticket, ['priority', 'created_at'])], priority_filter='urgent')
+_ticket_list('user', False, [(Ticket, ['created_by', 'created_at'])])
+_ticket_list('user by status', False, [], status_filter='open')
+
+
+@hot_query('ticket_detail comments', indexes=[(Comment, ['ticket', 'created_at'])], small_sorts=[Attachment])
+def _ticket_comments(employee, user):
+    from .views import ticket_comments
+
+    ticket = Ticket.objects.filter(created_by=user).first()
+    list(ticket_comments(ticket, is_employee=False))
@@ -0,0 +1,158 @@
+"""Sliding-window rate limiting shared by every worker process.
+
+Each limit keeps a hit counter per fixed window; a request is allowed while
+the current window's count plus the previous window's count, weighted by how
+much of it still overlaps the sliding window, stays within the limit. That
+approximates a true sliding log with two counters per key.
+
+Counters live in the primary database by default (``RATELIMIT_BACKEND =
+'database'``), which every process can see; ``'cache'`` uses ``CACHES``
+instead and is the better choice once that points at Redis or Memcached.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django_ratelimit.exceptions import Ratelimited
+
+from .models import RateLimitCounter
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Expired database counters are swept at most this often per process.
+PURGE_INTERVAL = 60  # seconds
+
+
+class RateLimited(Ratelimited):
+    """Raised when a limit is exceeded; ``retry_after`` is in whole seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too Many Requests')
+        self.retry_after = retry_after
+
+
+def parse_rate(rate):
+    """Turn ``'5/m'`` or ``'100/10m'`` into ``(limit, period_seconds)``."""
+    count, _, period = rate.partition('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+class DatabaseBackend:
+    """Counters in ``RateLimitCounter`` on the primary database."""
+
+    _last_purge = 0.0
+
+    def hit(self, key, bucket, expires_at):
+        """Count one hit; return ``{bucket: count}`` for ``bucket`` and the one before it."""
+        connection = connections[DEFAULT_DB_ALIAS]
+        qn = connection.ops.quote_name
+        table = qn(RateLimitCounter._meta.db_table)
+        key_col, bucket_col, count_col, expires_col = (
+            qn(name) for name in ('key', 'bucket', 'count', 'expires_at')
+        )
+        with transaction.atomic(using=DEFAULT_DB_ALIAS), connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({key_col}, {bucket_col}, {count_col}, {expires_col}) '
+                f'VALUES (%s, %s, 1, %s) '
+                f'ON CONFLICT ({key_col}, {bucket_col}) DO UPDATE SET {count_col} = {count_col} + 1',
+                [key, bucket, expires_at],
+            )
+            cursor.execute(
+                f'SELECT {bucket_col}, {count_col} FROM {table} WHERE {key_col} = %s AND {bucket_col} IN (%s, %s)',
+                [key, bucket, bucket - 1],
+            )
+            counts = dict(cursor.fetchall())
+        self._purge()
+        return counts
+
+    def _purge(self):
+        now = time.time()
+        if now - DatabaseBackend._last_purge < PURGE_INTERVAL:
+            return
+        DatabaseBackend._last_purge = now
+        RateLimitCounter.objects.using(DEFAULT_DB_ALIAS).filter(expires_at__lt=now).delete()
+
+
+class CacheBackend:
+    """Counters in the default cache; shared only if the cache is."""
+
+    def hit(self, key, bucket, expires_at):
+        current_key = f'ratelimit:{key}:{bucket}'
+        previous_key = f'ratelimit:{key}:{bucket - 1}'
+        cache.add(current_key, 0, timeout=max(1, math.ceil(expires_at - time.time())))
+        try:
+            current = cache.incr(current_key)
+        except ValueError:
+            # Evicted between add() and incr().
+            cache.set(current_key, 1, timeout=max(1, math.ceil(expires_at - time.time())))
+            current = 1
+        return {bucket: current, bucket - 1: cache.get(previous_key, 0)}
+
+
+BACKENDS = {
+    'database': DatabaseBackend,
+    'cache': CacheBackend,
+}
+
+
+def get_backend():
+    return BACKENDS[settings.RATELIMIT_BACKEND]()
+
+
+def retry_after(limit, period, previous, current, elapsed):
+    """Seconds until one more hit would fit under ``limit``, assuming no other hits.
+
+    Rejected hits are counted too, so a client that keeps retrying early
+    keeps pushing its own retry time back.
+    """
+    if current + 1 <= limit:
+        # The previous window's weight has to fade enough.
+        wait = period * (1 - (limit - current - 1) / previous) - elapsed
+    else:
+        # Only once the current window has become the (fading) previous one.
+        wait = period - elapsed + period * (1 - (limit - 1) / current)
+    return max(1, math.ceil(wait))
+
+
+def hit(key, rate, now=None):
+    """Record a hit for ``key``; raise ``RateLimited`` if it exceeds ``rate``."""
+    if not settings.RATELIMIT_ENABLE:
+        return
+    limit, period = parse_rate(rate)
+    now = time.time() if now is None else now
+    bucket = int(now // period)
+    elapsed = now - bucket * period
+    counts = get_backend().hit(key, bucket, expires_at=(bucket + 2) * period)
+    current, previous = counts.get(bucket, 0), counts.get(bucket - 1, 0)
+
+    if previous * (1 - elapsed / period) + current > limit:
+        raise RateLimited(retry_after(limit, period, previous, current, elapsed))
+
+
+def client_key(request, key):
+    """Identify the client for ``key``: ``'ip'``, ``'user'`` or ``'user_or_ip'``."""
+    if key in ('user', 'user_or_ip') and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    if key == 'user':
+        return 'user:anonymous'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def check_rate(request, group, key='user_or_ip', rate=None):
+    """Apply the ``group`` limit (from ``RATELIMITS`` unless ``rate`` is given) to ``request``."""
+    hit(f'{group}:{client_key(request, key)}', rate or settings.RATELIMITS[group])
+
+
+def rate_limit(group, key='user_or_ip', rate=None, methods=('POST',)):
+    """View decorator applying ``check_rate()`` to requests with one of ``methods``."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                check_rate(request, group, key, rate)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
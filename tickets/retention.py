@@ -0,0 +1,183 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import (
+    Ticket, Attachment, ArchivedTicket, ArchivedAttachment, MaintenanceCheckpoint,
+)
+
+logger = logging.getLogger(__name__)
+
+# (ticket model, attachment model) for the hot and archive tables.
+TIERS = {
+    'hot': (Ticket, Attachment),
+    'archive': (ArchivedTicket, ArchivedAttachment),
+}
+
+ATTACHMENT_ROOT = 'attachments'
+
+
+def ticket_databases():
+    return settings.TICKET_SHARD_ALIASES or ['default']
+
+
+class RateLimiter:
+    """Sleep just enough to keep work under ``max_per_second`` items."""
+
+    def __init__(self, max_per_second=None):
+        self.max_per_second = max_per_second
+        self.started = time.monotonic()
+        self.done = 0
+
+    def wait(self, items=1):
+        self.done += items
+        if not self.max_per_second:
+            return
+        ahead = self.done / self.max_per_second - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def expired_tickets(model, policy, using='default'):
+    """Return tickets matching a retention policy, oldest first."""
+    cutoff = timezone.now() - timedelta(days=policy['days'])
+    return (
+        model.objects.using(using)
+        .filter(status__in=policy['statuses'], updated_at__lt=cutoff)
+        .order_by('updated_at', 'pk')
+    )
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            storage.delete(name)
+        except OSError:
+            # Left behind for the next reconcile_media run.
+            logger.warning('Could not delete attachment file %s', name)
+
+
+def purge_batch(ticket_model, attachment_model, ticket_ids, using='default', storage=default_storage):
+    """Delete one batch of tickets with their comments and attachments.
+
+    The rows go in one short transaction; files are removed from storage only
+    after it commits, so a rollback never leaves rows pointing at deleted files.
+    """
+    with transaction.atomic(using=using):
+        attachments = attachment_model.objects.using(using).filter(
+            Q(ticket_id__in=ticket_ids) | Q(comment__ticket_id__in=ticket_ids)
+        )
+        file_names = [name for name in attachments.values_list('file', flat=True) if name]
+        attachments.delete()
+        # Cascades to the comments, whose attachments are already gone.
+        deleted, _ = ticket_model.objects.using(using).filter(pk__in=ticket_ids).delete()
+        transaction.on_commit(lambda: _delete_files(storage, file_names), using=using)
+    return deleted
+
+
+def purge_expired(policies=None, batch_size=None, max_rate=None, dry_run=False, using='default'):
+    """Apply every retention policy to both tiers; yields ``(tier, policy, count)`` per batch.
+
+    Each batch commits on its own, so an interrupted run simply picks up the
+    remaining expired tickets next time.
+    """
+    policies = policies if policies is not None else settings.TICKET_RETENTION_POLICIES
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    limiter = RateLimiter(max_rate)
+
+    for tier, (ticket_model, attachment_model) in TIERS.items():
+        for policy in policies:
+            queryset = expired_tickets(ticket_model, policy, using)
+            if dry_run:
+                yield tier, policy, queryset.count()
+                continue
+            while True:
+                ticket_ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+                if not ticket_ids:
+                    break
+                purge_batch(ticket_model, attachment_model, ticket_ids, using)
+                logger.info('Purged %d %s tickets on %s', len(ticket_ids), tier, using)
+                yield tier, policy, len(ticket_ids)
+                limiter.wait(len(ticket_ids))
+
+
+def walk_storage(storage, path=ATTACHMENT_ROOT):
+    """Yield every file name under ``path`` in ``walk_order``."""
+    try:
+        directories, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    entries = [(name, False) for name in directories] + [(name, True) for name in files]
+    for name, is_file in sorted(entries):
+        full_name = f'{path}/{name}'
+        if is_file:
+            yield full_name
+        else:
+            yield from walk_storage(storage, full_name)
+
+
+def walk_order(name):
+    """Sort key giving the order ``walk_storage`` yields names in.
+
+    The walk sorts each directory's entries by name, so ``a/1/x`` comes
+    before ``a/1.pdf`` although it sorts after it as a plain string.
+    """
+    return name.split('/')
+
+
+def referenced_files(names):
+    """Return the subset of ``names`` still referenced by a live or archived attachment."""
+    found = set()
+    for using in ticket_databases():
+        for _, attachment_model in TIERS.values():
+            found.update(
+                attachment_model.objects.using(using).filter(file__in=names).values_list('file', flat=True)
+            )
+    return found
+
+
+def find_orphans(storage=default_storage, batch_size=500, grace=None, resume=False, max_rate=None,
+                 checkpoint_name='reconcile_media'):
+    """Walk storage and yield attachment files that no database row references.
+
+    Files modified within ``grace`` are skipped, since an upload in progress
+    writes the file before its row commits. The last checked name is saved
+    after each batch, so ``resume=True`` continues an interrupted pass from
+    the next name in ``walk_order``.
+    """
+    grace = grace if grace is not None else timedelta(hours=settings.RETENTION_ORPHAN_GRACE_HOURS)
+    checkpoint, _ = MaintenanceCheckpoint.objects.get_or_create(name=checkpoint_name)
+    start_after = walk_order(checkpoint.value) if resume and checkpoint.value else None
+    limiter = RateLimiter(max_rate)
+    cutoff = timezone.now() - grace
+
+    batch = []
+    for name in walk_storage(storage):
+        if start_after is not None and walk_order(name) <= start_after:
+            continue
+        batch.append(name)
+        if len(batch) >= batch_size:
+            yield from _orphans_in(storage, batch, cutoff)
+            checkpoint.value = batch[-1]
+            checkpoint.save(update_fields=['value', 'updated_at'])
+            limiter.wait(len(batch))
+            batch = []
+    if batch:
+        yield from _orphans_in(storage, batch, cutoff)
+
+    # A full pass finished; the next resume starts from the beginning.
+    checkpoint.value = ''
+    checkpoint.save(update_fields=['value', 'updated_at'])
+
+
+def _orphans_in(storage, names, cutoff):
+    referenced = referenced_files(names)
+    for name in names:
+        if name not in referenced and storage.get_modified_time(name) < cutoff:
+            yield name
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# True while the current request (or block) must read from the primary:
+# during writes and for a short window after them (read-your-writes).
+_pin_primary = ContextVar('pin_primary', default=False)
+
+# alias -> (checked_at, healthy)
+_health = {}
+
+# Models partitioned by ticket when TICKET_SHARDS is set. Everything else
+# (users, profiles, sessions) lives on the primary.
+SHARDED_MODELS = {'tickets.ticket', 'tickets.comment', 'tickets.attachment'}
+
+
+@contextmanager
+def use_primary():
+    """Route every read inside the block to the primary database."""
+    token = _pin_primary.set(True)
+    try:
+        yield
+    finally:
+        _pin_primary.reset(token)
+
+
+def pinned_to_primary():
+    """Return True if replicas are in use but reads here must go to the primary."""
+    return bool(settings.DATABASE_REPLICA_ALIASES) and (
+        _pin_primary.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def refresh_replica(primary_path, replica_path):
+    """Copy the SQLite database at ``primary_path`` over ``replica_path``.
+
+    The copy is written to a temporary file and swapped in, so readers never
+    see a half-written replica. Its mtime is set to when the copy started:
+    every write to the primary after that may be missing from it (see
+    ``file_lag``).
+    """
+    started = time.time()
+    tmp_path = f'{replica_path}.tmp'
+    source = sqlite3.connect(str(primary_path))
+    try:
+        target = sqlite3.connect(tmp_path)
+        try:
+            source.backup(target)
+            # Replicas are read-only copies; a rollback journal avoids
+            # stale -wal/-shm files surviving the swap below.
+            target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.utime(tmp_path, (started, started))
+    os.replace(tmp_path, replica_path)
+
+
+def file_lag(primary_path, replica_path, now=None):
+    """Return how long the replica file has been missing writes, in seconds.
+
+    A replica is current until the primary file (or its WAL) is written after
+    the replica's refresh. From then on it is stale by the time since that
+    refresh, however recent the write: the difference between the two mtimes
+    would stay small while the replica kept missing the write.
+    """
+    refreshed_at = os.path.getmtime(replica_path)
+    primary_mtime = max(
+        (os.path.getmtime(path) for path in (primary_path, primary_path + '-wal') if os.path.exists(path)),
+        default=0.0,
+    )
+    if primary_mtime <= refreshed_at:
+        return 0.0
+    return max(0.0, (time.time() if now is None else now) - refreshed_at)
+
+
+def replica_lag(alias):
+    """Return how many seconds a replica is behind the primary, or None if unusable.
+
+    For SQLite file replicas this is ``file_lag`` of the replica file.
+    """
+    replica = connections[alias]
+    if replica.vendor != 'sqlite' or replica.is_in_memory_db():
+        return 0.0
+
+    replica_path = replica.settings_dict['NAME']
+    if not os.path.exists(replica_path):
+        return None
+    return file_lag(str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME']), str(replica_path))
+
+
+def replica_is_healthy(alias):
+    """Return whether a replica is present and within ``DATABASE_REPLICA_MAX_LAG``.
+
+    Results are cached for ``DATABASE_REPLICA_CHECK_INTERVAL`` seconds so the
+    check does not run on every query.
+    """
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        return healthy
+
+    lag = replica_lag(alias)
+    healthy = lag is not None and lag <= settings.DATABASE_REPLICA_MAX_LAG
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+class ReplicaRouter:
+    """Send reads to a healthy replica and everything else to the primary.
+
+    Only models from ``DATABASE_REPLICA_APPS`` are read from replicas; sessions
+    and the admin log always use the primary. Reads also stay on the primary
+    when the current request is pinned (see ``ReplicaPinningMiddleware``),
+    inside a transaction on the primary, or when no replica is healthy.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICA_ALIASES
+        if not replicas or model._meta.app_label not in settings.DATABASE_REPLICA_APPS:
+            return None
+        if pinned_to_primary():
+            return DEFAULT_DB_ALIAS
+
+        healthy = [alias for alias in replicas if replica_is_healthy(alias)]
+        if not healthy:
+            return DEFAULT_DB_ALIAS
+        return random.choice(healthy)
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica must still be saved to the primary.
+        if settings.DATABASE_REPLICA_ALIASES:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        pool = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICA_ALIASES}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary; never migrate them directly.
+        if db in settings.DATABASE_REPLICA_ALIASES:
+            return False
+        return None
+
+
+def shard_for(ticket_id):
+    """Return the database alias holding the given ticket.
+
+    The shard is picked from a hash of the UUID rather than its leading bits,
+    because UUIDv7 IDs start with a timestamp and would otherwise send every
+    new ticket to the same shard.
+    """
+    aliases = settings.TICKET_SHARD_ALIASES
+    digest = hashlib.blake2b(ticket_id.bytes, digest_size=8).digest()
+    return aliases[int.from_bytes(digest, 'big') % len(aliases)]
+
+
+def _shard_for_instance(instance):
+    if instance._meta.label_lower == 'tickets.ticket':
+        return shard_for(instance.pk)
+    if getattr(instance, 'ticket_id', None):
+        return shard_for(instance.ticket_id)
+    # An attachment on a comment: follow the cached comment, never query for it.
+    comment = instance._state.fields_cache.get('comment')
+    if comment is not None:
+        return comment._state.db or shard_for(comment.ticket_id)
+    return instance._state.db
+
+
+class ShardRouter:
+    """Route tickets, comments and attachments to the shard owning the ticket.
+
+    Routing needs a ticket ID, so it only works when Django passes an
+    ``instance`` hint: saves, related lookups such as ``ticket.comments``, and
+    querysets pinned with ``tickets.sharding.ticket_queryset()``. Cross-shard
+    reads go through ``tickets.sharding.scatter()``/``gather()``.
+    """
+
+    def _route(self, model, **hints):
+        if not settings.TICKET_SHARD_ALIASES:
+            return None
+        instance = hints.get('instance')
+        if instance is None or instance._meta.label_lower not in SHARDED_MODELS:
+            return None
+        if model._meta.label_lower in SHARDED_MODELS:
+            return _shard_for_instance(instance)
+        # e.g. ticket.created_by: users live on the primary.
+        return DEFAULT_DB_ALIAS
+
+    db_for_read = _route
+    db_for_write = _route
+
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = settings.TICKET_SHARD_ALIASES
+        if obj1._state.db in shards or obj2._state.db in shards:
+            return True
+        return None
@@ -0,0 +1,186 @@
+"""Admin behaviour for large ticket and comment tables (``ADMIN_SCALABLE``).
+
+The stock changelist counts every matching row twice (the page count and
+the "N total" next to the search box), and searches with ``icontains``,
+which SQLite can only answer by reading the whole table. The change page
+renders every comment and attachment of the ticket as an inline. With
+``ADMIN_SCALABLE`` the ticket, comment and attachment admins instead:
+
+- count an unfiltered table from ``sqlite_stat1`` (as of the last
+  ``ANALYZE``; see ``manage.py sqlite_maintenance``) and a filtered one up
+  to ``ADMIN_COUNT_LIMIT`` rows, shown as "about N" and "N+";
+- search by title prefix, through an index on ``title COLLATE NOCASE``,
+  by exact username and by exact id, rather than by substring;
+- show the latest ``ADMIN_INLINE_LIMIT`` comments and attachments of a
+  ticket, read-only, with links to all of them in their own changelists.
+
+Bulk actions (``bulk_update``) are one UPDATE for all selected rows, in
+either mode. They bypass ``save()`` and its signals, so the whole ticket
+cache is invalidated at once and no live-update events are published.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import ticket_cache
+from .sqlite import write_transaction
+
+
+def estimated_count(queryset):
+    """Return the row count ``ANALYZE`` recorded for the queryset's table, or None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [queryset.model._meta.db_table])
+        except DatabaseError:  # sqlite_stat1 exists only once ANALYZE has run.
+            return None
+        row = cursor.fetchone()
+    return int(row[0].split()[0]) if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Paginator that never counts more than ``ADMIN_COUNT_LIMIT`` rows.
+
+    ``approximate`` is ``'estimate'`` when the count comes from
+    ``sqlite_stat1``, ``'capped'`` when there are at least as many rows as
+    the limit, and None when the count is exact.
+    """
+
+    approximate = None
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if not query.where and not query.distinct:
+            estimate = estimated_count(self.object_list)
+            if estimate is not None:
+                self.approximate = 'estimate'
+                return estimate
+        limit = settings.ADMIN_COUNT_LIMIT
+        count = self.object_list.order_by()[:limit].count()
+        if count >= limit:
+            self.approximate = 'capped'
+        return count
+
+    @property
+    def count_label(self):
+        if self.approximate == 'estimate':
+            return f'about {self.count:,}'
+        if self.approximate == 'capped':
+            return f'{self.count:,}+'
+        return str(self.count)
+
+
+def search(model, queryset, term, prefix_fields=(), user_fields=(), exact_fields=()):
+    """Filter ``queryset`` to rows matching ``term`` through indexes only.
+
+    A row matches if a ``prefix_fields`` value starts with the term (case
+    insensitively), a ``user_fields`` foreign key points at the user of that
+    username, or an ``exact_fields`` value (a primary or foreign key) equals
+    it. Every branch is an index search on ``model``'s own table, which
+    SQLite combines with a MULTI-INDEX OR.
+    """
+    condition = Q(pk__in=[])
+    for name in prefix_fields:
+        condition |= Q(**{f'{name}__istartswith': term})
+    if user_fields:
+        user_ids = list(User.objects.filter(username=term).values_list('pk', flat=True))
+        if user_ids:
+            for name in user_fields:
+                condition |= Q(**{f'{name}__in': user_ids})
+    for name in exact_fields:
+        field = model._meta.get_field(name)
+        try:
+            value = (field.target_field if field.is_relation else field).to_python(term)
+        except ValidationError:
+            continue
+        condition |= Q(**{name: value})
+    return queryset.filter(condition)
+
+
+def bulk_update(queryset, **values):
+    """Set ``values`` on every row of the Ticket ``queryset`` in one UPDATE; return the row count.
+
+    ``updated_at`` is set too, which also moves the ticket list version on.
+    """
+    values.setdefault('updated_at', timezone.now())
+    using = queryset.db
+    with write_transaction(using=using):
+        count = queryset.update(**values)
+        if count and settings.TICKET_CACHE:
+            transaction.on_commit(ticket_cache.invalidate_all, using=using)
+    return count
+
+
+class ScalableAdminMixin:
+    """ModelAdmin behaviour under ``ADMIN_SCALABLE``; see the module docstring.
+
+    ``prefix_search_fields``, ``user_search_fields`` and
+    ``exact_search_fields`` are passed to ``search``. Inlines with a
+    ``parent_field`` are limited to the parent's latest rows.
+    """
+
+    prefix_search_fields = ()
+    user_search_fields = ()
+    exact_search_fields = ()
+    scalable_search_help_text = None
+
+    @property
+    def show_full_result_count(self):
+        return not settings.ADMIN_SCALABLE
+
+    @property
+    def search_help_text(self):
+        return self.scalable_search_help_text if settings.ADMIN_SCALABLE else None
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if settings.ADMIN_SCALABLE:
+            return EstimatedCountPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not settings.ADMIN_SCALABLE:
+            return super().get_search_results(request, queryset, search_term)
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        queryset = search(self.model, queryset, term, self.prefix_search_fields, self.user_search_fields,
+                          self.exact_search_fields)
+        return queryset, False
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        parent_field = getattr(inline, 'parent_field', None)
+        if settings.ADMIN_SCALABLE and parent_field and not obj._state.adding:
+            queryset = kwargs['queryset']
+            latest = (queryset.filter(**{parent_field: obj}).order_by(*inline.latest_ordering)
+                      .values('pk')[:settings.ADMIN_INLINE_LIMIT])
+            kwargs['queryset'] = queryset.filter(pk__in=latest)
+        return kwargs
+
+
+class LatestRowsInlineMixin:
+    """An inline that, under ``ADMIN_SCALABLE``, is read-only and limited to the latest rows.
+
+    ``parent_field`` is the foreign key to the parent and ``latest_ordering``
+    the ordering that puts the latest rows first.
+    """
+
+    parent_field = None
+    latest_ordering = ('-pk',)
+
+    def has_add_permission(self, request, obj=None):
+        return not settings.ADMIN_SCALABLE and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return not settings.ADMIN_SCALABLE and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not settings.ADMIN_SCALABLE and super().has_delete_permission(request, obj)
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.core.checks import Warning, register
+from django.db.models import F
+from django.dispatch import receiver
+
+from .models import Profile
+
+# Session key holding the Profile.session_epoch the session was created under.
+SESSION_EPOCH_KEY = '_session_epoch'
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def current_epoch(user):
+    try:
+        return user.profile.session_epoch
+    except Profile.DoesNotExist:
+        return 0
+
+
+def bump_session_epoch(user):
+    """Invalidate every existing session of ``user``."""
+    Profile.objects.filter(user=user).update(session_epoch=F('session_epoch') + 1)
+
+
+def session_is_current(request):
+    """Return False if the logged-in user's sessions were invalidated since login.
+
+    Sessions created before this check existed carry no epoch; they are
+    stamped with the current one instead of being rejected.
+    """
+    stored = request.session.get(SESSION_EPOCH_KEY)
+    current = current_epoch(request.user)
+    if stored is None:
+        request.session[SESSION_EPOCH_KEY] = current
+        return True
+    return stored == current
+
+
+@receiver(user_logged_in)
+def stamp_session_epoch(sender, request, user, **kwargs):
+    request.session[SESSION_EPOCH_KEY] = current_epoch(user)
+
+
+@receiver(user_logged_out)
+def revoke_signed_cookie_sessions(sender, request, user, **kwargs):
+    # Server-side sessions are deleted by logout() itself. A signed cookie
+    # cannot be revoked on its own, so every session of the user is.
+    if user is not None and settings.SESSION_MODE == 'signed_cookies':
+        bump_session_epoch(user)
+
+
+@register()
+def check_session_mode(app_configs, **kwargs):
+    errors = []
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.SESSION_MODE == 'cached_db' and backend in PROCESS_LOCAL_CACHES:
+        errors.append(Warning(
+            'SESSION_MODE=cached_db is using a per-process cache.',
+            hint='With several workers a logout only clears the cache of one of them; '
+                 'set CACHE_BACKEND to a shared cache such as Redis or Memcached.',
+            id='tickets.W001',
+        ))
+    return errors
@@ -0,0 +1,139 @@
+import heapq
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ticket
+from .routers import shard_for
+
+# Shards keep a copy of auth_user so that foreign keys from tickets and
+# comments to users stay valid inside each shard database. Passwords are not
+# copied; authentication always happens against the primary.
+USER_COPY_EXCLUDE = {'password'}
+
+
+def is_sharded():
+    return bool(settings.TICKET_SHARD_ALIASES)
+
+
+def ticket_queryset(pk, model=Ticket):
+    """Return a queryset for ``model`` (Ticket or ArchivedTicket) on the shard that owns ``pk``."""
+    if is_sharded():
+        return model.objects.using(shard_for(pk))
+    return model.objects.all()
+
+
+def scatter(queryset):
+    """Return one copy of ``queryset`` per shard (just ``queryset`` when not sharded)."""
+    if not is_sharded():
+        return [queryset]
+    return [queryset.using(alias) for alias in settings.TICKET_SHARD_ALIASES]
+
+
+def gather(querysets, ordering='-created_at'):
+    """Combine per-shard querysets into one ordered result set.
+
+    With a single queryset it is returned unchanged, so callers behave exactly
+    like plain ORM code when sharding is off.
+    """
+    if len(querysets) == 1:
+        return querysets[0]
+    return MergedQuerySet(querysets, ordering)
+
+
+def aggregate(querysets, **aggregates):
+    """Run ``aggregate()`` on every shard and sum the results.
+
+    Only additive aggregates such as ``Count`` and ``Sum`` can be combined
+    this way.
+    """
+    totals = dict.fromkeys(aggregates, 0)
+    for queryset in querysets:
+        for key, value in queryset.aggregate(**aggregates).items():
+            totals[key] += value or 0
+    return totals
+
+
+class MergedQuerySet:
+    """A read-only, queryset-like view over the same query on several shards.
+
+    Each shard is queried with the same ordering and the rows are merged in
+    Python. Slicing only fetches ``stop`` rows from each shard, so it works
+    with ``Paginator``; deep pages cost ``page * per_page`` rows per shard.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets, ordering='-created_at'):
+        field = ordering.lstrip('-')
+        self._querysets = [qs.order_by(ordering) for qs in querysets]
+        self._key = attrgetter(field)
+        self._reverse = ordering.startswith('-')
+        self._result_cache = None
+
+    def _merge(self, querysets):
+        return heapq.merge(*querysets, key=self._key, reverse=self._reverse)
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return sum(qs.count() for qs in self._querysets)
+
+    def __iter__(self):
+        if self._result_cache is None:
+            self._result_cache = list(self._merge(self._querysets))
+        return iter(self._result_cache)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __bool__(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        return any(qs.exists() for qs in self._querysets)
+
+    def __getitem__(self, key):
+        if self._result_cache is not None:
+            return self._result_cache[key]
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        if key.step is not None or key.stop is None:
+            return list(self)[key]
+        start = key.start or 0
+        merged = self._merge([qs[:key.stop] for qs in self._querysets])
+        return list(islice(merged, start, key.stop))
+
+
+def copy_user_to_shards(user):
+    """Insert or update the shard copies of ``user``."""
+    values = {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+        if field.attname not in USER_COPY_EXCLUDE
+    }
+    for alias in settings.TICKET_SHARD_ALIASES:
+        copies = User.objects.using(alias).filter(pk=user.pk)
+        # QuerySet.update()/bulk_create() do not send signals, so this cannot
+        # recurse into the post_save handlers.
+        if not copies.update(**values):
+            User.objects.using(alias).bulk_create([User(password='!', **values)])
+
+
+@receiver(post_save, sender=User)
+def sync_user_to_shards(sender, instance, raw=False, using=None, **kwargs):
+    if raw or not is_sharded() or using in settings.TICKET_SHARD_ALIASES:
+        return
+    copy_user_to_shards(instance)
+
+
+@receiver(post_delete, sender=User)
+def delete_user_from_shards(sender, instance, using=None, **kwargs):
+    if not is_sharded() or using in settings.TICKET_SHARD_ALIASES:
+        return
+    for alias in settings.TICKET_SHARD_ALIASES:
+        # Cascades to the user's tickets and comments on that shard.
+        User.objects.using(alias).filter(pk=instance.pk).delete()
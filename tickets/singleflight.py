@@ -0,0 +1,158 @@
+"""Coalesce concurrent identical computations (single-flight).
+
+When many requests ask for the same expensive result at once (employees all
+opening the dashboard at shift start), only the first runs the queries; the
+others wait for and share its result. Optionally:
+
+- a result may be served for ``stale`` seconds after it was computed while
+  a background refresh runs (stale-while-revalidate), started at most once
+  per ``SINGLEFLIGHT_REFRESH_INTERVAL`` for each key;
+- with ``SINGLEFLIGHT_SHARED`` a lock in the shared cache coalesces the same
+  work across worker processes too.
+
+Callers whose reads are pinned to the primary (see ``tickets.routers``)
+never share a computation or result with callers reading from a replica.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .routers import pinned_to_primary, use_primary
+
+logger = logging.getLogger(__name__)
+
+# How often a worker waiting on another process's computation checks the cache.
+SHARED_POLL_INTERVAL = 0.05  # seconds
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}  # key -> (computed_at, value)
+        self._refreshed = {}  # key -> when its last background refresh started
+        self.stats = {'computed': 0, 'coalesced': 0, 'stale': 0}
+
+    def do(self, key, func, stale=None):
+        """Return ``func()``, sharing one computation among concurrent callers of ``key``."""
+        stale = settings.SINGLEFLIGHT_STALE_SECONDS if stale is None else stale
+        if pinned_to_primary():
+            # A replica's result may lack this caller's own writes.
+            key = f'{key}:primary'
+        with self._lock:
+            cached = self._results.get(key)
+            now = time.monotonic()
+            if cached is not None and now - cached[0] <= stale:
+                self.stats['stale'] += 1
+                last_refresh = max(cached[0], self._refreshed.get(key, cached[0]))
+                if key not in self._calls and now - last_refresh >= settings.SINGLEFLIGHT_REFRESH_INTERVAL:
+                    self._start_refresh(key, func, stale)
+                return cached[1]
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.stats['coalesced'] += 1
+
+        if leader:
+            self._run(key, call, func, stale)
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def forget(self, key=None):
+        """Drop kept results for ``key`` (or all keys)."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+                self._refreshed.clear()
+            else:
+                for name in (key, f'{key}:primary'):
+                    self._results.pop(name, None)
+                    self._refreshed.pop(name, None)
+
+    def _start_refresh(self, key, func, stale):
+        # Called with self._lock held.
+        call = self._calls[key] = _Call()
+        self._refreshed[key] = time.monotonic()
+        # The new thread starts outside the caller's transaction and pin.
+        primary = pinned_to_primary()
+
+        def refresh():
+            try:
+                if primary:
+                    with use_primary():
+                        self._run(key, call, func, stale)
+                else:
+                    self._run(key, call, func, stale)
+            except Exception:
+                logger.exception('Background refresh of %s failed', key)
+            finally:
+                close_old_connections()
+
+        threading.Thread(target=refresh, name=f'singleflight-{key}', daemon=True).start()
+
+    def _run(self, key, call, func, stale):
+        try:
+            call.value = _compute(key, func)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.stats['computed'] += 1
+                if call.error is None and stale > 0:
+                    self._results[key] = (time.monotonic(), call.value)
+            call.done.set()
+
+
+def _compute(key, func):
+    """Run ``func``, or with SINGLEFLIGHT_SHARED wait for another worker already running it."""
+    if not settings.SINGLEFLIGHT_SHARED:
+        return func()
+
+    timeout = settings.SINGLEFLIGHT_LOCK_TIMEOUT
+    lock_key = f'singleflight:lock:{key}'
+    result_key = f'singleflight:result:{key}'
+    started = time.time()
+    if cache.add(lock_key, 1, timeout=timeout):
+        try:
+            value = func()
+            cache.set(result_key, (time.time(), value), timeout=timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    while time.time() - started < timeout:
+        time.sleep(SHARED_POLL_INTERVAL)
+        result = cache.get(result_key)
+        # Only a result finished after we arrived is as fresh as our own would be.
+        if result is not None and result[0] >= started:
+            return result[1]
+        if cache.get(lock_key) is None:
+            # The leader is done: it may have stored its result just now.
+            result = cache.get(result_key)
+            if result is not None and result[0] >= started:
+                return result[1]
+            break
+    # The other worker failed, died or is too slow; compute it ourselves.
+    return func()
+
+
+flight = SingleFlight()
@@ -0,0 +1,243 @@
+"""Slow-query log (``SLOW_QUERY_LOG``).
+
+An execute wrapper is installed on every database connection. It times each
+statement and, for those taking ``SLOW_QUERY_MS`` or longer, records:
+
+- the SQL with literals replaced by ``?``, and a fingerprint of it;
+- one example of the statement and its parameters;
+- the view being served and the first call site in the project's code;
+- on SQLite, the ``EXPLAIN QUERY PLAN`` output for SELECTs, flagged when it
+  reads a whole table, directly or by walking one of its indexes.
+
+Each slow query goes to the ``tickets.slow_queries`` logger (a rotating
+``logs/slow_queries.log``) and is aggregated by fingerprint into
+``SlowQuery`` rows, which the admin lists by total time. Those rows are
+written outside the caller's transaction: after it commits, or, when it
+rolls back, once ``SlowQueryMiddleware`` finishes the request.
+"""
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_current_view = ContextVar('slow_query_view', default='')
+# Set while a slow query is being recorded, so the EXPLAIN and the SlowQuery
+# writes are not timed and recorded themselves.
+_recording = threading.local()
+# SlowQuery updates waiting for the default database's transaction to end.
+_pending = threading.local()
+
+# Parameters of statements on these tables are never stored.
+REDACTED_TABLES = ('auth_user', 'django_session')
+MAX_PARAMS_LENGTH = 1000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:\?|%s)\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+_PLACEHOLDER = re.compile(r'%s')
+_LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+# The conditions of each WHERE clause, up to the clause that follows it.
+_WHERE = re.compile(r'\bWHERE\b(.*?)(?=\b(?:GROUP BY|HAVING|ORDER BY|LIMIT)\b|$)', re.IGNORECASE | re.DOTALL)
+
+
+def normalize(sql):
+    """Replace literals and placeholders with ``?`` and collapse IN lists and whitespace."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+def full_scans(plan, sql=''):
+    """Return ``(table, index)`` for each table an EXPLAIN QUERY PLAN reads in full.
+
+    ``index`` is True when the table is read in index order (``SCAN t
+    USING [COVERING] INDEX``) rather than row by row. Such a walk stops
+    early only when ``sql`` has a LIMIT and no WHERE condition on the table,
+    as in the newest-first pages; otherwise it reads every entry and is
+    reported too. Tables are named as in the plan, by alias if they have one.
+    """
+    limited = _LIMIT.search(sql) is not None
+    conditions = ' '.join(_WHERE.findall(sql))
+    scans = []
+    for line in plan.splitlines():
+        detail = line.strip().lstrip('|`- ')
+        if not detail.startswith('SCAN '):
+            continue
+        table = detail.split()[1]
+        if ' USING ' not in detail:
+            scans.append((table, False))
+        elif not limited or re.search(rf'(?<![\w"])"?{re.escape(table)}"?\.', conditions):
+            scans.append((table, True))
+    return scans
+
+
+def is_full_scan(plan, sql=''):
+    """Return True if an EXPLAIN QUERY PLAN of ``sql`` reads a whole table or index."""
+    return bool(full_scans(plan, sql))
+
+
+def call_site():
+    """Return ``path:line (function)`` of the innermost frame in the project's own code."""
+    base = str(settings.BASE_DIR) + '/'
+    this_file = str(Path(__file__).resolve())
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and filename != this_file and '/site-packages/' not in filename:
+            return f'{filename[len(base):]}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return ''
+
+
+def set_view(view_name):
+    return _current_view.set(view_name)
+
+
+def reset_view(token):
+    _current_view.reset(token)
+
+
+def explain(connection, sql, params):
+    if connection.vendor != 'sqlite' or not sql.lstrip().upper().startswith('SELECT'):
+        return ''
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        # Rows are (id, parent, notused, detail); indent by nesting depth.
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in cursor.fetchall():
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append(f'{"  " * depth[node]}{detail}')
+        return '\n'.join(lines)
+
+
+def record(connection, sql, params, many, duration_ms, site):
+    from .models import SlowQuery
+
+    normalized = normalize(sql)
+    key = fingerprint(normalized)
+    now = timezone.now()
+    view_name = _current_view.get()
+    logger.warning(
+        'Slow query (%.1f ms) on %s from %s at %s: %s', duration_ms, connection.alias, view_name or '-',
+        site or '-', normalized, extra={'action': 'slow_query', 'duration_ms': round(duration_ms, 1)},
+    )
+
+    defaults = None
+    if not SlowQuery.objects.using(DEFAULT_DB_ALIAS).filter(fingerprint=key).exists():
+        if any(table in sql for table in REDACTED_TABLES):
+            shown_params = '(redacted)'
+        else:
+            shown_params = repr(params)[:MAX_PARAMS_LENGTH]
+        try:
+            plan = '' if many else explain(connection, sql, params)
+        except Exception as error:
+            plan = f'EXPLAIN failed: {error}'
+        defaults = {
+            'normalized_sql': normalized,
+            'example_sql': sql,
+            'example_params': shown_params,
+            'database': connection.alias,
+            'view_name': view_name,
+            'call_site': site,
+            'plan': plan,
+            'full_scan': is_full_scan(plan, sql),
+            'total_ms': duration_ms,
+            'max_ms': duration_ms,
+            'last_seen': now,
+        }
+
+    _pending_rows().append((key, duration_ms, now, defaults))
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        # Writing now would make the caller's transaction a write, and a
+        # rollback would take the row with it. Commit flushes it, and so does
+        # SlowQueryMiddleware once a rolled-back request is over.
+        transaction.on_commit(_write_pending, using=DEFAULT_DB_ALIAS)
+    else:
+        _write_pending()
+
+
+def _pending_rows():
+    # Per thread, like the connections whose transactions they wait for.
+    if not hasattr(_pending, 'rows'):
+        _pending.rows = []
+    return _pending.rows
+
+
+def _save(key, duration_ms, now, defaults):
+    from .models import SlowQuery
+
+    queries = SlowQuery.objects.using(DEFAULT_DB_ALIAS)
+    updated = queries.filter(fingerprint=key).update(
+        count=F('count') + 1,
+        total_ms=F('total_ms') + duration_ms,
+        max_ms=Greatest('max_ms', duration_ms),
+        last_seen=now,
+    )
+    if not updated and defaults is not None:
+        queries.get_or_create(fingerprint=key, defaults=defaults)
+
+
+def flush():
+    """Write the slow queries this thread held back, unless the default database is still in a transaction."""
+    if not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        _write_pending()
+
+
+def _write_pending():
+    rows = _pending_rows()
+    if not rows:
+        return
+    _pending.rows = []
+    active = getattr(_recording, 'active', False)
+    _recording.active = True
+    try:
+        for row in rows:
+            _save(*row)
+    except Exception:
+        logger.exception('Could not record a slow query')
+    finally:
+        _recording.active = active
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if getattr(_recording, 'active', False):
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= settings.SLOW_QUERY_MS:
+        site = call_site()
+        _recording.active = True
+        try:
+            record(context['connection'], sql, params, many, duration_ms, site)
+        except Exception:
+            logger.exception('Could not record a slow query')
+        finally:
+            _recording.active = False
+    return result
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """Install the slow-query wrapper on every new connection (a ``connection_created`` receiver)."""
+    if settings.SLOW_QUERY_LOG and slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
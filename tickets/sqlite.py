@@ -0,0 +1,70 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_write_lock = threading.Lock()
+
+
+def apply_pragmas(cursor, pragmas):
+    """Run ``PRAGMA name = value`` for each entry and return the resulting values."""
+    applied = {}
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.execute(f'PRAGMA {name}')
+        row = cursor.fetchone()
+        applied[name] = row[0] if row else None
+    return applied
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Apply the production SQLite profile to every new connection."""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRODUCTION:
+        return
+    pragmas = dict(settings.SQLITE_PRAGMAS)
+    if connection.alias in settings.DATABASE_REPLICA_ALIASES:
+        # Replica files are swapped in whole by refresh_replicas; keep them
+        # in rollback-journal mode.
+        pragmas.pop('journal_mode', None)
+    with connection.cursor() as cursor:
+        applied = apply_pragmas(cursor, pragmas)
+    logger.debug('Applied SQLite pragmas on %s: %s', connection.alias, applied)
+
+
+@contextmanager
+def write_lock():
+    """Serialize database writes within this process.
+
+    SQLite allows a single writer at a time. Queuing writers on an in-process
+    lock means concurrent requests in the same worker wait their turn instead
+    of racing for the database lock; ``busy_timeout`` still covers contention
+    between worker processes. If the lock cannot be acquired within
+    ``SQLITE_WRITE_LOCK_TIMEOUT`` seconds the write proceeds anyway.
+    """
+    if not settings.SQLITE_WRITE_SERIALIZATION:
+        yield
+        return
+
+    acquired = _write_lock.acquire(timeout=settings.SQLITE_WRITE_LOCK_TIMEOUT)
+    if not acquired:
+        logger.warning('Timed out waiting for the SQLite write lock; proceeding without it')
+    try:
+        yield
+    finally:
+        if acquired:
+            _write_lock.release()
+
+
+@contextmanager
+def write_transaction(using=None):
+    """An atomic block on ``using`` taken under ``write_lock``.
+
+    Views wrap only their database writes in it, so uploads, file storage
+    and e-mail never hold up the other writers in the process.
+    """
+    with write_lock(), transaction.atomic(using=using):
+        yield
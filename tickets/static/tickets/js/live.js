@@ -0,0 +1,135 @@
+// Live updates over Server-Sent Events (see tickets/events.py).
+// Patches the ticket detail page and the dashboard's unassigned queue in
+// place; pages work unchanged when this script or EventSource is missing.
+(function () {
+    'use strict';
+
+    var UNASSIGNED_LIMIT = 5;
+
+    function formatDate(iso) {
+        return new Date(iso).toLocaleString(undefined, {
+            month: 'short', day: '2-digit', year: 'numeric', hour: 'numeric', minute: '2-digit'
+        });
+    }
+
+    function setBadge(element, text, classes) {
+        element.textContent = text;
+        element.className = element.className.replace(/\b(bg|text)-\S+/g, '').trim() + ' ' + classes;
+    }
+
+    function listen(url, handlers) {
+        if (!url || !window.EventSource) {
+            return;
+        }
+        var source = new EventSource(url);
+        Object.keys(handlers).forEach(function (kind) {
+            source.addEventListener(kind, function (message) {
+                handlers[kind](JSON.parse(message.data));
+            });
+        });
+    }
+
+    function ticketPage(root) {
+        var list = document.getElementById('comment-list');
+        var count = document.getElementById('comment-count');
+        var template = document.getElementById('comment-template');
+
+        listen(root.dataset.eventsUrl, {
+            ticket: function (data) {
+                root.querySelectorAll('[data-live="status"]').forEach(function (el) {
+                    setBadge(el, data.status_display, data.status_badge);
+                });
+                root.querySelectorAll('[data-live="priority"]').forEach(function (el) {
+                    setBadge(el, data.priority_display, data.priority_badge);
+                });
+                root.querySelectorAll('[data-live="assigned_to"]').forEach(function (el) {
+                    el.textContent = data.assigned_to || 'Unassigned';
+                });
+            },
+            comment: function (data) {
+                if (list.querySelector('[data-comment-id="' + data.id + '"]')) {
+                    return;
+                }
+                var node = template.content.firstElementChild.cloneNode(true);
+                node.dataset.commentId = data.id;
+                node.querySelector('[data-field="author"]').textContent = data.author;
+                node.querySelector('[data-field="created_at"]').textContent = formatDate(data.created_at);
+                node.querySelector('[data-field="body"]').textContent = data.body;
+                if (data.is_internal) {
+                    node.classList.add('internal-comment');
+                } else {
+                    node.querySelector('[data-field="internal"]').remove();
+                }
+                if (list.lastElementChild) {
+                    list.lastElementChild.classList.add('border-bottom');
+                }
+                list.appendChild(node);
+                count.textContent = list.children.length;
+                var empty = document.getElementById('no-comments');
+                if (empty) {
+                    empty.remove();
+                }
+            }
+        });
+    }
+
+    function queue(root) {
+        var body = root.querySelector('tbody');
+        var empty = document.getElementById('no-unassigned-tickets');
+        var template = document.getElementById('unassigned-row-template');
+
+        function url(pattern, id) {
+            return pattern.replace('00000000-0000-0000-0000-000000000000', id);
+        }
+
+        function refresh() {
+            var hasRows = body.children.length > 0;
+            root.classList.toggle('d-none', !hasRows);
+            empty.classList.toggle('d-none', hasRows);
+        }
+
+        listen(root.dataset.eventsUrl, {
+            ticket: function (data) {
+                var row = body.querySelector('[data-ticket-id="' + data.ticket + '"]');
+                if (data.assigned_to) {
+                    if (row) {
+                        row.remove();
+                    }
+                    refresh();
+                    return;
+                }
+                if (!row) {
+                    row = template.content.firstElementChild.cloneNode(true);
+                    row.dataset.ticketId = data.ticket;
+                    row.querySelector('form').action = url(template.dataset.assignUrl, data.ticket);
+                    body.insertBefore(row, body.firstElementChild);
+                    while (body.children.length > UNASSIGNED_LIMIT) {
+                        body.lastElementChild.remove();
+                    }
+                }
+                var title = row.querySelector('td a');
+                title.textContent = data.title;
+                title.href = url(template.dataset.detailUrl, data.ticket);
+                var priority = row.querySelector('.badge');
+                if (priority) {
+                    setBadge(priority, data.priority_display, data.priority_badge);
+                }
+                var createdBy = row.querySelector('[data-field="created_by"]');
+                if (createdBy) {
+                    createdBy.textContent = data.created_by;
+                    row.querySelector('[data-field="created_at"]').textContent = formatDate(data.created_at);
+                }
+                refresh();
+            }
+        });
+    }
+
+    var ticketRoot = document.getElementById('live-ticket');
+    if (ticketRoot) {
+        ticketPage(ticketRoot);
+    }
+    var queueRoot = document.getElementById('unassigned-tickets');
+    if (queueRoot && queueRoot.dataset.eventsUrl) {
+        queue(queueRoot);
+    }
+})();
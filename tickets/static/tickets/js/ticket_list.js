@@ -0,0 +1,69 @@
+// Filter and page the ticket list without reloading the page: requests go
+// out with an HX-Request header and only the results fragment is swapped
+// in. Without JavaScript the form and links work as plain page loads.
+(function () {
+    'use strict';
+
+    var results = document.getElementById('ticket-results');
+    var form = document.getElementById('ticket-filters');
+    if (!results || !form || !window.fetch || !window.history.pushState) {
+        return;
+    }
+
+    function load(url, push) {
+        fetch(url, {headers: {'HX-Request': 'true'}, credentials: 'same-origin'})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.status);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                results.innerHTML = html;
+                if (push) {
+                    window.history.pushState(null, '', url);
+                }
+            })
+            .catch(function () {
+                window.location.href = url;
+            });
+    }
+
+    function formUrl() {
+        var params = new URLSearchParams();
+        new FormData(form).forEach(function (value, name) {
+            if (value) {
+                params.append(name, value);
+            }
+        });
+        var query = params.toString();
+        return window.location.pathname + (query ? '?' + query : '');
+    }
+
+    form.addEventListener('submit', function (event) {
+        event.preventDefault();
+        load(formUrl(), true);
+    });
+    form.addEventListener('change', function () {
+        load(formUrl(), true);
+    });
+    results.addEventListener('click', function (event) {
+        var link = event.target.closest('a.page-link');
+        if (link) {
+            event.preventDefault();
+            load(link.href, true);
+        }
+    });
+    window.addEventListener('popstate', function () {
+        // Put the filter controls back in step with the restored URL.
+        var params = new URLSearchParams(window.location.search);
+        Array.prototype.forEach.call(form.elements, function (field) {
+            if (field.type === 'checkbox') {
+                field.checked = params.get(field.name) === field.value;
+            } else if (field.name) {
+                field.value = params.get(field.name) || '';
+            }
+        });
+        load(window.location.href, false);
+    });
+})();
@@ -0,0 +1,323 @@
+"""Self-hosted, hashed and precompressed static assets (``STATIC_VENDORED``).
+
+The pipeline:
+
+1. ``tickets/static/vendor/`` holds the pinned Bootstrap, Popper and
+   Bootstrap Icons files exactly as published, each with its SHA-384 in
+   ``vendor.lock.json`` (the same value as the SRI hash upstream lists).
+   ``manage.py build_static --download`` fetches any that are missing from
+   the CDN and checks them against the lock, recording the hash of a file
+   with no entry yet for review; it is only needed to upgrade.
+2. ``manage.py build_static`` prunes the Bootstrap and icon rules whose
+   classes appear nowhere in the project's templates, scripts or Python
+   code. It bundles what is left with ``style.css`` into
+   ``tickets/dist/app.css``, which is committed too; rerun it when
+   templates change.
+3. At deploy time, ``manage.py collectstatic`` runs ``CompressedManifestStaticFilesStorage``.
+   It gives every file a content-hashed name and writes ``.gz`` variants of
+   text files, plus ``.br`` and ``.zst`` when those codecs are installed.
+
+With ``SERVE_STATIC=True``, StaticAssetsMiddleware serves ``STATIC_ROOT``.
+It picks the precompressed variant the browser accepts and marks hashed
+files as immutable for a year.
+"""
+import base64
+import hashlib
+import json
+import mimetypes
+import posixpath
+import re
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.checks import Warning, register
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date
+
+from .compression import ENCODINGS, negotiate
+
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+VENDOR_DIR = STATIC_DIR / 'vendor'
+LOCK_FILE = VENDOR_DIR / 'vendor.lock.json'
+BUNDLE = 'tickets/dist/app.css'
+
+BOOTSTRAP_CDN = 'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist'
+POPPER_CDN = 'https://cdn.jsdelivr.net/npm/@popperjs/core@2.11.8/dist'
+ICONS_CDN = 'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.3/font'
+# static path -> pinned source URL
+VENDOR_FILES = {
+    'vendor/bootstrap/bootstrap.min.css': f'{BOOTSTRAP_CDN}/css/bootstrap.min.css',
+    'vendor/popper/popper.min.js': f'{POPPER_CDN}/umd/popper.min.js',
+    'vendor/bootstrap/bootstrap.min.js': f'{BOOTSTRAP_CDN}/js/bootstrap.min.js',
+    'vendor/bootstrap-icons/bootstrap-icons.min.css': f'{ICONS_CDN}/bootstrap-icons.min.css',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff2': f'{ICONS_CDN}/fonts/bootstrap-icons.woff2',
+    'vendor/bootstrap-icons/fonts/bootstrap-icons.woff': f'{ICONS_CDN}/fonts/bootstrap-icons.woff',
+}
+# Loaded at the end of every page, in order: Bootstrap's scripts need Popper first.
+SCRIPTS = ('vendor/popper/popper.min.js', 'vendor/bootstrap/bootstrap.min.js')
+# Stylesheets bundled into BUNDLE, in order; the vendored ones are pruned.
+BUNDLE_SOURCES = (
+    ('vendor/bootstrap/bootstrap.min.css', True),
+    ('vendor/bootstrap-icons/bootstrap-icons.min.css', True),
+    ('tickets/css/style.css', False),
+)
+# Classes Bootstrap's JavaScript adds at runtime (collapse, dropdowns,
+# dismissible alerts, form validation), so they never appear in templates.
+JS_CLASSES = {
+    'show', 'showing', 'hide', 'hiding', 'fade', 'collapse', 'collapsing', 'collapsed', 'active',
+    'disabled', 'dropdown-menu-end', 'was-validated', 'is-valid', 'is-invalid',
+}
+# Files named by ManifestStaticFilesStorage (``app.3f2a9c1b7d4e.css``) never
+# change, so browsers may keep them for a year without revalidating.
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'public, max-age=300, must-revalidate'
+# WOFF and WOFF2 fonts are compressed already.
+COMPRESSIBLE = ('.css', '.js', '.svg', '.map', '.json', '.txt', '.html', '.xml')
+MIN_COMPRESS_SIZE = 512
+
+_TOKEN = re.compile(r'[A-Za-z_][\w-]*-?')
+_CLASS = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+_NEGATED = re.compile(r':(?:not|is|where|has)\((?:[^()]|\([^()]*\))*\)')
+_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def integrity(data):
+    """Return the SRI value (``sha384-...``) of ``data``."""
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def download():
+    """Fetch missing vendor files, verifying them against (or recording them in) the lock file."""
+    lock = json.loads(LOCK_FILE.read_text()) if LOCK_FILE.exists() else {}
+    fetched = []
+    for name, url in VENDOR_FILES.items():
+        path = STATIC_DIR / name
+        if path.exists():
+            continue
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        digest = integrity(data)
+        pinned = lock.get(name, {}).get('integrity')
+        if pinned and pinned != digest:
+            raise ValueError(f'{url} does not match {LOCK_FILE.name}: {digest} != {pinned}')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        lock[name] = {'url': url, 'integrity': digest}
+        fetched.append(name)
+    LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+    LOCK_FILE.write_text(json.dumps(lock, indent=2, sort_keys=True) + '\n')
+    return fetched
+
+
+def used_tokens(paths):
+    """Return every word that could be a class name in ``paths``.
+
+    Deliberately broad: any identifier-like word in a template, script or
+    module counts as used. Words ending in ``-`` (``bg-{{ color }}``) are
+    prefixes and keep every class that starts with them.
+    """
+    tokens = set(JS_CLASSES)
+    for path in paths:
+        tokens.update(_TOKEN.findall(Path(path).read_text(errors='ignore')))
+    return tokens
+
+
+def project_sources():
+    """Templates, scripts and Python modules that may name CSS classes."""
+    base = Path(settings.BASE_DIR)
+    sources = []
+    for directory in Path(__file__).resolve().parent, base / 'templates':
+        if directory.is_dir():
+            sources += directory.rglob('*.html')
+            sources += directory.rglob('*.py')
+    sources += (path for path in STATIC_DIR.rglob('*.js') if VENDOR_DIR not in path.parents)
+    return [path for path in sources if 'migrations' not in path.parts and path.name != 'tests.py']
+
+
+def _is_used(class_name, tokens, prefixes):
+    return class_name in tokens or class_name.startswith(prefixes)
+
+
+def _selector_used(selector, tokens, prefixes):
+    # Classes inside :not() and friends are not required to match.
+    classes = _CLASS.findall(_NEGATED.sub('', selector))
+    return all(_is_used(name, tokens, prefixes) for name in classes)
+
+
+def _blocks(css):
+    """Split ``css`` into ``(prelude, body)`` pairs; statements like ``@import`` have ``body=None``."""
+    i, n = 0, len(css)
+    while i < n:
+        start = i
+        while i < n and css[i] not in '{;':
+            if css[i] in '"\'':
+                i = css.index(css[i], i + 1)
+            i += 1
+        prelude = css[start:i].strip()
+        if i >= n:
+            break
+        if css[i] == ';':
+            i += 1
+            if prelude:
+                yield prelude, None
+            continue
+        depth, body_start = 1, i + 1
+        i += 1
+        while depth:
+            if css[i] in '"\'':
+                i = css.index(css[i], i + 1)
+            elif css[i] == '{':
+                depth += 1
+            elif css[i] == '}':
+                depth -= 1
+            i += 1
+        yield prelude, css[body_start:i - 1]
+
+
+def prune_css(css, tokens):
+    """Drop the selectors of ``css`` that need a class not in ``tokens``, and rules left empty."""
+    prefixes = tuple(token for token in tokens if token.endswith('-'))
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    out = []
+    for prelude, body in _blocks(css):
+        if body is None:
+            out.append(f'{prelude};')
+        elif prelude.startswith(('@media', '@supports', '@container', '@layer')):
+            inner = prune_css(body, tokens)
+            if inner:
+                out.append(f'{prelude}{{{inner}}}')
+        elif prelude.startswith('@'):
+            out.append(f'{prelude}{{{body}}}')  # @font-face, @keyframes, ...
+        else:
+            selectors = [s.strip() for s in prelude.split(',') if _selector_used(s, tokens, prefixes)]
+            if selectors:
+                out.append(f'{",".join(selectors)}{{{body.strip()}}}')
+    return ''.join(out)
+
+
+def rewrite_urls(css, source, target):
+    """Make relative ``url()`` references in ``source`` work from ``target`` (both static paths)."""
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', '#', '/')) or '://' in url:
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(source), url.split('?')[0].split('#')[0]))
+        return f'url("{posixpath.relpath(path, posixpath.dirname(target))}")'
+    return _URL.sub(replace, css)
+
+
+def bundle_css():
+    """Return the text of BUNDLE built from BUNDLE_SOURCES, and ``[(source, original bytes, bundled bytes)]``."""
+    tokens = used_tokens(project_sources())
+    parts, sizes = [], []
+    for name, prune in BUNDLE_SOURCES:
+        css = (STATIC_DIR / name).read_text()
+        bundled = rewrite_urls(prune_css(css, tokens) if prune else css, name, BUNDLE)
+        parts.append(f'/* {name} */\n{bundled}\n')
+        sizes.append((name, len(css.encode()), len(bundled.encode())))
+    return ''.join(parts), sizes
+
+
+def build_bundle():
+    """Write BUNDLE from BUNDLE_SOURCES; return ``[(source, original bytes, bundled bytes)]``."""
+    css, sizes = bundle_css()
+    path = STATIC_DIR / BUNDLE
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(css)
+    return sizes
+
+
+def precompress(path):
+    """Write each encoding's variant next to ``path`` when it is worth it; return the suffixes written."""
+    data = path.read_bytes()
+    written = []
+    for suffix, compress in ENCODINGS.values():
+        compressed = compress(data)
+        if len(compressed) < len(data) * 0.95:
+            Path(f'{path}{suffix}').write_bytes(compressed)
+            written.append(suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes precompressed variants of text files.
+
+    The vendored files keep their ``sourceMappingURL`` comments as published,
+    but the maps are not vendored, so those references are left alone
+    instead of failing collectstatic.
+    """
+
+    patterns = tuple(
+        (glob, tuple(pattern for pattern in group
+                     if 'sourceMappingURL' not in (pattern if isinstance(pattern, str) else pattern[0])))
+        for glob, group in ManifestStaticFilesStorage.patterns
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = []
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            if not isinstance(result, Exception):
+                processed += [name, hashed_name or name]
+            yield name, hashed_name, result
+        if dry_run:
+            return
+        for name in set(processed):
+            path = Path(self.path(name))
+            if path.suffix in COMPRESSIBLE and path.is_file() and path.stat().st_size >= MIN_COMPRESS_SIZE:
+                precompress(path)
+
+
+def serve(request, name):
+    """Return a response for the collected static file ``name``, or None if there is none.
+
+    The preferred precompressed variant the client accepts is sent in place
+    of the file, with ``Vary: Accept-Encoding`` either way.
+    """
+    root = Path(settings.STATIC_ROOT).resolve()
+    path = (root / name).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    variants = {encoding: Path(f'{path}{suffix}') for encoding, (suffix, _) in ENCODINGS.items()}
+    encoding = negotiate(request.headers.get('Accept-Encoding'),
+                         [encoding for encoding, variant in variants.items() if variant.is_file()])
+    served = variants[encoding] if encoding else path
+    stat = served.stat()
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+        else:
+            response = FileResponse(served.open('rb'), content_type=content_type)
+            # FileResponse names the variant (app.css.br) inline; static files need no disposition.
+            del response['Content-Disposition']
+        response['Content-Length'] = stat.st_size
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = IMMUTABLE_CACHE if HASHED_NAME.search(path.name) else REVALIDATE_CACHE
+    return response
+
+
+@register()
+def check_vendored_assets(app_configs, **kwargs):
+    errors = []
+    if settings.STATIC_VENDORED:
+        missing = [name for name in [*VENDOR_FILES, BUNDLE] if not finders.find(name)]
+        if missing:
+            errors.append(Warning(
+                f'STATIC_VENDORED is on but {", ".join(missing)} not found.',
+                hint='Run `manage.py build_static --download` (once) and `manage.py build_static` '
+                     'before collectstatic.',
+                id='tickets.W003',
+            ))
+    return errors
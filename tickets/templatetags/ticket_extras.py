@@ -1,8 +1,56 @@
 from django import template
+from django.conf import settings
+from django.template import engines
+from django.templatetags.static import static
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from ..models import TicketEvent
+from ..static_pipeline import BUNDLE, SCRIPTS, VENDOR_FILES
 
 register = template.Library()
 
 
+@register.simple_tag
+def live_events_url(name, *args):
+    """URL of a live-update stream, resuming after the newest event; '' when disabled."""
+    if not settings.LIVE_UPDATES:
+        return ''
+    latest = TicketEvent.objects.using('default').order_by('-pk').values_list('pk', flat=True).first()
+    return f'{reverse(name, args=args)}?after={latest or 0}'
+
+
+@register.simple_tag(takes_context=True)
+def hot_rows(context, name):
+    """Include the row template ``name``, from tickets/jinja2/ with HOT_TEMPLATE_ENGINE=jinja2 (see tickets.jinja_env)."""
+    if settings.HOT_TEMPLATE_ENGINE == 'jinja2':
+        template = engines['jinja2'].get_template(name)
+        return mark_safe(template.render(context.flatten(), context.get('request')))
+    return context.template.engine.get_template(name).render(context)
+
+
+@register.simple_tag
+def stylesheets():
+    """Bootstrap, its icons and the site styles: one pruned local bundle with STATIC_VENDORED."""
+    if settings.STATIC_VENDORED:
+        return format_html('<link rel="stylesheet" href="{}">', static(BUNDLE))
+    return format_html(
+        '<link rel="stylesheet" href="{}">\n    <link rel="stylesheet" href="{}">\n    <link rel="stylesheet" href="{}">',
+        VENDOR_FILES['vendor/bootstrap/bootstrap.min.css'],
+        VENDOR_FILES['vendor/bootstrap-icons/bootstrap-icons.min.css'],
+        static('tickets/css/style.css'),
+    )
+
+
+@register.simple_tag
+def bootstrap_script():
+    """Popper and Bootstrap's JavaScript, from STATIC_ROOT with STATIC_VENDORED."""
+    return format_html_join('\n    ', '<script src="{}"></script>', (
+        (static(name) if settings.STATIC_VENDORED else VENDOR_FILES[name],) for name in SCRIPTS
+    ))
+
+
 @register.filter
 def status_badge(status):
     badge_classes = {
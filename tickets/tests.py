@@ -1,14 +1,68 @@
+import asyncio
+import gzip
+import importlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+import uuid
+import zlib
 from pathlib import Path
+from unittest import mock
 from io import StringIO
-from django.test import TestCase, Client, override_settings
-from django.contrib.auth.models import User
-from django.urls import reverse
+from django.conf import settings
+from django.contrib import admin
+from django.test import AsyncClient, TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import Engine
+from django.urls import clear_url_caches, reverse
 from django.core.cache import cache
+from django.core.files.storage import default_storage
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.exceptions import ValidationError
 from django.core import mail
 from django.core.management import call_command
-from .models import Profile, Ticket, Comment, Attachment
+from django.core.management.base import CommandError
+from django.core.paginator import Paginator
+from django.contrib.sessions.models import Session
+from django.db import connection, transaction
+from django.db.utils import ConnectionHandler
+from django.db import models
+from django.db.models import Count
+from django.utils import timezone
+from datetime import timedelta
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test.utils import CaptureQueriesContext
+from .ids import uuid7, uuid7_timestamp
+from .archive import archivable_tickets, archive_tickets
+from .retention import find_orphans, purge_expired, walk_storage
+from .models import (
+    Profile, Ticket, Comment, Attachment, ArchivedTicket, ArchivedComment, ArchivedAttachment,
+    MaintenanceCheckpoint, RateLimitCounter, RequestProfile, SlowQuery, TicketEvent,
+)
+from .sqlite import apply_pragmas, configure_connection, write_lock
+from .middleware import ReplicaPinningMiddleware, REPLICA_PIN_COOKIE
+from .viewer import Viewer, ANONYMOUS
+from .aio import run_queries
+from .singleflight import SingleFlight, flight
+from . import (
+    admission, async_views, compression, events, memory, metrics, profiling, query_plans, scalable_admin, slow_queries, sqlite,
+    static_pipeline, ticket_cache, warmup,
+)
+from .log import DroppingQueueHandler, JsonFormatter, queue_handler
+from asgiref.sync import async_to_sync, sync_to_async
+from .sessions import SESSION_EPOCH_KEY, check_session_mode
+from .ratelimit import DatabaseBackend, RateLimited, hit, parse_rate, retry_after
+from . import routers
+from .routers import ReplicaRouter, ShardRouter, shard_for, use_primary
+from .sharding import MergedQuerySet, aggregate
 from .forms import RegistrationForm, TicketCreateForm, TicketUpdateForm, CommentForm
 from .validators import validate_file_extension, validate_file_size
 
@@ -120,6 +174,48 @@ class TicketModelTest(TestCase):
             self.assertEqual(ticket.priority, priority)
 
 
+class TicketIdTest(TestCase):
+    """Test cases for time-ordered ticket IDs"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+
+    def test_uuid7_version_and_variant(self):
+        """Test that generated IDs are RFC 9562 version 7 UUIDs"""
+        value = uuid7()
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, uuid.RFC_4122)
+
+    def test_uuid7_is_monotonic(self):
+        """Test that IDs generated in sequence sort in creation order"""
+        values = [uuid7() for _ in range(1000)]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(set(values)), len(values))
+
+    def test_uuid7_timestamp(self):
+        """Test that the creation time can be read back from the ID"""
+        before = time.time()
+        value = uuid7()
+        self.assertAlmostEqual(uuid7_timestamp(value), before, delta=1)
+        self.assertIsNone(uuid7_timestamp(uuid.uuid4()))
+
+    def test_new_ticket_uses_uuid7(self):
+        """Test that new tickets get a UUIDv7 primary key"""
+        ticket = Ticket.objects.create(title='Test', description='Test', created_by=self.user)
+        self.assertEqual(ticket.id.version, 7)
+
+    def test_existing_uuid4_ticket_still_routable(self):
+        """Test that tickets with legacy UUIDv4 keys keep working in URLs"""
+        ticket = Ticket.objects.create(id=uuid.uuid4(), title='Legacy', description='Test', created_by=self.user)
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('ticket_detail', kwargs={'pk': ticket.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Legacy')
+
+
 class CommentModelTest(TestCase):
     """Test cases for the Comment model"""
 
@@ -1118,10 +1214,11 @@ class EmailNotificationTest(TestCase):
     def test_employee_public_comment_emails_ticket_creator(self):
         """Employee adds a public comment — creator receives an email"""
         self.client.login(username='employee', password='testpass123')
-        self.client.post(
-            reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
-            {'add_comment': '', 'body': 'Here is an update for you.'}
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                {'add_comment': '', 'body': 'Here is an update for you.'}
+            )
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn(self.creator.email, mail.outbox[0].to)
         self.assertIn('Test Ticket', mail.outbox[0].subject)
@@ -1129,20 +1226,22 @@ class EmailNotificationTest(TestCase):
     def test_creator_comment_emails_assigned_employee(self):
         """Ticket creator comments — assigned employee receives an email"""
         self.client.login(username='creator', password='testpass123')
-        self.client.post(
-            reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
-            {'add_comment': '', 'body': 'Any update on this?'}
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                {'add_comment': '', 'body': 'Any update on this?'}
+            )
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn(self.employee.email, mail.outbox[0].to)
 
     def test_internal_comment_sends_no_email(self):
         """Internal comment never triggers an email"""
         self.client.login(username='employee', password='testpass123')
-        self.client.post(
-            reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
-            {'add_comment': '', 'body': 'Private note.', 'is_internal': True}
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                {'add_comment': '', 'body': 'Private note.', 'is_internal': True}
+            )
         self.assertEqual(len(mail.outbox), 0)
 
     def test_no_email_when_no_recipient(self):
@@ -1151,10 +1250,11 @@ class EmailNotificationTest(TestCase):
         self.ticket.save()
 
         self.client.login(username='creator', password='testpass123')
-        self.client.post(
-            reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
-            {'add_comment': '', 'body': 'Is anyone looking at this?'}
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                {'add_comment': '', 'body': 'Is anyone looking at this?'}
+            )
         self.assertEqual(len(mail.outbox), 0)
 
     def test_no_email_when_recipient_has_no_email(self):
@@ -1163,12 +1263,28 @@ class EmailNotificationTest(TestCase):
         self.creator.save()
 
         self.client.login(username='employee', password='testpass123')
-        self.client.post(
-            reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
-            {'add_comment': '', 'body': 'Update for creator with no email.'}
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                {'add_comment': '', 'body': 'Update for creator with no email.'}
+            )
         self.assertEqual(len(mail.outbox), 0)
 
+    @override_settings(SQLITE_WRITE_SERIALIZATION=True)
+    def test_email_is_sent_outside_the_write_lock(self):
+        """Test that the notification is sent after the comment commits, without holding the write lock"""
+        locked = []
+        self.client.login(username='employee', password='testpass123')
+        with mock.patch('tickets.views.send_comment_notification',
+                        side_effect=lambda comment, ticket: locked.append(sqlite._write_lock.locked())):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.client.post(reverse('ticket_detail', kwargs={'pk': self.ticket.id}),
+                                 {'add_comment': '', 'body': 'Here is an update for you.'})
+            self.assertEqual(locked, [])
+            for callback in callbacks:
+                callback()
+        self.assertEqual(locked, [False])
+
 
 class MigrationConsistencyTest(TestCase):
     """Ensure all model changes have a corresponding migration."""
@@ -1177,3 +1293,2119 @@ class MigrationConsistencyTest(TestCase):
         """Fail if any model changes have not been captured in a migration."""
         out = StringIO()
         call_command('makemigrations', '--check', '--dry-run', stdout=out, stderr=out)
+
+
+class SqliteProfileTest(TransactionTestCase):
+    """Test cases for the production SQLite profile"""
+
+    def test_apply_pragmas_enables_wal(self):
+        """Test that the pragma profile switches a database file to WAL"""
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = sqlite3.connect(str(Path(tmp) / 'test.sqlite3'))
+            try:
+                applied = apply_pragmas(conn.cursor(), {'journal_mode': 'wal', 'synchronous': 'normal'})
+            finally:
+                conn.close()
+        self.assertEqual(applied['journal_mode'], 'wal')
+        self.assertEqual(applied['synchronous'], 1)
+
+    @override_settings(SQLITE_PRODUCTION=True, SQLITE_PRAGMAS={'busy_timeout': 4321, 'temp_store': 'memory'})
+    def test_profile_applied_on_connection_created(self):
+        """Test that the connection_created hook applies the configured pragmas"""
+        configure_connection(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 4321)
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    @override_settings(SQLITE_WRITE_SERIALIZATION=True, SQLITE_WRITE_LOCK_TIMEOUT=5)
+    def test_write_lock_serializes_writers(self):
+        """Test that concurrent writers queue on the write lock"""
+        active = []
+        overlaps = []
+
+        def writer():
+            with write_lock():
+                active.append(1)
+                if len(active) > 1:
+                    overlaps.append(1)
+                time.sleep(0.01)
+                active.pop()
+
+        threads = [threading.Thread(target=writer) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(overlaps, [])
+
+    def test_maintenance_command(self):
+        """Test that the maintenance command runs optimize and a checkpoint"""
+        out = StringIO()
+        call_command('sqlite_maintenance', stdout=out)
+        self.assertIn('PRAGMA optimize complete.', out.getvalue())
+        self.assertIn('WAL checkpoint (PASSIVE)', out.getvalue())
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=['replica_1'])
+class ReplicaRouterTest(TestCase):
+    """Test cases for read-replica routing"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        patcher = mock.patch('tickets.routers.replica_is_healthy', return_value=True)
+        self.healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _read_alias_during(self, request):
+        seen = {}
+
+        def get_response(request):
+            # Step out of the test case's transaction to see the routing
+            # a request would get outside an atomic block.
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                seen['alias'] = self.router.db_for_read(Ticket)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(get_response)(request)
+        return seen['alias'], response
+
+    def test_reads_go_to_replica(self):
+        """Test that ticket reads outside a transaction use a replica"""
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(self.router.db_for_read(Ticket), 'replica_1')
+
+    def test_writes_go_to_primary(self):
+        """Test that writes always use the primary"""
+        self.assertEqual(self.router.db_for_write(Ticket), 'default')
+
+    def test_sessions_stay_on_primary(self):
+        """Test that apps outside DATABASE_REPLICA_APPS are not routed to replicas"""
+        self.assertIsNone(self.router.db_for_read(Session))
+
+    def test_use_primary_block(self):
+        """Test that use_primary pins reads to the primary"""
+        with mock.patch.object(connection, 'in_atomic_block', False), use_primary():
+            self.assertEqual(self.router.db_for_read(Ticket), 'default')
+
+    def test_unhealthy_replica_falls_back_to_primary(self):
+        """Test that lagging or missing replicas fall back to the primary"""
+        self.healthy.return_value = False
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(self.router.db_for_read(Ticket), 'default')
+
+    def test_post_pins_request_and_sets_cookie(self):
+        """Test that a write request reads from the primary and sets the pin cookie"""
+        alias, response = self._read_alias_during(self.factory.post('/tickets/create/'))
+        self.assertEqual(alias, 'default')
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_pin_cookie_keeps_reads_on_primary(self):
+        """Test that reads after a write stay on the primary while the cookie lives"""
+        request = self.factory.get('/dashboard/')
+        request.COOKIES[REPLICA_PIN_COOKIE] = '1'
+        alias, response = self._read_alias_during(request)
+        self.assertEqual(alias, 'default')
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_unpinned_get_uses_replica(self):
+        """Test that ordinary reads are served by the replica"""
+        alias, _ = self._read_alias_during(self.factory.get('/dashboard/'))
+        self.assertEqual(alias, 'replica_1')
+
+    def test_replicas_are_never_migrated(self):
+        """Test that migrations are not applied to replica aliases"""
+        self.assertFalse(self.router.allow_migrate('replica_1', 'tickets'))
+        self.assertIsNone(self.router.allow_migrate('default', 'tickets'))
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=['replica_1'], DATABASE_REPLICA_MAX_LAG=30)
+class ReplicaLagTest(TestCase):
+    """Test replica staleness with a real primary file and a refreshed copy"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.primary = os.path.join(directory.name, 'primary.sqlite3')
+        self.replica = os.path.join(directory.name, 'replica.sqlite3')
+        with sqlite3.connect(self.primary) as db:
+            db.execute('CREATE TABLE t (n INTEGER)')
+        handler = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.primary},
+            'replica_1': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': self.replica},
+        })
+        self.addCleanup(handler.close_all)
+        for target in ('tickets.routers.connections', 'tickets.management.commands.refresh_replicas.connections'):
+            patcher = mock.patch(target, handler)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        routers._health.clear()
+        self.addCleanup(routers._health.clear)
+
+    def _write_primary(self):
+        with sqlite3.connect(self.primary) as db:
+            db.execute('INSERT INTO t VALUES (1)')
+
+    def test_refreshed_replica_is_current_until_the_primary_changes(self):
+        """Test that a fresh copy has no lag, and has the primary's rows"""
+        self._write_primary()
+        call_command('refresh_replicas', stdout=StringIO())
+        self.assertEqual(routers.replica_lag('replica_1'), 0.0)
+        self.assertTrue(routers.replica_is_healthy('replica_1'))
+        with sqlite3.connect(self.replica) as db:
+            self.assertEqual(db.execute('SELECT count(*) FROM t').fetchone(), (1,))
+
+    def test_lag_counts_from_the_refresh_not_the_write(self):
+        """Test that a replica missing a write stays stale as time passes, however soon after the refresh it came"""
+        call_command('refresh_replicas', stdout=StringIO())
+        self._write_primary()
+        now = time.time()
+        # Refreshed a minute ago; the write landed ten seconds after that.
+        os.utime(self.replica, (now - 60, now - 60))
+        os.utime(self.primary, (now - 50, now - 50))
+        self.assertGreaterEqual(routers.replica_lag('replica_1'), 60)
+        self.assertFalse(routers.replica_is_healthy('replica_1'))
+
+        call_command('refresh_replicas', stdout=StringIO())
+        routers._health.clear()
+        self.assertEqual(routers.replica_lag('replica_1'), 0.0)
+        self.assertTrue(routers.replica_is_healthy('replica_1'))
+
+    def test_missing_replica_is_unusable(self):
+        """Test that a replica file that was never refreshed is not used"""
+        self.assertIsNone(routers.replica_lag('replica_1'))
+        self.assertFalse(routers.replica_is_healthy('replica_1'))
+
+
+class ShardingTest(TestCase):
+    """Test cases for ticket sharding and scatter-gather reads"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.low = [
+            Ticket.objects.create(title=f'Low {i}', description='Test', priority='low', created_by=self.user)
+            for i in range(3)
+        ]
+        self.high = [
+            Ticket.objects.create(title=f'High {i}', description='Test', priority='high', created_by=self.user)
+            for i in range(3)
+        ]
+        # Two disjoint querysets stand in for two shards.
+        self.shards = [Ticket.objects.filter(priority='low'), Ticket.objects.filter(priority='high')]
+
+    @override_settings(TICKET_SHARD_ALIASES=['shard_0', 'shard_1', 'shard_2'])
+    def test_shard_for_is_stable_and_spread(self):
+        """Test that tickets map to a fixed shard and new IDs spread across shards"""
+        ticket_id = uuid7()
+        self.assertEqual(shard_for(ticket_id), shard_for(ticket_id))
+        seen = {shard_for(uuid7()) for _ in range(200)}
+        self.assertEqual(seen, {'shard_0', 'shard_1', 'shard_2'})
+
+    @override_settings(TICKET_SHARD_ALIASES=['shard_0', 'shard_1'])
+    def test_router_follows_ticket(self):
+        """Test that tickets, comments and attachments route to the ticket's shard"""
+        router = ShardRouter()
+        ticket = self.low[0]
+        expected = shard_for(ticket.pk)
+        comment = Comment(ticket=ticket, author=self.user, body='Hi')
+        attachment = Attachment(comment=comment)
+        self.assertEqual(router.db_for_write(Ticket, instance=ticket), expected)
+        self.assertEqual(router.db_for_write(Comment, instance=comment), expected)
+        self.assertEqual(router.db_for_read(Comment, instance=ticket), expected)
+        self.assertEqual(router.db_for_write(Attachment, instance=attachment), expected)
+        self.assertEqual(router.db_for_read(User, instance=ticket), 'default')
+        self.assertIsNone(router.db_for_read(Ticket))
+
+    def test_router_inactive_without_shards(self):
+        """Test that the shard router does nothing when sharding is off"""
+        self.assertIsNone(ShardRouter().db_for_write(Ticket, instance=self.low[0]))
+
+    def test_merged_queryset_orders_across_shards(self):
+        """Test that merged results are ordered by created_at like a single query"""
+        merged = MergedQuerySet(self.shards)
+        expected = list(Ticket.objects.all())
+        self.assertEqual(list(merged), expected)
+        self.assertEqual(merged.count(), 6)
+        self.assertEqual(merged[:4], expected[:4])
+        self.assertEqual(merged[2:5], expected[2:5])
+
+    def test_merged_queryset_paginates(self):
+        """Test that Paginator works on merged results"""
+        page = Paginator(MergedQuerySet(self.shards), 4).get_page(2)
+        self.assertEqual(list(page), list(Ticket.objects.all())[4:])
+        self.assertEqual(page.paginator.num_pages, 2)
+
+    def test_aggregate_sums_across_shards(self):
+        """Test that per-shard aggregates are summed"""
+        stats = aggregate(self.shards, total=Count('id'), low=Count('id', filter=models.Q(priority='low')))
+        self.assertEqual(stats, {'total': 6, 'low': 3})
+
+
+class ArchiveTest(TestCase):
+    """Test cases for the closed-ticket archive tier"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.employee = User.objects.create_user(
+            username='employee',
+            password='testpass123'
+        )
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+
+        self.old_closed = self._ticket('Old closed', 'closed', days_ago=200)
+        self.recent_closed = self._ticket('Recent closed', 'closed', days_ago=5)
+        self.old_open = self._ticket('Old open', 'open', days_ago=200)
+
+        self.public = Comment.objects.create(ticket=self.old_closed, author=self.user, body='Public note')
+        self.internal = Comment.objects.create(
+            ticket=self.old_closed, author=self.employee, body='Internal note', is_internal=True
+        )
+        Comment.objects.filter(ticket=self.old_closed).update(created_at=timezone.now() - timedelta(days=200))
+        Attachment.objects.create(
+            comment=self.public,
+            file='attachments/comments/1/log.csv',
+            original_filename='log.csv',
+            file_size=10,
+            uploaded_by=self.user,
+        )
+
+    def _ticket(self, title, status, days_ago):
+        ticket = Ticket.objects.create(title=title, description='Test', status=status, created_by=self.user)
+        Ticket.objects.filter(pk=ticket.pk).update(updated_at=timezone.now() - timedelta(days=days_ago))
+        return ticket
+
+    def test_only_old_closed_tickets_are_archivable(self):
+        """Test that recency and status decide archivability"""
+        self.assertEqual(list(archivable_tickets(90)), [self.old_closed])
+
+    def test_recent_comment_keeps_ticket_hot(self):
+        """Test that a recent comment on an old closed ticket blocks archiving"""
+        Comment.objects.create(ticket=self.old_closed, author=self.user, body='Still here')
+        self.assertEqual(list(archivable_tickets(90)), [])
+
+    def test_archive_moves_ticket_comments_and_attachments(self):
+        """Test that archiving moves all rows and removes them from the hot tables"""
+        self.assertEqual(sum(archive_tickets(90, batch_size=1)), 1)
+        self.assertFalse(Ticket.objects.filter(pk=self.old_closed.pk).exists())
+        self.assertFalse(Comment.objects.filter(ticket_id=self.old_closed.pk).exists())
+        archived = ArchivedTicket.objects.get(pk=self.old_closed.pk)
+        self.assertEqual(archived.title, 'Old closed')
+        self.assertEqual(archived.comments.count(), 2)
+        attachment = ArchivedAttachment.objects.get()
+        self.assertEqual(attachment.comment.body, 'Public note')
+        self.assertEqual(attachment.file.name, 'attachments/comments/1/log.csv')
+
+    def test_archived_ticket_detail_is_read_only(self):
+        """Test that archived tickets render at their original URL without forms"""
+        list(archive_tickets(90))
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('ticket_detail', kwargs={'pk': self.old_closed.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Archived')
+        self.assertContains(response, 'Public note')
+        self.assertNotContains(response, 'Internal note')
+        self.assertNotContains(response, 'name="add_comment"')
+
+        response = self.client.post(url, {'add_comment': '', 'body': 'Too late'})
+        self.assertRedirects(response, url)
+        self.assertFalse(ArchivedComment.objects.filter(body='Too late').exists())
+
+    def test_archived_ticket_access_control(self):
+        """Test that other users cannot view someone else's archived ticket"""
+        list(archive_tickets(90))
+        self.client.login(username='otheruser', password='testpass123')
+        response = self.client.get(reverse('ticket_detail', kwargs={'pk': self.old_closed.pk}))
+        self.assertRedirects(response, reverse('dashboard'))
+
+    def test_ticket_list_include_archived_filter(self):
+        """Test that archived tickets only appear in the list when requested"""
+        list(archive_tickets(90))
+        self.client.login(username='employee', password='testpass123')
+        response = self.client.get(reverse('ticket_list'))
+        self.assertNotContains(response, 'Old closed')
+        response = self.client.get(reverse('ticket_list'), {'archived': '1'})
+        self.assertContains(response, 'Old closed')
+        self.assertContains(response, 'Old open')
+        response = self.client.get(reverse('ticket_list'), {'archived': '1', 'status': 'open'})
+        self.assertNotContains(response, 'Old closed')
+
+    def test_archive_command(self):
+        """Test the archive_tickets management command"""
+        out = StringIO()
+        call_command('archive_tickets', '--dry-run', stdout=out)
+        self.assertIn('default: 1 tickets would be archived.', out.getvalue())
+        call_command('archive_tickets', stdout=out)
+        self.assertIn('default: archived 1 tickets.', out.getvalue())
+        self.assertEqual(ArchivedTicket.objects.count(), 1)
+
+
+class RetentionTest(TestCase):
+    """Test cases for the retention purge and orphaned media reconciliation"""
+
+    def setUp(self):
+        self.media_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_dir.cleanup)
+        media_override = override_settings(MEDIA_ROOT=self.media_dir.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.policy = [{'statuses': ['closed'], 'days': 30}]
+
+    def _ticket(self, title, status, days_ago):
+        ticket = Ticket.objects.create(title=title, description='Test', status=status, created_by=self.user)
+        Ticket.objects.filter(pk=ticket.pk).update(updated_at=timezone.now() - timedelta(days=days_ago))
+        return ticket
+
+    def _attach(self, comment, name):
+        attachment = Attachment(
+            comment=comment,
+            file=SimpleUploadedFile(name, b'data', content_type='text/csv'),
+            original_filename=name,
+            file_size=4,
+            uploaded_by=self.user,
+        )
+        attachment.save()
+        return attachment
+
+    def _age_files(self):
+        old = time.time() - 3 * 86400
+        for path in Path(self.media_dir.name).rglob('*'):
+            os.utime(path, (old, old))
+
+    def test_purge_deletes_expired_rows_and_files_after_commit(self):
+        """Test that expired tickets lose their rows and files; others are kept"""
+        expired = self._ticket('Expired', 'closed', days_ago=60)
+        kept_open = self._ticket('Still open', 'open', days_ago=60)
+        kept_recent = self._ticket('Recently closed', 'closed', days_ago=5)
+        comment = Comment.objects.create(ticket=expired, author=self.user, body='Bye')
+        attachment = self._attach(comment, 'log.csv')
+        path = Path(attachment.file.path)
+        self.assertTrue(path.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = list(purge_expired(self.policy, batch_size=1))
+
+        self.assertEqual(sum(count for _, _, count in batches), 1)
+        self.assertFalse(Ticket.objects.filter(pk=expired.pk).exists())
+        self.assertFalse(Comment.objects.filter(pk=comment.pk).exists())
+        self.assertFalse(Attachment.objects.filter(pk=attachment.pk).exists())
+        self.assertFalse(path.exists())
+        self.assertEqual(set(Ticket.objects.all()), {kept_open, kept_recent})
+
+    def test_purge_covers_archive_tier(self):
+        """Test that retention also applies to archived tickets"""
+        self._ticket('Archived long ago', 'closed', days_ago=400)
+        list(archive_tickets(90))
+        self.assertEqual(ArchivedTicket.objects.count(), 1)
+        list(purge_expired(self.policy))
+        self.assertEqual(ArchivedTicket.objects.count(), 0)
+
+    def test_dry_run_deletes_nothing(self):
+        """Test that a dry run only counts"""
+        self._ticket('Expired', 'closed', days_ago=60)
+        counts = [count for tier, _, count in purge_expired(self.policy, dry_run=True) if tier == 'hot']
+        self.assertEqual(counts, [1])
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_find_orphans(self):
+        """Test that only old, unreferenced files are reported"""
+        ticket = self._ticket('Ticket', 'open', days_ago=0)
+        comment = Comment.objects.create(ticket=ticket, author=self.user, body='Hi')
+        referenced = self._attach(comment, 'keep.csv')
+        orphan = self._attach(comment, 'orphan.csv')
+        Attachment.objects.filter(pk=orphan.pk).delete()
+        self._age_files()
+        fresh = Path(self.media_dir.name, 'attachments', 'fresh.csv')
+        fresh.write_bytes(b'new')
+
+        self.assertEqual(list(find_orphans()), [orphan.file.name])
+        self.assertNotIn(referenced.file.name, list(find_orphans()))
+
+    def test_find_orphans_resumes_from_checkpoint(self):
+        """Test that an interrupted reconciliation continues after the last batch"""
+        ticket = self._ticket('Ticket', 'open', days_ago=0)
+        comment = Comment.objects.create(ticket=ticket, author=self.user, body='Hi')
+        names = []
+        for i in range(4):
+            attachment = self._attach(comment, f'file{i}.csv')
+            names.append(attachment.file.name)
+        Attachment.objects.all().delete()
+        self._age_files()
+
+        walk = find_orphans(batch_size=2)
+        first_batch = [next(walk), next(walk)]
+        next(walk)  # third orphan: the first batch's checkpoint is now saved
+        walk.close()
+        self.assertEqual(MaintenanceCheckpoint.objects.get(name='reconcile_media').value, first_batch[-1])
+
+        resumed = list(find_orphans(batch_size=2, resume=True))
+        self.assertEqual(resumed, sorted(names)[2:])
+        self.assertEqual(MaintenanceCheckpoint.objects.get(name='reconcile_media').value, '')
+
+    def test_resume_follows_the_walk_order(self):
+        """Test that a file sorting before the checkpoint as a string, but walked after it, is not skipped"""
+        root = Path(self.media_dir.name, 'attachments')
+        (root / '1').mkdir(parents=True)
+        for name in ('1/x.csv', '1.pdf', '2.csv'):
+            (root / name).write_bytes(b'-')
+        self._age_files()
+        self.assertEqual(list(walk_storage(default_storage)),
+                         ['attachments/1/x.csv', 'attachments/1.pdf', 'attachments/2.csv'])
+
+        MaintenanceCheckpoint.objects.create(name='reconcile_media', value='attachments/1/x.csv')
+        self.assertEqual(list(find_orphans(resume=True)), ['attachments/1.pdf', 'attachments/2.csv'])
+
+    def test_status_without_days_is_an_error(self):
+        """Test that purge_tickets --status without --days fails instead of exiting successfully"""
+        with self.assertRaisesMessage(CommandError, '--status requires --days.'):
+            call_command('purge_tickets', '--status', 'closed')
+
+
+class ViewerTest(TestCase):
+    """Test cases for request.viewer and profile query reduction"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.employee = User.objects.create_user(
+            username='employee',
+            password='testpass123'
+        )
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+
+    def test_viewer_from_user(self):
+        """Test building a Viewer from users"""
+        viewer = Viewer.from_user(User.objects.get(pk=self.employee.pk))
+        self.assertTrue(viewer.is_authenticated)
+        self.assertTrue(viewer.is_employee)
+        self.assertEqual(viewer.role_display, 'Employee')
+        self.assertEqual(viewer.username, 'employee')
+
+    def test_anonymous_viewer(self):
+        """Test that anonymous users get the anonymous viewer"""
+        self.assertIs(Viewer.from_user(AnonymousUser()), ANONYMOUS)
+        self.assertFalse(ANONYMOUS.is_employee)
+
+    def test_profile_loaded_with_user(self):
+        """Test that a request loads the profile in the same query as the user"""
+        self.client.login(username='employee', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        profile_only = [
+            q['sql'] for q in queries
+            if 'FROM "tickets_profile"' in q['sql'] and 'auth_user' not in q['sql']
+        ]
+        self.assertEqual(profile_only, [])
+        self.assertContains(response, 'Employee')
+
+    def test_login_does_not_rewrite_profile(self):
+        """Test that the last_login update at login does not save the profile"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.login(username='testuser', password='testpass123')
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "tickets_profile"')]
+        self.assertEqual(updates, [])
+
+    def test_user_save_still_saves_loaded_profile(self):
+        """Test that saving a user persists changes to its loaded profile"""
+        self.user.profile.role = 'employee'
+        self.user.save()
+        self.assertEqual(Profile.objects.get(user=self.user).role, 'employee')
+
+    def test_employee_required_uses_viewer(self):
+        """Test that employee_required still blocks regular users"""
+        ticket = Ticket.objects.create(title='Test', description='Test', created_by=self.user)
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.post(reverse('ticket_assign_self', kwargs={'pk': ticket.pk}))
+        self.assertRedirects(response, reverse('dashboard'))
+
+
+class SessionModeTest(TestCase):
+    """Test cases for session invalidation across session modes"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+
+    def test_login_stamps_session_epoch(self):
+        """Test that login stores the profile's session epoch in the session"""
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.session[SESSION_EPOCH_KEY], self.user.profile.session_epoch)
+
+    def test_role_change_bumps_epoch(self):
+        """Test that changing a loaded profile's role bumps its epoch"""
+        profile = Profile.objects.get(user=self.user)
+        profile.role = 'employee'
+        profile.save(update_fields=['role'])
+        self.assertEqual(Profile.objects.get(user=self.user).session_epoch, 1)
+
+        profile.save()
+        self.assertEqual(Profile.objects.get(user=self.user).session_epoch, 1)
+
+    def test_role_change_logs_out_existing_sessions(self):
+        """Test that a role change ends sessions created before it"""
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+
+        profile = Profile.objects.get(user=self.user)
+        profile.role = 'employee'
+        profile.save()
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('dashboard')}")
+
+    def test_session_without_epoch_is_stamped(self):
+        """Test that sessions from before the epoch check keep working"""
+        self.client.login(username='testuser', password='testpass123')
+        session = self.client.session
+        del session[SESSION_EPOCH_KEY]
+        session.save()
+
+        self.assertEqual(self.client.get(reverse('dashboard')).status_code, 200)
+        self.assertEqual(self.client.session[SESSION_EPOCH_KEY], 0)
+
+    @override_settings(
+        SESSION_MODE='signed_cookies',
+        SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    )
+    def test_signed_cookie_logout_revokes_copied_cookie(self):
+        """Test that logging out invalidates a copy of a signed session cookie"""
+        self.client.login(username='testuser', password='testpass123')
+        stolen = Client()
+        stolen.cookies.load({'sessionid': self.client.cookies['sessionid'].value})
+        self.assertEqual(stolen.get(reverse('dashboard')).status_code, 200)
+
+        self.client.post(reverse('logout'))
+
+        self.assertEqual(stolen.get(reverse('dashboard')).status_code, 302)
+        self.assertEqual(Session.objects.count(), 0)
+
+    def test_messages_do_not_write_session(self):
+        """Test that flash messages after a POST do not update the session"""
+        ticket = Ticket.objects.create(title='Test', description='Test', created_by=self.user)
+        self.client.login(username='testuser', password='testpass123')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('ticket_detail', kwargs={'pk': ticket.pk}), {'add_comment': '1', 'body': 'Hello'})
+        session_writes = [
+            q['sql'] for q in queries
+            if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(session_writes, [])
+
+    def test_cached_db_with_local_cache_warns(self):
+        """Test the system check for cached_db sessions on a per-process cache"""
+        with override_settings(SESSION_MODE='cached_db'):
+            self.assertEqual([e.id for e in check_session_mode(None)], ['tickets.W001'])
+        self.assertEqual(check_session_mode(None), [])
+
+
+class RateLimitTest(TestCase):
+    """Test cases for the shared sliding-window rate limiter"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        self.ticket = Ticket.objects.create(title='Test', description='Test', created_by=self.user)
+
+    def test_parse_rate(self):
+        """Test parsing of rate strings"""
+        self.assertEqual(parse_rate('5/m'), (5, 60))
+        self.assertEqual(parse_rate('100/10m'), (100, 600))
+        self.assertEqual(parse_rate('1000/d'), (1000, 86400))
+
+    def test_previous_window_is_weighted(self):
+        """Test that hits from the previous window count by their remaining overlap"""
+        for _ in range(4):
+            hit('k', '4/m', now=600.0)
+        # A quarter into the next window, 3 of the 4 old hits still count.
+        hit('k', '4/m', now=675.0)
+        with self.assertRaises(RateLimited):
+            hit('k', '4/m', now=675.0)
+        # Three quarters in, only one does.
+        hit('k', '4/m', now=705.0)
+
+    def test_retry_after(self):
+        """Test the computed wait until the next hit fits"""
+        # Current window full: wait for it to end and fade by a quarter.
+        self.assertEqual(retry_after(4, 60, previous=0, current=4, elapsed=0), 75)
+        # Room in the current window: wait for the previous one to fade.
+        self.assertEqual(retry_after(4, 60, previous=4, current=1, elapsed=15), 15)
+
+    def test_counters_are_stored_in_database(self):
+        """Test that the default backend keeps counters in RateLimitCounter"""
+        # Counters at now=600 expired long ago; keep the periodic purge from deleting them mid-test.
+        with mock.patch.object(DatabaseBackend, '_last_purge', time.time()):
+            hit('k', '5/m', now=600.0)
+            hit('k', '5/m', now=601.0)
+        counter = RateLimitCounter.objects.get(key='k')
+        self.assertEqual((counter.bucket, counter.count), (10, 2))
+
+    @override_settings(RATELIMIT_BACKEND='cache')
+    def test_cache_backend(self):
+        """Test the cache backend enforces the same limits"""
+        hit('k', '2/m', now=600.0)
+        hit('k', '2/m', now=601.0)
+        with self.assertRaises(RateLimited):
+            hit('k', '2/m', now=602.0)
+        self.assertFalse(RateLimitCounter.objects.exists())
+
+    @override_settings(RATELIMITS={**settings.RATELIMITS, 'comment': '2/m'})
+    def test_comment_limit_is_per_user_with_retry_after(self):
+        """Test that comment limits are per user and the 429 carries Retry-After"""
+        url = reverse('ticket_detail', kwargs={'pk': self.ticket.pk})
+        self.client.login(username='testuser', password='testpass123')
+        for _ in range(2):
+            self.client.post(url, {'add_comment': '1', 'body': 'Hello'})
+        response = self.client.post(url, {'add_comment': '1', 'body': 'Hello'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(Comment.objects.count(), 2)
+
+        employee = User.objects.create_user(username='employee', password='testpass123')
+        employee.profile.role = 'employee'
+        employee.profile.save()
+        self.client.login(username='employee', password='testpass123')
+        response = self.client.post(url, {'add_comment': '1', 'body': 'Hello'})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(RATELIMITS={**settings.RATELIMITS, 'ticket_create': '1/m'})
+    def test_ticket_create_limit_ignores_get(self):
+        """Test that only ticket creation POSTs count against the limit"""
+        self.client.login(username='testuser', password='testpass123')
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('ticket_create')).status_code, 200)
+        data = {'title': 'New', 'description': 'New', 'priority': 'low'}
+        self.assertEqual(self.client.post(reverse('ticket_create'), data).status_code, 302)
+        self.assertEqual(self.client.post(reverse('ticket_create'), data).status_code, 429)
+
+    @override_settings(RATELIMIT_ENABLE=False)
+    def test_can_be_disabled(self):
+        """Test that RATELIMIT_ENABLE=False turns every limit off"""
+        for _ in range(3):
+            hit('k', '1/m')
+        self.assertFalse(RateLimitCounter.objects.exists())
+
+
+class AsyncViewsTest(TransactionTestCase):
+    """Test cases for the async dashboard and ticket detail (ASYNC_VIEWS)"""
+
+    def setUp(self):
+        self._use_async_views(True)
+        self.addCleanup(self._use_async_views, False)
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.employee = User.objects.create_user(
+            username='employee',
+            password='testpass123'
+        )
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+        self.ticket = Ticket.objects.create(title='Async Ticket', description='Test', created_by=self.user)
+        Ticket.objects.create(title='Other', description='Test', created_by=self.employee, status='resolved')
+        Comment.objects.create(ticket=self.ticket, author=self.employee, body='Secret note', is_internal=True)
+
+    def _use_async_views(self, enabled):
+        with override_settings(ASYNC_VIEWS=enabled):
+            importlib.reload(importlib.import_module('tickets.urls'))
+        # The root URLconf holds resolvers that cached the old patterns.
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    def test_urls_use_async_views(self):
+        """Test that ASYNC_VIEWS routes the hot views to tickets.async_views"""
+        from django.urls import resolve
+        self.assertEqual(resolve(reverse('dashboard')).func.__module__, 'tickets.async_views')
+
+    def test_employee_dashboard(self):
+        """Test the async employee dashboard context"""
+        self.client.login(username='employee', password='testpass123')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['stats']['total'], 2)
+        self.assertEqual(response.context['stats']['resolved'], 1)
+        self.assertEqual([t.title for t in response.context['unassigned_tickets']], ['Other', 'Async Ticket'])
+        self.assertEqual(response.context['my_assigned'], [])
+
+    def test_profile_covers_query_threads(self):
+        """Test that profiling an async view includes the ORM work its queries ran on other threads"""
+        admin_user = User.objects.create_superuser(username='profadmin', password='testpass123')
+        admin_user.profile.role = 'employee'
+        admin_user.profile.save()
+        self.client.login(username='profadmin', password='testpass123')
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILING=True, PROFILING_DIR=directory):
+            response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+            stats = profiling.load(RequestProfile.objects.get(pk=response['X-Profile-Id']))
+        names = {name for _, _, name in stats.stats}
+        self.assertIn('ticket_stats', names)
+        # Django's aggregate query path, only taken by the stats query.
+        self.assertIn('get_aggregation', names)
+
+    def test_user_dashboard(self):
+        """Test the async regular user dashboard only shows own tickets"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual([t.title for t in response.context['tickets']], ['Async Ticket'])
+        self.assertEqual(response.context['stats']['total'], 1)
+
+    def test_dashboard_requires_login(self):
+        """Test that the async dashboard redirects anonymous users"""
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_ticket_detail_hides_internal_comments(self):
+        """Test that the async ticket detail filters comments by role"""
+        url = reverse('ticket_detail', kwargs={'pk': self.ticket.pk})
+        self.client.login(username='employee', password='testpass123')
+        self.assertContains(self.client.get(url), 'Secret note')
+        self.client.login(username='testuser', password='testpass123')
+        self.assertNotContains(self.client.get(url), 'Secret note')
+
+    def test_ticket_detail_access_control(self):
+        """Test that users cannot view other users' tickets through the async view"""
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        response = self.client.get(reverse('ticket_detail', kwargs={'pk': self.ticket.pk}))
+        self.assertRedirects(response, reverse('dashboard'))
+
+    def test_ticket_detail_post_uses_sync_view(self):
+        """Test that comment POSTs still work through the async URL"""
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('ticket_detail', kwargs={'pk': self.ticket.pk})
+        response = self.client.post(url, {'add_comment': '1', 'body': 'Async hello'})
+        self.assertRedirects(response, url)
+        self.assertTrue(Comment.objects.filter(body='Async hello').exists())
+
+    def test_run_queries_overlap(self):
+        """Test that independent queries run concurrently rather than in series"""
+        def slow(value):
+            def query():
+                time.sleep(0.3)
+                return value
+            return query
+
+        started = time.monotonic()
+        results = async_to_sync(run_queries)({'a': slow(1), 'b': slow(2), 'c': slow(3)})
+        self.assertEqual(results, {'a': 1, 'b': 2, 'c': 3})
+        self.assertLess(time.monotonic() - started, 0.8)
+
+
+@override_settings(LIVE_UPDATES=True, LIVE_UPDATES_MAX_SECONDS=0.3, LIVE_UPDATES_POLL_INTERVAL=0.05)
+class LiveUpdatesTest(TransactionTestCase):
+    """Test cases for Server-Sent Events live updates"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.employee = User.objects.create_user(
+            username='employee',
+            password='testpass123'
+        )
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+        self.ticket = Ticket.objects.create(title='Live Ticket', description='Test', created_by=self.user)
+
+    def _read(self, response):
+        async def collect():
+            return [chunk.decode() async for chunk in response.streaming_content]
+        return ''.join(async_to_sync(collect)())
+
+    def test_saves_record_events(self):
+        """Test that ticket and comment saves are recorded once committed"""
+        self.ticket.status = 'in_progress'
+        self.ticket.save()
+        Comment.objects.create(ticket=self.ticket, author=self.employee, body='On it')
+        kinds = list(TicketEvent.objects.filter(ticket_id=self.ticket.pk).values_list('kind', flat=True))
+        self.assertEqual(kinds, ['ticket', 'ticket', 'comment'])
+        event = TicketEvent.objects.filter(kind='ticket').last()
+        self.assertEqual(event.payload['status_display'], 'In Progress')
+        self.assertIsNone(event.payload['assigned_to'])
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_disabled_records_nothing(self):
+        """Test that no events are written with LIVE_UPDATES off"""
+        Comment.objects.create(ticket=self.ticket, author=self.user, body='Hi')
+        self.assertFalse(TicketEvent.objects.filter(kind='comment').exists())
+
+    def test_subscription_matching_and_cap(self):
+        """Test subscription filters and the per-worker connection cap"""
+        ticket_event = TicketEvent(ticket_id=self.ticket.pk, kind='comment', payload={})
+        self.assertTrue(events.Subscription(ticket_id=self.ticket.pk).matches(ticket_event))
+        self.assertFalse(events.Subscription(ticket_id=uuid.uuid4()).matches(ticket_event))
+        self.assertFalse(events.Subscription(kinds=('ticket',)).matches(ticket_event))
+
+        async def subscribe_twice():
+            broker = events.Broker()
+            first = broker.subscribe()
+            try:
+                with self.assertRaises(events.TooManySubscribers):
+                    broker.subscribe()
+            finally:
+                broker.unsubscribe(first)
+
+        with override_settings(LIVE_UPDATES_MAX_CONNECTIONS=1):
+            async_to_sync(subscribe_twice)()
+
+    def test_ticket_stream_replays_and_hides_internal_comments(self):
+        """Test that a reconnecting stream replays missed events, filtered by role"""
+        Comment.objects.create(ticket=self.ticket, author=self.employee, body='Public reply')
+        Comment.objects.create(ticket=self.ticket, author=self.employee, body='Internal note', is_internal=True)
+        url = reverse('ticket_events', kwargs={'pk': self.ticket.pk})
+        first_event = TicketEvent.objects.order_by('pk').first().pk
+
+        client = AsyncClient()
+        async_to_sync(client.aforce_login)(self.user)
+        response = async_to_sync(client.get)(url, headers={'Last-Event-ID': str(first_event)})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = self._read(response)
+        self.assertIn('event: comment', body)
+        self.assertIn('Public reply', body)
+        self.assertNotIn('Internal note', body)
+
+        async_to_sync(client.aforce_login)(self.employee)
+        response = async_to_sync(client.get)(url, {'after': first_event})
+        self.assertIn('Internal note', self._read(response))
+
+    def test_stream_delivers_new_events(self):
+        """Test that the poller pushes events saved while the stream is open"""
+        async def listen():
+            subscription = events.broker.subscribe(ticket_id=self.ticket.pk)
+            received = []
+
+            async def read():
+                async for message in events.stream(subscription):
+                    received.append(message)
+
+            reader = asyncio.ensure_future(read())
+            await asyncio.sleep(0.1)
+            await sync_to_async(Comment.objects.create, thread_sensitive=False)(
+                ticket=self.ticket, author=self.user, body='Pushed'
+            )
+            await reader
+            return ''.join(received)
+
+        self.assertIn('Pushed', async_to_sync(listen)())
+        self.assertEqual(len(events.broker), 0)
+
+    def test_unstarted_stream_unsubscribes_on_close(self):
+        """Test that closing a stream response that was never read frees its subscription"""
+        client = AsyncClient()
+        async_to_sync(client.aforce_login)(self.user)
+        before = len(events.broker)
+
+        async def open_and_close():
+            # Call the view directly: the test client would drain the stream.
+            request = RequestFactory().get(reverse('ticket_events', kwargs={'pk': self.ticket.pk}))
+            request.auser = lambda: sync_to_async(lambda: self.user)()
+            response = await async_views.ticket_events(request, self.ticket.pk)
+            self.assertEqual(len(events.broker), before + 1)
+            response.close()
+
+        async_to_sync(open_and_close)()
+        self.assertEqual(len(events.broker), before)
+
+    def test_ticket_stream_access_control(self):
+        """Test that only the creator and employees can open a ticket stream"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        client = AsyncClient()
+        url = reverse('ticket_events', kwargs={'pk': self.ticket.pk})
+        self.assertEqual(async_to_sync(client.get)(url).status_code, 403)
+        async_to_sync(client.aforce_login)(other)
+        self.assertEqual(async_to_sync(client.get)(url).status_code, 403)
+
+    def test_queue_stream_is_employee_only(self):
+        """Test that the queue stream rejects regular users"""
+        client = AsyncClient()
+        async_to_sync(client.aforce_login)(self.user)
+        self.assertEqual(async_to_sync(client.get)(reverse('queue_events')).status_code, 403)
+
+    def test_ticket_page_includes_stream_url(self):
+        """Test that the ticket page links its live stream when enabled"""
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('ticket_detail', kwargs={'pk': self.ticket.pk}))
+        self.assertContains(response, 'data-events-url="%s?after=' % reverse('ticket_events', kwargs={'pk': self.ticket.pk}))
+        self.assertContains(response, 'tickets/js/live.js')
+
+    @override_settings(LIVE_UPDATES=False)
+    def test_disabled_stream_is_404(self):
+        """Test that streams are unavailable with LIVE_UPDATES off"""
+        client = AsyncClient()
+        async_to_sync(client.aforce_login)(self.user)
+        url = reverse('ticket_events', kwargs={'pk': self.ticket.pk})
+        self.assertEqual(async_to_sync(client.get)(url).status_code, 404)
+
+
+class TicketListFragmentTest(TestCase):
+    """Test cases for the ticket_list results fragment"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.employee = User.objects.create_user(
+            username='employee',
+            password='testpass123'
+        )
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+        for i in range(25):
+            Ticket.objects.create(title=f'Ticket {i}', description='Test', created_by=self.user,
+                                  status='open' if i % 2 else 'resolved')
+        self.client.login(username='employee', password='testpass123')
+
+    def test_fragment_omits_layout(self):
+        """Test that the fragment contains only the table and pagination"""
+        response = self.client.get(reverse('ticket_list'), headers={'HX-Request': 'true'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<html')
+        self.assertNotContains(response, 'ticket-filters')
+        self.assertContains(response, 'Ticket pagination')
+        self.assertContains(response, '<tr>', count=21)
+
+    def test_fragment_query_parameter(self):
+        """Test that ?fragment=1 also returns the fragment, honouring filters"""
+        response = self.client.get(reverse('ticket_list'), {'fragment': '1', 'status': 'open'})
+        self.assertNotContains(response, '<html')
+        self.assertContains(response, '<tr>', count=13)
+
+    def test_full_page_wraps_fragment_and_varies(self):
+        """Test that the full page includes the results container and Vary header"""
+        response = self.client.get(reverse('ticket_list'))
+        self.assertContains(response, 'id="ticket-results"')
+        self.assertContains(response, 'tickets/js/ticket_list.js')
+        self.assertIn('HX-Request', response['Vary'])
+
+    def test_etag_revalidation(self):
+        """Test that an unchanged fragment answers 304 and a change invalidates it"""
+        url = reverse('ticket_list')
+        response = self.client.get(url, {'fragment': '1'})
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get(url, {'fragment': '1'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        Ticket.objects.filter(title='Ticket 0').update(updated_at=timezone.now() + timedelta(seconds=1))
+        response = self.client.get(url, {'fragment': '1'}, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_cached_fragment_skips_page_query(self):
+        """Test that a cached fragment is served with only the version query"""
+        url = reverse('ticket_list')
+        self.client.get(url, {'fragment': '1', 'page': '2'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fragment': '1', 'page': '2'})
+        self.assertContains(response, 'Ticket 0')
+        ticket_queries = [q['sql'] for q in queries if 'FROM "tickets_ticket"' in q['sql']]
+        self.assertEqual(len(ticket_queries), 1)
+
+    def test_fragment_scope_is_per_user(self):
+        """Test that users and employees never share a fragment"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        Ticket.objects.create(title='Other ticket', description='Test', created_by=other)
+        employee_tag = self.client.get(reverse('ticket_list'), {'fragment': '1'})['ETag']
+        self.client.login(username='other', password='testpass123')
+        response = self.client.get(reverse('ticket_list'), {'fragment': '1'})
+        self.assertNotEqual(response['ETag'], employee_tag)
+        self.assertContains(response, 'Other ticket')
+        self.assertNotContains(response, 'Ticket 0')
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight()
+
+    def test_concurrent_callers_share_one_computation(self):
+        """Test that callers arriving while a computation runs get its result"""
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.flight.do('key', compute)))
+        leader.start()
+        started.wait(5)
+        followers = [
+            threading.Thread(target=lambda: results.append(self.flight.do('key', compute)))
+            for _ in range(3)
+        ]
+        for thread in followers:
+            thread.start()
+        while self.flight.stats['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(results, ['result'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_reach_every_caller_and_are_not_kept(self):
+        """Test that a failed computation raises and the next call retries"""
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            self.flight.do('key', fail, stale=60)
+        self.assertEqual(self.flight.do('key', lambda: 'ok', stale=60), 'ok')
+
+    def test_nothing_is_kept_by_default(self):
+        """Test that sequential calls recompute when no stale window is set"""
+        values = iter([1, 2])
+        self.assertEqual(self.flight.do('key', lambda: next(values)), 1)
+        self.assertEqual(self.flight.do('key', lambda: next(values)), 2)
+
+    @override_settings(SINGLEFLIGHT_REFRESH_INTERVAL=0)
+    def test_stale_result_is_served_while_refreshing(self):
+        """Test that a kept result is returned and refreshed in the background"""
+        values = iter(['old', 'new'])
+        self.assertEqual(self.flight.do('key', lambda: next(values), stale=60), 'old')
+        self.assertEqual(self.flight.do('key', lambda: next(values), stale=60), 'old')
+        for _ in range(500):
+            if self.flight.stats['computed'] == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.flight.do('key', lambda: 'newer', stale=60), 'new')
+
+    @override_settings(SINGLEFLIGHT_REFRESH_INTERVAL=60)
+    def test_background_refreshes_are_rate_limited(self):
+        """Test that a key serving stale results is refreshed at most once per interval"""
+        self.flight.do('key', lambda: 'old', stale=600)
+        for _ in range(3):
+            # The kept result is older than the interval.
+            self.flight._results['key'] = (time.monotonic() - 120, 'old')
+            self.assertEqual(self.flight.do('key', lambda: 'new', stale=600), 'old')
+            for _ in range(500):
+                if 'key' not in self.flight._calls:
+                    break
+                time.sleep(0.01)
+        self.assertEqual(self.flight.stats['computed'], 2)
+
+    @override_settings(DATABASE_REPLICA_ALIASES=['replica'])
+    def test_primary_pinned_callers_do_not_share_replica_results(self):
+        """Test that a result computed while reads go to a replica is not served to a pinned caller"""
+        with mock.patch.object(connection, 'in_atomic_block', False):
+            self.assertEqual(self.flight.do('key', lambda: 'replica', stale=60), 'replica')
+            with use_primary():
+                self.assertEqual(self.flight.do('key', lambda: 'primary', stale=60), 'primary')
+                self.assertEqual(self.flight.do('key', lambda: 'again', stale=60), 'primary')
+            self.assertEqual(self.flight.do('key', lambda: 'again', stale=60), 'replica')
+
+    @override_settings(SINGLEFLIGHT_SHARED=True)
+    def test_shared_mode_waits_for_other_worker(self):
+        """Test that a worker finding the cache lock taken uses the other worker's result"""
+        cache.add('singleflight:lock:key', 1)
+
+        def other_worker():
+            time.sleep(0.1)
+            cache.set('singleflight:result:key', (time.time(), 'theirs'))
+            cache.delete('singleflight:lock:key')
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        self.assertEqual(self.flight.do('key', lambda: 'ours'), 'theirs')
+        thread.join()
+
+    @override_settings(SINGLEFLIGHT_SHARED=True, SINGLEFLIGHT_LOCK_TIMEOUT=10)
+    def test_shared_mode_stops_waiting_when_other_worker_fails(self):
+        """Test that a worker computes at once when the other worker drops its lock without a new result"""
+        cache.set('singleflight:result:key', (time.time() - 60, 'old'))
+        cache.add('singleflight:lock:key', 1)
+
+        def other_worker():
+            time.sleep(0.1)
+            cache.delete('singleflight:lock:key')
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        started = time.monotonic()
+        self.assertEqual(self.flight.do('key', lambda: 'ours'), 'ours')
+        self.assertLess(time.monotonic() - started, 2)
+        thread.join()
+
+    def test_dashboard_uses_single_flight(self):
+        """Test that the employee dashboard still renders through the coalesced queries"""
+        employee = User.objects.create_user(username='sf_employee', password='testpass123')
+        employee.profile.role = 'employee'
+        employee.profile.save()
+        Ticket.objects.create(title='Coalesced ticket', description='Test', created_by=employee)
+        self.client.login(username='sf_employee', password='testpass123')
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Coalesced ticket')
+
+
+@override_settings(TICKET_CACHE=True)
+class TicketCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ticket_cache.local.clear()
+        metrics.reset()
+        self.user = User.objects.create_user(username='cacheuser', password='testpass123')
+        self.employee = User.objects.create_user(username='cacheemployee', password='testpass123')
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+        self.ticket = Ticket.objects.create(
+            title='Outage', description='Test', created_by=self.user, assigned_to=self.employee
+        )
+
+    def test_hit_needs_no_queries(self):
+        """Test that a cached ticket and its users come back without touching the database"""
+        ticket_cache.get_ticket(self.ticket.pk)
+        with self.assertNumQueries(0):
+            ticket = ticket_cache.get_ticket(self.ticket.pk)
+            self.assertEqual(ticket.title, 'Outage')
+            self.assertEqual(ticket.created_by.username, 'cacheuser')
+            self.assertEqual(ticket.assigned_to.username, 'cacheemployee')
+        self.assertEqual(metrics.value('ticket_cache_lookups_total', result='local_hit'), 1)
+        self.assertEqual(ticket_cache.hit_ratio(), 0.5)
+
+    def test_shared_tier_serves_other_workers(self):
+        """Test that an entry evicted from the local tier is found in the shared cache"""
+        ticket_cache.get_ticket(self.ticket.pk)
+        ticket_cache.local.clear()
+        with self.assertNumQueries(0):
+            ticket_cache.get_ticket(self.ticket.pk)
+        self.assertEqual(metrics.value('ticket_cache_lookups_total', result='shared_hit'), 1)
+
+    def test_save_and_delete_invalidate(self):
+        """Test that saving or deleting a ticket makes cached copies unreachable"""
+        ticket = ticket_cache.get_ticket(self.ticket.pk)
+        ticket.status = 'resolved'
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.save()
+        self.assertEqual(ticket_cache.get_ticket(self.ticket.pk).status, 'resolved')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.get(pk=self.ticket.pk).delete()
+        with self.assertRaises(Ticket.DoesNotExist):
+            ticket_cache.get_ticket(self.ticket.pk)
+
+    def test_user_change_invalidates_but_login_does_not(self):
+        """Test that renaming a user refreshes denormalized names and last_login saves are ignored"""
+        ticket_cache.get_ticket(self.ticket.pk)
+        self.client.login(username='cacheuser', password='testpass123')
+        with self.assertNumQueries(0):
+            ticket_cache.get_ticket(self.ticket.pk)
+
+        self.user.username = 'renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(ticket_cache.get_ticket(self.ticket.pk).created_by.username, 'renamed')
+
+    def test_local_tier_is_bounded(self):
+        """Test that the LRU drops the least recently used entry"""
+        lru = ticket_cache.LRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        self.assertEqual(len(lru), 2)
+
+    def test_detail_page_uses_cache(self):
+        """Test that repeated ticket detail views skip the ticket query"""
+        self.client.login(username='cacheemployee', password='testpass123')
+        url = reverse('ticket_detail', kwargs={'pk': self.ticket.pk})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertContains(response, 'Outage')
+        self.assertFalse([q for q in queries if 'FROM "tickets_ticket"' in q['sql']])
+
+    def test_metrics_endpoint(self):
+        """Test that metrics need the configured token and report the hit ratio"""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        ticket_cache.get_ticket(self.ticket.pk)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            response = self.client.get(url, headers={'Authorization': 'Bearer secret'})
+        self.assertContains(response, 'ticket_cache_lookups_total{pid=')
+        self.assertContains(response, 'result="miss"')
+        self.assertContains(response, 'ticket_cache_hit_ratio')
+
+
+class AdmissionControlTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.factory = RequestFactory()
+
+    def _request(self, method='get', path='/tickets/', user=None, **headers):
+        request = getattr(self.factory, method)(path, headers=headers)
+        request.user = user or AnonymousUser()
+        request.viewer = Viewer.from_user(request.user)
+        return request
+
+    def test_priorities(self):
+        """Test that writes and employee actions outrank user and polling reads"""
+        user = User.objects.create_user(username='adm_user', password='testpass123')
+        employee = User.objects.create_user(username='adm_employee', password='testpass123')
+        employee.profile.role = 'employee'
+        employee.profile.save()
+        employee = User.objects.get(pk=employee.pk)
+
+        self.assertEqual(admission.request_priority(self._request('post', user=employee)), admission.EMPLOYEE_WRITE)
+        self.assertEqual(admission.request_priority(self._request(user=employee)), admission.WRITE)
+        self.assertEqual(admission.request_priority(self._request('post', user=user)), admission.WRITE)
+        self.assertEqual(admission.request_priority(self._request(user=user)), admission.READ)
+        self.assertEqual(admission.request_priority(self._request(path='/dashboard/', user=user)), admission.BACKGROUND)
+        self.assertEqual(admission.request_priority(self._request(user=user, HX_Request='true')), admission.BACKGROUND)
+        self.assertEqual(admission.request_priority(self._request()), admission.BACKGROUND)
+        self.assertIsNone(admission.request_priority(self._request(path='/events/queue/', user=employee)))
+
+    def test_full_queue_sheds_lowest_priority(self):
+        """Test that a full queue sheds the newcomer, or displaces a lower-priority waiter"""
+        controller = admission.AdmissionController(limit=1, queue_size=1)
+        self.assertTrue(controller.acquire(admission.READ, timeout=1))
+
+        results = {}
+        waiter = threading.Thread(
+            target=lambda: results.setdefault('background', controller.acquire(admission.BACKGROUND, timeout=5))
+        )
+        waiter.start()
+        while controller.queue_depth < 1:
+            time.sleep(0.01)
+
+        self.assertFalse(controller.acquire(admission.BACKGROUND, timeout=1))
+        self.assertEqual(metrics.value('admission_shed_total', priority='background', reason='queue_full'), 1)
+
+        writer = threading.Thread(
+            target=lambda: results.setdefault('write', controller.acquire(admission.EMPLOYEE_WRITE, timeout=5))
+        )
+        writer.start()
+        waiter.join(5)
+        self.assertFalse(results['background'])
+        self.assertEqual(metrics.value('admission_shed_total', priority='background', reason='displaced'), 1)
+
+        controller.release()
+        writer.join(5)
+        self.assertTrue(results['write'])
+        self.assertEqual(controller.active, 1)
+
+    def test_queue_timeout(self):
+        """Test that a waiter gives up after the queue timeout"""
+        controller = admission.AdmissionController(limit=1, queue_size=4)
+        controller.acquire(admission.READ, timeout=1)
+        self.assertFalse(controller.acquire(admission.READ, timeout=0.05))
+        self.assertEqual(controller.queue_depth, 0)
+        self.assertEqual(metrics.value('admission_shed_total', priority='read', reason='timeout'), 1)
+
+    @override_settings(ADMISSION_CONTROL=True, ADMISSION_QUEUE_TIMEOUT=0.01)
+    def test_saturated_worker_returns_503(self):
+        """Test that the middleware answers 503 with Retry-After when no slot frees up"""
+        controller = admission.AdmissionController(limit=1, queue_size=0)
+        with mock.patch.object(admission, 'controller', controller):
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+            self.assertEqual(controller.active, 0)
+            self.assertEqual(metrics.value('admission_admitted_total', priority='background'), 1)
+
+            controller.acquire(admission.READ, timeout=1)
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(settings.ADMISSION_RETRY_AFTER))
+
+
+class QueueLoggingTest(TestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def _record(self, level=logging.INFO, **extra):
+        record = logging.LogRecord('tickets.views', level, __file__, 1, 'Ticket "%s" by %s', ('Outage', 'alice'), None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        """Test that events are one JSON object with the structured fields"""
+        line = JsonFormatter().format(self._record(action='ticket_update', ticket_id='abc', duration_ms=1.5))
+        event = json.loads(line)
+        self.assertEqual(event['message'], 'Ticket "Outage" by alice')
+        self.assertEqual(event['action'], 'ticket_update')
+        self.assertEqual(event['ticket_id'], 'abc')
+        self.assertEqual(event['duration_ms'], 1.5)
+        self.assertEqual(event['level'], 'INFO')
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test that records past the queue size are dropped and counted"""
+        handler = DroppingQueueHandler(queue_size=1, sample_rate=1.0)
+        handler.handle(self._record())
+        handler.handle(self._record(level=logging.ERROR))
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(metrics.value('log_records_dropped_total', reason='full'), 1)
+        # The queued record is already formatted and safe to hand to another thread.
+        record = handler.queue.get_nowait()
+        self.assertEqual(record.msg, 'Ticket "Outage" by alice')
+        self.assertIsNone(record.args)
+
+    def test_backlog_samples_low_levels_only(self):
+        """Test that a backed-up queue sheds INFO records but keeps warnings"""
+        handler = DroppingQueueHandler(queue_size=10, sample_rate=0.0, high_water=0.5)
+        for _ in range(5):
+            handler.queue.put_nowait(self._record())
+        handler.handle(self._record())
+        handler.handle(self._record(level=logging.WARNING))
+        self.assertEqual(handler.queue.qsize(), 6)
+        self.assertEqual(metrics.value('log_records_dropped_total', reason='sampled'), 1)
+
+    def test_queue_handler_writes_json_lines(self):
+        """Test that the background listener writes JSON lines to the wrapped handler"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'queued.log'
+            handler = queue_handler({
+                'class': 'logging.handlers.RotatingFileHandler', 'filename': path,
+                'maxBytes': 1024, 'backupCount': 1, 'level': 'INFO', 'formatter': 'verbose',
+            })
+            handler.handle(self._record(action='comment_add'))
+            handler.queue.join()
+            event = json.loads(path.read_text().splitlines()[0])
+        self.assertEqual(event['action'], 'comment_add')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requires fork()')
+    def test_forked_child_restarts_the_listener(self):
+        """Test that a process forked after the handler is built still writes its records"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'forked.log'
+            handler = queue_handler({'class': 'logging.FileHandler', 'filename': path, 'level': 'INFO'})
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    handler.handle(self._record(action='in_child'))
+                    # Drains the queue, then joins the thread.
+                    handler.listener.stop()
+                finally:
+                    os._exit(0)
+            os.waitpid(pid, 0)
+            handler.listener.stop()
+            events = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual([event['action'] for event in events], ['in_child'])
+        self.assertNotEqual(events[0]['process'], os.getpid())
+
+    def test_views_log_structured_events(self):
+        """Test that view log calls carry action, user, ticket ID and duration"""
+        User.objects.create_user(username='loguser', password='testpass123')
+        self.client.login(username='loguser', password='testpass123')
+        with self.assertLogs('tickets.views', level='INFO') as logs:
+            self.client.post(reverse('ticket_create'), {
+                'title': 'Logged ticket', 'description': 'Test', 'priority': 'high',
+            })
+        record = logs.records[0]
+        ticket = Ticket.objects.get(title='Logged ticket')
+        self.assertEqual(record.action, 'ticket_create')
+        self.assertEqual(record.user, 'loguser')
+        self.assertEqual(record.ticket_id, str(ticket.pk))
+        self.assertGreaterEqual(record.duration_ms, 0)
+        self.assertEqual(record.getMessage(), 'Ticket created: "Logged ticket" by loguser (Priority: High)')
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(PROFILING=True, PROFILING_DIR=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = User.objects.create_superuser(username='profadmin', password='testpass123')
+        self.client.login(username='profadmin', password='testpass123')
+
+    def test_superuser_can_request_a_profile(self):
+        """Test that ?_profile=1 from a superuser stores a profile of the whole request"""
+        response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(profile.trigger, 'requested')
+        self.assertEqual(profile.view_name, 'dashboard')
+        self.assertEqual(profile.username, 'profadmin')
+        self.assertTrue(profiling.profile_path(profile.filename).exists())
+
+        tree = profiling.call_tree(profiling.load(profile))
+        self.assertIn('(dashboard)', tree)
+        self.assertIn('(render)', tree)
+        self.assertIn('tottime', profiling.hot_functions(profiling.load(profile)))
+
+    def test_other_users_cannot_request_profiles(self):
+        """Test that the trigger is ignored for non-superusers"""
+        User.objects.create_user(username='profuser', password='testpass123')
+        self.client.login(username='profuser', password='testpass123')
+        response = self.client.get(reverse('dashboard'), headers={'X-Profile': '1'})
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0, PROFILING_MAX_PROFILES=2)
+    def test_sampling_keeps_a_bounded_ring(self):
+        """Test that sampled profiles beyond the limit are deleted with their files"""
+        for _ in range(3):
+            self.client.get(reverse('home'))
+        profiles = list(RequestProfile.objects.all())
+        self.assertEqual(len(profiles), 2)
+        self.assertEqual({p.trigger for p in profiles}, {'sampled'})
+        self.assertEqual(
+            sorted(path.name for path in Path(self.directory.name).iterdir()),
+            sorted(p.filename for p in profiles),
+        )
+
+    def test_admin_shows_call_tree(self):
+        """Test that the admin change page renders the call tree"""
+        response = self.client.get(reverse('dashboard'), {'_profile': '1'})
+        profile_id = response['X-Profile-Id']
+        response = self.client.get(reverse('admin:tickets_requestprofile_change', args=[profile_id]))
+        self.assertContains(response, 'Call tree (by cumulative time)')
+        self.assertContains(response, '(dashboard)')
+
+
+@override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_MS=0)
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        # The wrapper is installed when a connection is created, and the test
+        # connection already exists.
+        wrapper = connection.execute_wrapper(slow_queries.slow_query_wrapper)
+        wrapper.__enter__()
+        self.addCleanup(wrapper.__exit__, None, None, None)
+
+    def test_normalize_replaces_literals(self):
+        """Test that statements differing only in values share a fingerprint"""
+        first = slow_queries.normalize("SELECT * FROM t WHERE a = 'x' AND b IN (%s, %s)  AND c = 12")
+        second = slow_queries.normalize("SELECT * FROM t WHERE a = 'it''s' AND b IN (%s) AND c = 7")
+        self.assertEqual(first, 'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?')
+        self.assertEqual(first, second)
+
+    def test_full_scan_is_detected(self):
+        """Test that table scans, and index walks that cannot stop early, are flagged"""
+        walk = 'SCAN tickets_ticket USING INDEX ticket_created_idx'
+        self.assertTrue(slow_queries.is_full_scan('SCAN tickets_ticket'))
+        self.assertFalse(slow_queries.is_full_scan('SEARCH tickets_ticket USING INDEX sqlite_autoindex (id=?)'))
+        # A newest-first page stops after its LIMIT...
+        page = 'SELECT * FROM "tickets_ticket" ORDER BY "tickets_ticket"."created_at" DESC LIMIT 20'
+        self.assertFalse(slow_queries.is_full_scan(walk, page))
+        # ...but not when rows are filtered on the way, or when there is no LIMIT.
+        filtered = ('SELECT * FROM "tickets_ticket" WHERE "tickets_ticket"."description" LIKE %s '
+                    'ORDER BY "tickets_ticket"."created_at" DESC LIMIT 20')
+        self.assertTrue(slow_queries.is_full_scan(walk, filtered))
+        self.assertTrue(slow_queries.is_full_scan(
+            'SCAN tickets_ticket USING COVERING INDEX ticket_status_idx', 'SELECT COUNT(*) FROM "tickets_ticket"'
+        ))
+        aliased = 'SELECT U0."id" FROM "tickets_ticket" U0 WHERE U0."status" = %s ORDER BY U0."created_at" LIMIT 5'
+        self.assertTrue(slow_queries.is_full_scan('SCAN U0 USING INDEX ticket_created_idx', aliased))
+
+    def test_slow_queries_are_aggregated_with_plan(self):
+        """Test that repeated slow queries update one row with its plan and call site"""
+        with self.assertLogs('tickets.slow_queries', 'WARNING') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            for title in ('first', 'second'):
+                list(Ticket.objects.filter(description__contains=title))
+        query = SlowQuery.objects.get(normalized_sql__contains='"description" LIKE')
+        self.assertEqual(query.count, 2)
+        self.assertGreaterEqual(query.total_ms, query.max_ms)
+        self.assertTrue(query.full_scan)
+        self.assertIn('SCAN', query.plan)
+        self.assertIn('tickets/tests.py', query.call_site)
+        self.assertIn('%first%', query.example_params)
+        self.assertTrue(any('LIKE' in line for line in logs.output))
+
+    def test_credentials_are_not_stored(self):
+        """Test that parameters of queries on the user table are redacted"""
+        with self.assertLogs('tickets.slow_queries', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            list(User.objects.filter(username='secret-name'))
+        query = SlowQuery.objects.get(normalized_sql__contains='FROM "auth_user"')
+        self.assertEqual(query.example_params, '(redacted)')
+
+    def test_view_name_is_recorded(self):
+        """Test that queries run by a view are tagged with its name"""
+        User.objects.create_user(username='slowuser', password='testpass123')
+        self.client.login(username='slowuser', password='testpass123')
+        with self.assertLogs('tickets.slow_queries', 'WARNING'), self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('ticket_list'))
+        self.assertTrue(SlowQuery.objects.filter(view_name='ticket_list').exists())
+
+    @override_settings(SLOW_QUERY_MS=10000)
+    def test_fast_queries_are_ignored(self):
+        """Test that queries under the threshold are not recorded"""
+        list(Ticket.objects.all())
+        self.assertFalse(SlowQuery.objects.exists())
+
+
+@override_settings(SLOW_QUERY_LOG=True, SLOW_QUERY_MS=0)
+class SlowQueryTransactionTest(TransactionTestCase):
+    def setUp(self):
+        wrapper = connection.execute_wrapper(slow_queries.slow_query_wrapper)
+        wrapper.__enter__()
+        self.addCleanup(wrapper.__exit__, None, None, None)
+
+    def test_rows_are_written_after_the_transaction(self):
+        """Test that a slow query in a transaction is stored once it ends, even when it rolled back"""
+        class Rollback(Exception):
+            pass
+
+        with self.assertLogs('tickets.slow_queries', 'WARNING'):
+            try:
+                with transaction.atomic():
+                    list(Ticket.objects.filter(description__contains='rolled back'))
+                    self.assertEqual(SlowQuery.objects.count(), 0)
+                    raise Rollback
+            except Rollback:
+                pass
+            slow_queries.flush()
+            self.assertTrue(SlowQuery.objects.filter(normalized_sql__contains='"description" LIKE').exists())
+
+            with transaction.atomic():
+                list(Ticket.objects.filter(title__contains='committed'))
+            self.assertTrue(SlowQuery.objects.filter(normalized_sql__contains='"title" LIKE').exists())
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee, cls.user = query_plans.seed(tickets=3000, users=100)
+
+    def test_hot_queries_use_their_indexes(self):
+        """Test that no registered hot query scans a table, sorts in a temp B-tree or misses its index"""
+        query_plans.assert_query_plans(self.employee, self.user)
+
+    def test_regressions_are_reported(self):
+        """Test that a query ordering by an unindexed column fails the check"""
+        query = query_plans.HotQuery(
+            'by title', lambda employee, user: list(Ticket.objects.order_by('title')[:10]),
+            indexes=[(Ticket, ['created_at'])],
+        )
+        result = query_plans.check(query, self.employee, self.user)
+        self.assertFalse(result.ok)
+        self.assertTrue(any(problem.startswith('full table scan') for problem in result.problems))
+        self.assertTrue(any(problem.startswith('temporary B-tree') for problem in result.problems))
+        self.assertIn('index on tickets_ticket(created_at) not used', result.problems)
+
+    def test_filtered_index_walk_is_reported_unless_allowed(self):
+        """Test that an ordered page filtered on an unindexed column fails the check unless allow-listed"""
+        def run(employee, user):
+            list(Ticket.objects.filter(description__contains='Seeded')[:10])
+
+        result = query_plans.check(query_plans.HotQuery('by description', run), self.employee, self.user)
+        self.assertTrue(any(problem.startswith('full index scan') for problem in result.problems))
+        allowed = query_plans.HotQuery('by description', run, index_walks=[Ticket])
+        self.assertTrue(query_plans.check(allowed, self.employee, self.user).ok)
+
+    def test_missing_index_is_reported(self):
+        """Test that an expected index that does not exist is reported"""
+        query = query_plans.HotQuery('by description', lambda employee, user: None,
+                                     indexes=[(Ticket, ['description'])])
+        self.assertEqual(query_plans.check(query, self.employee, self.user).problems,
+                         ['no index on tickets_ticket(description)'])
+
+
+class MemoryInstrumentationTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        settings_override = override_settings(MEMORY_PROFILING=True, MEMORY_SNAPSHOT_DIR=self.directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(5)
+            self.addCleanup(tracemalloc.stop)
+        memory._state.update(requests=0, recycling=False)
+        metrics.reset()
+        self.admin = User.objects.create_superuser(username='memadmin', password='testpass123')
+        self.client.login(username='memadmin', password='testpass123')
+
+    def test_request_peaks_are_recorded_per_view(self):
+        """Test that each request's peak allocation is counted under its view, after a baseline snapshot"""
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(metrics.value('memory_requests_total', view='dashboard'), 2)
+        self.assertGreater(metrics.value('memory_request_peak_bytes_total', view='dashboard'), 0)
+        self.assertGreater(metrics.value('memory_request_peak_bytes_max', view='dashboard'), 0)
+        self.assertEqual([path.name.endswith('-baseline.tracemalloc') for path in memory.list_snapshots()], [True])
+        self.assertIn('memory_rss_bytes{', metrics.render())
+
+    @override_settings(MEMORY_MAX_SNAPSHOTS=2)
+    def test_oldest_snapshots_are_deleted(self):
+        """Test that only the newest MEMORY_MAX_SNAPSHOTS snapshots are kept"""
+        paths = []
+        for n in range(4):
+            paths.append(memory.take_snapshot(f'manual{n}'))
+            # list_snapshots orders by modification time.
+            os.utime(paths[-1], (n, n))
+        self.assertEqual(memory.list_snapshots(), paths[2:])
+
+    def test_superuser_can_request_a_snapshot(self):
+        """Test that X-Memory-Snapshot from a superuser writes a snapshot named in the response"""
+        response = self.client.get(reverse('dashboard'), headers={'X-Memory-Snapshot': '1'})
+        self.assertTrue((Path(self.directory.name) / response['X-Memory-Snapshot']).is_file())
+
+        User.objects.create_user(username='memuser', password='testpass123')
+        self.client.login(username='memuser', password='testpass123')
+        response = self.client.get(reverse('dashboard'), headers={'X-Memory-Snapshot': '1'})
+        self.assertNotIn('X-Memory-Snapshot', response)
+
+    def test_diff_report_shows_growth_by_line(self):
+        """Test that the diff between two snapshots points at the line that allocated"""
+        before = memory.take_snapshot('before')
+        retained = [bytearray(1024) for _ in range(2000)]
+        after = memory.take_snapshot('after')
+        report = memory.diff_report(before, after)
+        self.assertIn('tickets/tests.py', report.splitlines()[1])
+        self.assertEqual(len(retained), 2000)
+
+        out = StringIO()
+        call_command('memory_report', before.name, after.name, '--group-by', 'filename', stdout=out)
+        self.assertIn('tickets/tests.py', out.getvalue())
+        out = StringIO()
+        call_command('memory_report', stdout=out)
+        self.assertIn(after.name, out.getvalue())
+
+    @override_settings(MEMORY_PROFILING=False, MEMORY_RECYCLE_RSS_MB=1)
+    def test_worker_is_recycled_once_over_the_rss_limit(self):
+        """Test that a worker over MEMORY_RECYCLE_RSS_MB asks its recycler for a restart once"""
+        recycler = mock.Mock()
+        memory.set_recycler(recycler)
+        self.addCleanup(memory.set_recycler, None)
+        with self.assertLogs('tickets.memory', 'WARNING'):
+            self.client.get(reverse('home'))
+            self.client.get(reverse('home'))
+        recycler.assert_called_once_with()
+        self.assertEqual(metrics.value('memory_recycles_total', reason='rss'), 1)
+
+
+class WarmupTest(TestCase):
+    def test_run_warms_every_step(self):
+        """Test that warmup compiles every project template into the cached loader and runs each step"""
+        with mock.patch('tickets.warmup.connections.close_all') as close_all:
+            results = warmup.run(pre_fork=True)
+        close_all.assert_called_once_with()
+        self.assertEqual([name for name, _, _ in results], [name for name, _ in warmup.STEPS])
+        self.assertNotIn(None, [items for _, items, _ in results])
+
+        names = [name for _, name in warmup.project_templates()]
+        self.assertIn('tickets/dashboard.html', names)
+        self.assertNotIn('admin/base.html', names)
+        loader = Engine.get_default().template_loaders[0]
+        self.assertIn('tickets/dashboard.html', {key.split('-')[0] for key in loader.get_template_cache})
+
+    def test_failing_step_does_not_stop_startup(self):
+        """Test that an exception in one step is logged and the others still run"""
+        steps = (('broken', mock.Mock(side_effect=RuntimeError)), ('fine', lambda: 1))
+        with mock.patch.object(warmup, 'STEPS', steps), self.assertLogs('tickets.warmup', 'ERROR'):
+            results = warmup.run()
+        self.assertEqual([(name, items) for name, items, _ in results], [('broken', None), ('fine', 1)])
+
+    @override_settings(SINGLEFLIGHT_STALE_SECONDS=60)
+    def test_dashboard_results_are_primed(self):
+        """Test that the shared dashboard results are computed when they are kept"""
+        self.addCleanup(flight.forget)
+        self.assertEqual(warmup.warm_caches(), 3)
+        self.assertEqual(set(flight._results), {'dashboard:recent', 'dashboard:unassigned', 'dashboard:stats'})
+
+    def test_import_times_are_parsed(self):
+        """Test that the -X importtime breakdown is collected per package and module"""
+        total, packages, modules = warmup.import_times('import json')
+        self.assertGreater(total, 0)
+        self.assertIn('json', packages)
+        self.assertIn('json.decoder', modules)
+
+
+class StaticPipelineTest(TestCase):
+    CSS = (
+        '/*! Bootstrap */:root{--bs-blue:#0d6efd}.btn{color:red}.btn-primary,.carousel-item{top:0}'
+        '@media (min-width:576px){.carousel{top:0}.col-md-6{content:"}"}}'
+        '@font-face{font-family:"bootstrap-icons";src:url("./fonts/bootstrap-icons.woff2?24e3") format("woff2")}'
+        '.bi-archive::before{content:"\\f1"}.bi-zoom-in::before{content:"\\f2"}'
+        '.nav:not(.carousel) a{top:0}.bg-danger{top:0}'
+    )
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.root = Path(self.directory.name)
+
+    def test_unused_classes_are_pruned(self):
+        """Test that rules needing a class the project never names are dropped, and the rest kept"""
+        template = self.root / 'page.html'
+        template.write_text('<a class="btn btn-primary nav col-md-6 bg-{{ color }}"><i class="bi bi-archive"></i></a>')
+        pruned = static_pipeline.prune_css(self.CSS, static_pipeline.used_tokens([template]))
+
+        self.assertEqual(pruned, (
+            ':root{--bs-blue:#0d6efd}.btn{color:red}.btn-primary{top:0}'
+            '@media (min-width:576px){.col-md-6{content:"}"}}'
+            '@font-face{font-family:"bootstrap-icons";src:url("./fonts/bootstrap-icons.woff2?24e3") format("woff2")}'
+            '.bi-archive::before{content:"\\f1"}.nav:not(.carousel) a{top:0}.bg-danger{top:0}'
+        ))
+
+    def test_real_bootstrap_keeps_the_classes_templates_use(self):
+        """Test that bundling the vendored bootstrap.min.css keeps every Bootstrap class the templates name"""
+        name = 'vendor/bootstrap/bootstrap.min.css'
+        css = (static_pipeline.STATIC_DIR / name).read_text()
+        bundle = self.root / 'app.css'
+        with mock.patch.object(static_pipeline, 'BUNDLE_SOURCES', ((name, True),)), \
+                mock.patch.object(static_pipeline, 'BUNDLE', str(bundle)):
+            [(_, before, after)] = static_pipeline.build_bundle()
+        kept = set(static_pipeline._CLASS.findall(bundle.read_text()))
+
+        templates = Path(static_pipeline.__file__).parent / 'templates'
+        named = {word for path in templates.rglob('*.html')
+                 for value in re.findall(r'class="([^"]*)"', path.read_text())
+                 for word in value.split() if not set(word) & set('{}%')}
+        # Classes with a rule of their own (``.navbar{...}``, ``.btn:hover{...}``) in Bootstrap.
+        styled = {word for word in named if re.search(rf'[{{}},]\.{re.escape(word)}[{{,:]', css)}
+        self.assertTrue({'navbar', 'btn-primary', 'card', 'badge', 'table'} <= styled)
+        self.assertEqual(styled - kept, set())
+        self.assertNotIn('carousel', kept)
+        self.assertLess(after, before / 2)
+
+    def test_vendored_files_match_the_lock(self):
+        """Test that every vendored file is committed unmodified, as pinned in vendor.lock.json"""
+        lock = json.loads(static_pipeline.LOCK_FILE.read_text())
+        self.assertEqual(set(lock), set(static_pipeline.VENDOR_FILES))
+        for name, url in static_pipeline.VENDOR_FILES.items():
+            with self.subTest(name):
+                self.assertEqual(lock[name]['url'], url)
+                data = (static_pipeline.STATIC_DIR / name).read_bytes()
+                self.assertEqual(static_pipeline.integrity(data), lock[name]['integrity'])
+
+    def test_committed_bundle_is_current(self):
+        """Test that the committed bundle is what build_static makes of the current templates"""
+        css, _ = static_pipeline.bundle_css()
+        committed = (static_pipeline.STATIC_DIR / static_pipeline.BUNDLE).read_text()
+        self.assertTrue(css == committed, 'tickets/dist/app.css is out of date; run `manage.py build_static`.')
+
+    def test_bundle_urls_point_at_vendored_files(self):
+        """Test that relative url()s are rewritten for the bundle's location, dropping cache-busting queries"""
+        css = static_pipeline.rewrite_urls(
+            '@font-face{src:url("./fonts/bi.woff2?24e3"),url(data:font/woff;base64,AA)}',
+            'vendor/bootstrap-icons/bootstrap-icons.min.css', static_pipeline.BUNDLE,
+        )
+        self.assertEqual(css, '@font-face{src:url("../../vendor/bootstrap-icons/fonts/bi.woff2"),'
+                              'url(data:font/woff;base64,AA)}')
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        """Test that the manifest storage hashes file names and writes a gzip variant next to each text file"""
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'tickets.static_pipeline.CompressedManifestStaticFilesStorage'},
+        }
+        with override_settings(STATIC_ROOT=self.root, STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name('tickets/css/style.css')
+
+            script = staticfiles_storage.stored_name('vendor/bootstrap/bootstrap.min.js')
+
+        self.assertRegex(hashed, static_pipeline.HASHED_NAME)
+        original = (self.root / hashed).read_bytes()
+        self.assertEqual(gzip.decompress((self.root / f'{hashed}.gz').read_bytes()), original)
+        # Source map comments are left as published, though the maps are not vendored.
+        vendored = (static_pipeline.STATIC_DIR / 'vendor/bootstrap/bootstrap.min.js').read_bytes()
+        self.assertEqual((self.root / script).read_bytes(), vendored)
+
+    def test_precompressed_variants_are_served_immutable(self):
+        """Test that the preferred accepted variant is served, with year-long caching for hashed names"""
+        css = b'.btn{color:red}' * 200
+        (self.root / 'app.0123456789ab.css').write_bytes(css)
+        static_pipeline.precompress(self.root / 'app.0123456789ab.css')
+        (self.root / 'app.css').write_bytes(css)
+
+        with override_settings(SERVE_STATIC=True, STATIC_ROOT=self.root):
+            response = self.client.get('/static/app.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            self.assertEqual(response['Cache-Control'], static_pipeline.IMMUTABLE_CACHE)
+            self.assertLess(int(response['Content-Length']), len(css))
+            self.assertNotIn('Set-Cookie', response)
+
+            revalidated = self.client.get('/static/app.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip',
+                                          HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+
+            plain = self.client.get('/static/app.0123456789ab.css', HTTP_ACCEPT_ENCODING='gzip;q=0')
+            self.assertNotIn('Content-Encoding', plain)
+            self.assertEqual(b''.join(plain.streaming_content), css)
+            self.assertNotEqual(plain['ETag'], response['ETag'])
+
+            self.assertEqual(self.client.get('/static/app.css')['Cache-Control'], static_pipeline.REVALIDATE_CACHE)
+            self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+
+    def test_encoding_negotiation(self):
+        """Test that Accept-Encoding q-values and wildcards are honoured"""
+        self.assertEqual(compression.negotiate('gzip;q=0.5, identity'), 'gzip')
+        self.assertIsNone(compression.negotiate('gzip;q=0, identity'))
+        self.assertIsNone(compression.negotiate(''))
+        self.assertEqual(compression.negotiate('*'), next(iter(compression.ENCODINGS)))
+        self.assertEqual(compression.negotiate('*, gzip;q=0', available=['gzip']), None)
+
+    def test_vendored_assets_replace_the_cdn(self):
+        """Test that STATIC_VENDORED pages load the local bundle instead of the CDN, and are checked"""
+        User.objects.create_user(username='static', password='pass12345')
+        self.client.login(username='static', password='pass12345')
+        self.assertContains(self.client.get(reverse('dashboard')), 'cdn.jsdelivr.net')
+        with override_settings(STATIC_VENDORED=True):
+            response = self.client.get(reverse('dashboard'))
+            self.assertNotContains(response, 'cdn.jsdelivr.net')
+            self.assertContains(response, f'/static/{static_pipeline.BUNDLE}')
+            for name in static_pipeline.SCRIPTS:
+                self.assertContains(response, f'<script src="/static/{name}"></script>')
+            with mock.patch('tickets.static_pipeline.finders.find', return_value=None):
+                self.assertEqual([e.id for e in static_pipeline.check_vendored_assets(None)], ['tickets.W003'])
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = b''.join(b'<tr><td>Ticket %d</td><td>open</td></tr>' % n for n in range(100))
+
+    def compress(self, response, **headers):
+        request = self.factory.get('/', **{'HTTP_ACCEPT_ENCODING': 'gzip', **headers})
+        return compression.compress_response(request, response)
+
+    def test_pages_are_compressed(self):
+        """Test that a large page is sent gzipped to a client that accepts it, and plain to one that does not"""
+        user = User.objects.create_user(username='compressed', password='pass12345')
+        ticket = Ticket.objects.create(title='Long ticket', description='Lorem ipsum ' * 500, created_by=user)
+        self.client.login(username='compressed', password='pass12345')
+        url = reverse('ticket_detail', args=[ticket.pk])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        page = gzip.decompress(response.content)
+        self.assertIn(b'Lorem ipsum', page)
+        self.assertLess(len(response.content), len(page) / 3)
+
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertContains(plain, 'Lorem ipsum')
+
+    def test_small_compressed_and_cross_site_responses_are_left_alone(self):
+        """Test that small bodies, already-compressed types and cross-site requests are not compressed"""
+        skipped = [
+            (HttpResponse(b'<p>short</p>'), {}),
+            (HttpResponse(self.body, content_type='application/pdf'), {}),
+            (HttpResponse(self.body, content_type='image/png'), {}),
+            (HttpResponse(self.body, headers={'Content-Encoding': 'br'}), {}),
+            (HttpResponse(self.body), {'HTTP_SEC_FETCH_SITE': 'cross-site'}),
+            (HttpResponse(self.body), {'HTTP_ACCEPT_ENCODING': 'identity'}),
+        ]
+        for response, headers in skipped:
+            with self.subTest(content_type=response['Content-Type'], headers=headers):
+                encoding, body = response.get('Content-Encoding'), response.content
+                self.compress(response, **headers)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+                self.assertEqual(response.content, body)
+
+        response = self.compress(HttpResponse(self.body, headers={'ETag': '"v1"'}), HTTP_SEC_FETCH_SITE='same-origin')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"v1"')
+
+    def test_output_length_is_padded(self):
+        """Test that identical bodies compress to varying lengths, which still decompress"""
+        outputs = [compression.compress_bytes('gzip', self.body) for _ in range(10)]
+        self.assertGreater(len({len(output) for output in outputs}), 1)
+        for output in outputs:
+            self.assertEqual(gzip.decompress(output), self.body)
+
+    def test_streaming_response_is_compressed_incrementally(self):
+        """Test that each chunk of a streaming response can be decompressed as soon as it is sent"""
+        chunks = [b'data: %d\n\n' % n for n in range(3)]
+        response = self.compress(StreamingHttpResponse(iter(chunks), content_type='text/event-stream'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        received = iter(response.streaming_content)
+        decompressor.decompress(next(received))  # the header
+        for chunk in chunks:
+            self.assertEqual(decompressor.decompress(next(received)), chunk)
+        decompressor.decompress(b''.join(received))
+        self.assertTrue(decompressor.eof)
+
+    def test_async_streaming_response_is_compressed(self):
+        """Test that an async streaming response (the live update stream) is compressed too"""
+        async def events():
+            for n in range(50):
+                yield f'data: {n}\n\n'
+
+        response = self.compress(StreamingHttpResponse(events(), content_type='text/event-stream'))
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(gzip.decompress(async_to_sync(read)()),
+                         ''.join(f'data: {n}\n\n' for n in range(50)).encode())
+
+
+JINJA2_TEMPLATES = [
+    *settings.TEMPLATES[:1],
+    {
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {'environment': 'tickets.jinja_env.environment'},
+    },
+]
+
+
+class HotTemplateTest(TestCase):
+    def setUp(self):
+        self.employee = User.objects.create_user(username='hot-employee', password='pass12345')
+        self.employee.profile.role = 'employee'
+        self.employee.profile.save()
+        self.ticket = Ticket.objects.create(title='Printer <jam>', description='Tray 2', created_by=self.employee,
+                                            priority='urgent')
+        Ticket.objects.create(title='Unassigned one', description='-', created_by=self.employee)
+        for n in range(3):
+            Comment.objects.create(ticket=self.ticket, author=self.employee, body=f'Line one\nline {n} & more',
+                                   is_internal=n == 1)
+        self.client.login(username='hot-employee', password='pass12345')
+        self.pages = [reverse('dashboard'), reverse('ticket_list'), reverse('ticket_detail', args=[self.ticket.pk])]
+
+    def _render(self, url):
+        html = self.client.get(url).content.decode()
+        # The CSRF token is masked differently in every response.
+        html = re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', html)
+        return [line.strip() for line in html.splitlines() if line.strip()]
+
+    def test_rows_render_through_hot_rows(self):
+        """Test that the row templates render the ticket and comment loops with the Django engine"""
+        dashboard, ticket_list, detail = (self.client.get(url) for url in self.pages)
+        self.assertContains(dashboard, 'Printer &lt;jam&gt;')
+        self.assertContains(dashboard, 'Assign to Me', count=2)
+        self.assertContains(ticket_list, '<span class="badge bg-danger">Urgent</span>', html=True)
+        self.assertContains(detail, '<p>Line one<br>line 2 &amp; more</p>', html=True)
+        self.assertContains(detail, 'internal-comment', count=1)
+
+    @unittest.skipUnless(importlib.util.find_spec('jinja2'), 'Jinja2 is not installed')
+    def test_jinja2_rows_match_django_rows(self):
+        """Test that the Jinja2 row templates produce the same pages as the Django ones, and cache bytecode"""
+        expected = [self._render(url) for url in self.pages]
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(TEMPLATES=JINJA2_TEMPLATES, HOT_TEMPLATE_ENGINE='jinja2',
+                                  JINJA2_BYTECODE_DIR=directory):
+            for url, lines in zip(self.pages, expected):
+                with self.subTest(url=url):
+                    self.assertEqual(self._render(url), lines)
+            self.assertTrue(any(Path(directory).iterdir()))
+
+
+@override_settings(ADMIN_SCALABLE=True, ADMIN_COUNT_LIMIT=3, ADMIN_INLINE_LIMIT=2)
+class ScalableAdminTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('scalable-admin', 'admin@example.com', 'pass12345')
+        self.agent = User.objects.create_user('scalable-agent')
+        self.tickets = [
+            Ticket.objects.create(title=f'Printer {n} jams', description='Paper jam', created_by=self.admin,
+                                  assigned_to=self.agent if n % 2 else None)
+            for n in range(5)
+        ]
+        Ticket.objects.create(title='VPN drops', description='Printer unrelated', created_by=self.agent)
+        self.ticket = self.tickets[0]
+        self.comments = [Comment.objects.create(ticket=self.ticket, author=self.agent, body=f'Update {n}')
+                         for n in range(4)]
+        self.client.force_login(self.admin)
+        self.changelist = reverse('admin:tickets_ticket_changelist')
+
+    def test_changelist_counts_are_estimated_or_capped(self):
+        """Test that the changelist shows an ANALYZE estimate unfiltered and a capped count when filtered"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        response = self.client.get(self.changelist)
+        self.assertContains(response, 'about 6 tickets')
+        response = self.client.get(self.changelist, {'status__exact': 'open'})
+        self.assertContains(response, '3+ tickets')
+        self.assertNotContains(response, 'total')
+        response = self.client.get(self.changelist, {'q': 'vpn'})
+        self.assertContains(response, '1 ticket')
+
+    def test_search_is_prefix_username_or_id(self):
+        """Test that scalable search matches a title prefix, an exact username or an ID, not substrings"""
+        def results(term):
+            queryset, _ = admin.site._registry[Ticket].get_search_results(None, Ticket.objects.all(), term)
+            return set(queryset)
+        self.assertEqual(results('PRINTER 3'), {self.tickets[3]})
+        self.assertEqual(results('jams'), set())
+        self.assertEqual(results('scalable-agent'), {*self.tickets[1::2], Ticket.objects.get(title='VPN drops')})
+        self.assertEqual(results(str(self.ticket.pk)), {self.ticket})
+
+    def test_title_prefix_search_uses_index(self):
+        """Test that the title prefix search is answered from the NOCASE title index"""
+        queryset = scalable_admin.search(Ticket, Ticket.objects.all(), 'Printer', prefix_fields=('title',))
+        sql, params = queryset.query.sql_with_params()
+        plan = slow_queries.explain(connection, sql, params)
+        self.assertIn('ticket_title_nocase_idx', plan)
+        self.assertFalse(slow_queries.is_full_scan(plan, sql))
+
+    def test_change_page_shows_latest_inlines_read_only(self):
+        """Test that the change page shows only the latest comments, read-only, with a link to all of them"""
+        response = self.client.get(reverse('admin:tickets_ticket_change', args=[self.ticket.pk]))
+        self.assertEqual(response.context['inline_admin_formsets'][0].formset.queryset.count(), 2)
+        self.assertContains(response, 'Update 3')
+        self.assertNotContains(response, 'Update 1')
+        self.assertNotContains(response, 'name="comments-0-body"')
+        self.assertContains(response, f'?ticket={self.ticket.pk}">View all 4 comments</a>', html=False)
+        response = self.client.get(reverse('admin:tickets_comment_changelist'), {'ticket': self.ticket.pk})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertContains(response, '3+ comments')
+
+    @override_settings(TICKET_CACHE=True)
+    def test_bulk_actions_are_one_update(self):
+        """Test that a bulk status action updates every selected ticket in one UPDATE and drops cached copies"""
+        ticket_cache.local.clear()
+        cached = ticket_cache.get_ticket(self.ticket.pk)
+        pks = [str(ticket.pk) for ticket in self.tickets]
+        updates = []
+
+        def record(execute, sql, params, many, context):
+            if sql.startswith('UPDATE'):
+                updates.append(sql)
+            return execute(sql, params, many, context)
+
+        with self.captureOnCommitCallbacks(execute=True), connection.execute_wrapper(record):
+            response = self.client.post(self.changelist, {'action': 'mark_resolved', '_selected_action': pks})
+        self.assertRedirects(response, self.changelist)
+        self.assertEqual(len([sql for sql in updates if 'tickets_ticket' in sql]), 1)
+        self.assertEqual(Ticket.objects.filter(status='resolved').count(), 5)
+        self.assertGreater(Ticket.objects.get(pk=self.ticket.pk).updated_at, cached.updated_at)
+        self.assertEqual(ticket_cache.get_ticket(self.ticket.pk).status, 'resolved')
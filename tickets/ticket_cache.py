@@ -0,0 +1,213 @@
+"""Read-through cache for Ticket objects, enabled with ``TICKET_CACHE``.
+
+A lookup tries a bounded in-process LRU, then the shared Django cache, then
+the database. Entries hold the ticket's fields together with its creator's
+and assignee's user fields, so a hit needs no query.
+
+Each ticket has a version in the shared cache that is bumped when the ticket
+is saved or deleted, and entries are stored under the version they were read
+at. A bump therefore makes every older copy unreachable, in all workers,
+without having to find and delete them. User edits bump one generation
+shared by all entries, since they may be copied into any of them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.checks import Warning, register
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Ticket
+from .routers import use_primary
+from .sessions import PROCESS_LOCAL_CACHES
+from .sharding import ticket_queryset
+
+USERS_KEY = 'ticket_cache:users'
+USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name']
+TICKET_FIELDS = [field.attname for field in Ticket._meta.concrete_fields]
+# Saves that touch only these User fields leave cached tickets valid.
+IGNORED_USER_FIELDS = {'last_login', 'password'}
+
+
+def _version_key(pk):
+    return f'ticket_cache:version:{pk}'
+
+
+def _entry_key(pk, version):
+    return f'ticket_cache:entry:{pk}:{version[0]}:{version[1]}'
+
+
+class LRU:
+    """A thread-safe mapping that drops the least recently used keys beyond ``size``."""
+
+    def __init__(self, size):
+        self.size = size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local = LRU(settings.TICKET_CACHE_LOCAL_SIZE)
+
+
+def _current_version(pk):
+    """Return the (ticket version, user generation) pair entries are stored under."""
+    version_key = _version_key(pk)
+    found = cache.get_many([version_key, USERS_KEY])
+    for key in (version_key, USERS_KEY):
+        if key not in found:
+            # Start from the clock rather than 0: if the key was evicted, an
+            # old entry stored under a low number must not become current again.
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+    return found[version_key], found[USERS_KEY]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def _user_fields(user):
+    return None if user is None else {name: getattr(user, name) for name in USER_FIELDS}
+
+
+def _entry(ticket):
+    return {
+        'db': ticket._state.db,
+        'ticket': {name: getattr(ticket, name) for name in TICKET_FIELDS},
+        'created_by': _user_fields(ticket.created_by),
+        'assigned_to': _user_fields(ticket.assigned_to),
+    }
+
+
+def _user(db, fields):
+    return User.from_db(db, USER_FIELDS, [fields[name] for name in USER_FIELDS])
+
+
+def _build(entry):
+    db = entry['db']
+    ticket = Ticket.from_db(db, TICKET_FIELDS, [entry['ticket'][name] for name in TICKET_FIELDS])
+    ticket.created_by = _user(db, entry['created_by'])
+    if entry['assigned_to'] is not None:
+        ticket.assigned_to = _user(db, entry['assigned_to'])
+    return ticket
+
+
+def _load(pk):
+    # Read from the primary: a lagging replica could otherwise store an old
+    # copy under the version that was just bumped.
+    with use_primary():
+        return ticket_queryset(pk).select_related('created_by', 'assigned_to').get(pk=pk)
+
+
+def get_ticket(pk):
+    """Return the Ticket ``pk`` with ``created_by`` and ``assigned_to`` loaded.
+
+    Raises ``Ticket.DoesNotExist`` like ``QuerySet.get()``. Every call returns
+    a new instance, so callers may modify and save it.
+    """
+    if not settings.TICKET_CACHE:
+        return ticket_queryset(pk).select_related('created_by', 'assigned_to').get(pk=pk)
+
+    version = _current_version(pk)
+    cached = local.get(pk)
+    if cached is not None and cached[0] == version:
+        metrics.incr('ticket_cache_lookups_total', result='local_hit')
+        return _build(cached[1])
+
+    entry = cache.get(_entry_key(pk, version))
+    if entry is not None:
+        metrics.incr('ticket_cache_lookups_total', result='shared_hit')
+    else:
+        metrics.incr('ticket_cache_lookups_total', result='miss')
+        ticket = _load(pk)
+        entry = _entry(ticket)
+        cache.set(_entry_key(pk, version), entry, timeout=settings.TICKET_CACHE_TIMEOUT)
+    local.set(pk, (version, entry))
+    return _build(entry)
+
+
+def invalidate(pk):
+    local.discard(pk)
+    _bump(_version_key(pk))
+
+
+def invalidate_all():
+    """Make every cached ticket stale, after an UPDATE that bypassed the save signals."""
+    _bump(USERS_KEY)
+
+
+def hit_ratio():
+    hits = (metrics.value('ticket_cache_lookups_total', result='local_hit')
+            + metrics.value('ticket_cache_lookups_total', result='shared_hit'))
+    total = hits + metrics.value('ticket_cache_lookups_total', result='miss')
+    return hits / total if total else 0.0
+
+
+metrics.register_gauge('ticket_cache_hit_ratio', hit_ratio)
+metrics.register_gauge('ticket_cache_local_entries', lambda: len(local))
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(sender, instance, using=None, **kwargs):
+    if settings.TICKET_CACHE:
+        pk = instance.pk
+        transaction.on_commit(lambda: invalidate(pk), using=using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, update_fields=None, using=None, **kwargs):
+    if not settings.TICKET_CACHE or created:
+        return
+    if update_fields is not None and set(update_fields) <= IGNORED_USER_FIELDS:
+        return
+    transaction.on_commit(lambda: _bump(USERS_KEY), using=using)
+
+
+@register()
+def check_ticket_cache(app_configs, **kwargs):
+    errors = []
+    if settings.TICKET_CACHE and settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        errors.append(Warning(
+            'TICKET_CACHE is using a per-process cache.',
+            hint='With several workers a ticket update only invalidates the copies in one of them; '
+                 'set CACHE_BACKEND to a shared cache such as Redis or Memcached.',
+            id='tickets.W002',
+        ))
+    return errors
@@ -1,16 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from django_ratelimit.decorators import ratelimit
-from . import views
+from . import async_views, metrics, views
+from .ratelimit import rate_limit
+
+# ASYNC_VIEWS swaps in the async versions of the hot read views.
+hot_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('register/', views.register, name='register'),
-    path('login/', ratelimit(key='ip', rate='5/m', block=True)(auth_views.LoginView.as_view()), name='login'),
+    path('login/', rate_limit('login', key='ip')(auth_views.LoginView.as_view()), name='login'),
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', hot_views.dashboard, name='dashboard'),
     path('tickets/', views.ticket_list, name='ticket_list'),
     path('tickets/create/', views.ticket_create, name='ticket_create'),
-    path('tickets/<uuid:pk>/', views.ticket_detail, name='ticket_detail'),
+    path('tickets/<uuid:pk>/', hot_views.ticket_detail, name='ticket_detail'),
     path('tickets/<uuid:pk>/assign-self/', views.ticket_assign_self, name='ticket_assign_self'),
+    path('tickets/<uuid:pk>/events/', async_views.ticket_events, name='ticket_events'),
+    path('events/queue/', async_views.queue_events, name='queue_events'),
+    path('metrics/', metrics.metrics, name='metrics'),
 ]
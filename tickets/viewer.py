@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+
+from .models import Profile
+
+ROLE_LABELS = dict(Profile.ROLE_CHOICES)
+
+
+@dataclass(frozen=True)
+class Viewer:
+    """Cheap, immutable summary of who is making the request.
+
+    Available as ``request.viewer`` (see ``ViewerMiddleware``). Views and
+    decorators use it for role checks instead of ``request.user.profile``.
+    """
+
+    user_id: int = None
+    username: str = ''
+    role: str = ''
+    is_authenticated: bool = False
+
+    @property
+    def is_employee(self):
+        return self.role == 'employee'
+
+    @property
+    def role_display(self):
+        return ROLE_LABELS.get(self.role, '')
+
+    @classmethod
+    def from_user(cls, user):
+        if not user.is_authenticated:
+            return ANONYMOUS
+        try:
+            role = user.profile.role
+        except Profile.DoesNotExist:
+            role = 'user'
+        return cls(user_id=user.pk, username=user.get_username(), role=role, is_authenticated=True)
+
+
+ANONYMOUS = Viewer()
@@ -1,32 +1,51 @@
+import hashlib
 import logging
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib.auth import login
 from django.contrib import messages
+from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.db.models import Q, Count
-from django_ratelimit.decorators import ratelimit
-from .models import Ticket, Comment, Attachment
+from django.db import router, transaction
+from django.db.models import Q, Count, Max
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from .models import Ticket, Comment, Attachment, ArchivedTicket
 from .forms import RegistrationForm, TicketCreateForm, TicketUpdateForm, CommentForm
 from .decorators import employee_required
 from .emails import send_comment_notification
+from .log import event
+from .ratelimit import check_rate, rate_limit
+from .sqlite import write_transaction
+from . import ticket_cache
+from .sharding import aggregate, gather, scatter, ticket_queryset
+from .singleflight import flight
 
 logger = logging.getLogger(__name__)
 
 
 def _save_attachments(files, uploaded_by, ticket=None, comment=None):
-    """Helper function to save multiple attachments."""
+    """Helper function to save multiple attachments.
+
+    Each file is written to storage first; only its row is inserted under
+    the write lock.
+    """
     for file in files:
         if file:
-            Attachment.objects.create(
+            attachment = Attachment(
                 ticket=ticket,
                 comment=comment,
-                file=file,
                 original_filename=file.name,
                 file_size=file.size,
                 uploaded_by=uploaded_by
             )
+            attachment.file.save(file.name, file, save=False)
+            # Instance save (not objects.create) so the shard router sees the
+            # parent ticket/comment.
+            with write_transaction(using=router.db_for_write(Attachment, instance=attachment)):
+                attachment.save()
 
 
 def home(request):
@@ -35,16 +54,18 @@ def home(request):
     return render(request, 'home.html')
 
 
-@ratelimit(key='ip', rate='5/m', block=True)
+@rate_limit('register', key='ip')
 def register(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
     if request.method == 'POST':
         form = RegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            login(request, user)
-            logger.info(f'New user registered: {user.username} (Role: {user.profile.get_role_display()})')
+            with write_transaction():
+                user = form.save()
+            login(request, user, backend='tickets.backends.ProfileModelBackend')
+            logger.info('New user registered: %s (Role: %s)', user.username, user.profile.get_role_display(),
+                        extra=event(request, 'register'))
             messages.success(request, f'Welcome {user.username}! Your account has been created.')
             return redirect('dashboard')
     else:
@@ -52,104 +73,183 @@ def register(request):
     return render(request, 'registration/register.html', {'form': form})
 
 
-@login_required
-def dashboard(request):
-    user = request.user
-    is_employee = user.profile.is_employee
+def ticket_stats(querysets):
+    """Status counts for the dashboard cards, summed over ``querysets``."""
+    # Counting status rather than id lets SQLite read only the status index.
+    return aggregate(
+        querysets,
+        total=Count('status'),
+        open=Count('status', filter=Q(status='open')),
+        in_progress=Count('status', filter=Q(status='in_progress')),
+        waiting_on_asker=Count('status', filter=Q(status='waiting_on_asker')),
+        resolved=Count('status', filter=Q(status='resolved')),
+    )
 
+
+def dashboard_queries(user, is_employee):
+    """Return the dashboard's independent queries as ``{context name: callable}``.
+
+    Each callable runs one query and returns its evaluated result, so the
+    async dashboard can run them concurrently.
+    """
     if is_employee:
-        # Employee dashboard: all tickets + unassigned
-        tickets = Ticket.objects.select_related('created_by', 'assigned_to').all()[:10]
-        unassigned_tickets = Ticket.objects.select_related('created_by').filter(assigned_to__isnull=True)[:5]
-        my_assigned = Ticket.objects.select_related('created_by').filter(assigned_to=user)[:5]
-
-        stats = Ticket.objects.aggregate(
-            total=Count('id'),
-            open=Count('id', filter=Q(status='open')),
-            in_progress=Count('id', filter=Q(status='in_progress')),
-            waiting_on_asker=Count('id', filter=Q(status='waiting_on_asker')),
-            resolved=Count('id', filter=Q(status='resolved')),
-        )
-
-        context = {
-            'is_employee': True,
-            'tickets': tickets,
-            'unassigned_tickets': unassigned_tickets,
-            'my_assigned': my_assigned,
-            'stats': stats,
-        }
-    else:
-        # Regular user dashboard: own tickets
-        tickets = Ticket.objects.filter(created_by=user)
-
-        stats = tickets.aggregate(
-            total=Count('id'),
-            open=Count('id', filter=Q(status='open')),
-            in_progress=Count('id', filter=Q(status='in_progress')),
-            waiting_on_asker=Count('id', filter=Q(status='waiting_on_asker')),
-            resolved=Count('id', filter=Q(status='resolved')),
-        )
-
-        context = {
-            'is_employee': False,
-            'tickets': tickets,
-            'stats': stats,
+        # Employee dashboard: all tickets + unassigned. The three global
+        # queries are identical for every employee, so concurrent requests
+        # share one computation.
+        return {
+            'tickets': lambda: flight.do('dashboard:recent', lambda: list(gather(scatter(
+                Ticket.objects.select_related('created_by', 'assigned_to').all()))[:10])),
+            'unassigned_tickets': lambda: flight.do('dashboard:unassigned', lambda: list(gather(scatter(
+                Ticket.objects.select_related('created_by').filter(assigned_to__isnull=True)))[:5])),
+            'my_assigned': lambda: list(gather(scatter(
+                Ticket.objects.select_related('created_by').filter(assigned_to=user)))[:5]),
+            'stats': lambda: flight.do('dashboard:stats', lambda: ticket_stats(scatter(Ticket.objects.all()))),
         }
+    # Regular user dashboard: own tickets
+    querysets = scatter(Ticket.objects.filter(created_by=user))
+    return {
+        'tickets': lambda: list(gather(querysets)),
+        'stats': lambda: ticket_stats(querysets),
+    }
+
 
+@login_required
+def dashboard(request):
+    is_employee = request.viewer.is_employee
+    context = {name: query() for name, query in dashboard_queries(request.user, is_employee).items()}
+    context['is_employee'] = is_employee
     return render(request, 'tickets/dashboard.html', context)
 
 
 @login_required
 def ticket_list(request):
     user = request.user
-    is_employee = user.profile.is_employee
+    is_employee = request.viewer.is_employee
 
-    # Base queryset
-    if is_employee:
-        tickets = Ticket.objects.select_related('created_by', 'assigned_to').all()
-    else:
-        tickets = Ticket.objects.select_related('created_by', 'assigned_to').filter(created_by=user)
-
-    # Filtering
     status_filter = request.GET.get('status')
     priority_filter = request.GET.get('priority')
+    include_archived = request.GET.get('archived') == '1'
 
-    if status_filter:
-        tickets = tickets.filter(status=status_filter)
-    if priority_filter:
-        tickets = tickets.filter(priority=priority_filter)
-
-    # Pagination
-    paginator = Paginator(tickets, 20)
-    page_obj = paginator.get_page(request.GET.get('page'))
-
+    querysets = ticket_list_querysets(user, is_employee, status_filter, priority_filter, include_archived)
     context = {
-        'tickets': page_obj,
-        'page_obj': page_obj,
         'is_employee': is_employee,
         'status_filter': status_filter,
         'priority_filter': priority_filter,
+        'include_archived': include_archived,
         'status_choices': Ticket.STATUS_CHOICES,
         'priority_choices': Ticket.PRIORITY_CHOICES,
     }
 
-    return render(request, 'tickets/ticket_list.html', context)
+    if _wants_fragment(request):
+        response = _ticket_list_fragment(request, querysets, context)
+    else:
+        context['tickets'] = context['page_obj'] = _ticket_page(request, querysets)
+        response = render(request, 'tickets/ticket_list.html', context)
+    # The same URL serves the full page and, with HX-Request, the fragment.
+    patch_vary_headers(response, ['HX-Request'])
+    return response
+
+
+def ticket_list_querysets(user, is_employee, status_filter=None, priority_filter=None, include_archived=False):
+    """The ticket list's querysets, one per shard (and per archive table when included)."""
+    querysets = []
+    for model in (Ticket, ArchivedTicket) if include_archived else (Ticket,):
+        # Base queryset
+        if is_employee:
+            tickets = model.objects.select_related('created_by', 'assigned_to').all()
+        else:
+            tickets = model.objects.select_related('created_by', 'assigned_to').filter(created_by=user)
+
+        # Filtering
+        if status_filter:
+            tickets = tickets.filter(status=status_filter)
+        if priority_filter:
+            tickets = tickets.filter(priority=priority_filter)
+
+        querysets += scatter(tickets)
+    return querysets
+
+
+TICKET_LIST_PAGE_SIZE = 20
+# Fragments are also invalidated by any change to the matching tickets (see
+# _ticket_list_version); the timeout bounds staleness of related data such as
+# usernames.
+TICKET_LIST_FRAGMENT_TIMEOUT = 300
+
+
+def _wants_fragment(request):
+    return request.headers.get('HX-Request') == 'true' or request.GET.get('fragment') == '1'
+
+
+def _ticket_page(request, querysets, count=None):
+    paginator = Paginator(gather(querysets), TICKET_LIST_PAGE_SIZE)
+    if count is not None:
+        # Already known; saves the COUNT query.
+        paginator.count = count
+    return paginator.get_page(request.GET.get('page'))
+
+
+def _ticket_list_version(querysets):
+    """Return ``(count, newest updated_at)`` over ``querysets``.
+
+    Creating, editing or deleting a matching ticket changes one of the two,
+    which is all a cached page of the list depends on.
+    """
+    count, latest = 0, None
+    for queryset in querysets:
+        # Both read from the updated_at index alone.
+        row = queryset.aggregate(count=Count('updated_at'), latest=Max('updated_at'))
+        count += row['count']
+        if row['latest'] and (latest is None or row['latest'] > latest):
+            latest = row['latest']
+    return count, latest
+
+
+def _ticket_list_fragment(request, querysets, context):
+    """Render just the results table and pagination, cached per filter combination.
+
+    The ETag covers the viewer's scope (all tickets for employees, their own
+    for users), the filters, the page and the list version, so unchanged
+    results cost one aggregate query and a 304.
+    """
+    count, latest = _ticket_list_version(querysets)
+    scope = 'employee' if context['is_employee'] else f'user:{request.user.pk}'
+    key = repr((scope, context['status_filter'], context['priority_filter'], context['include_archived'],
+                request.GET.get('page'), count, latest))
+    etag = f'"{hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache_key = f'ticket_list_fragment:{etag}'
+        content = cache.get(cache_key)
+        if content is None:
+            context['tickets'] = context['page_obj'] = _ticket_page(request, querysets, count)
+            content = render_to_string('tickets/ticket_list_results.html', context, request)
+            cache.set(cache_key, content, TICKET_LIST_FRAGMENT_TIMEOUT)
+        response = HttpResponse(content)
+    response['ETag'] = etag
+    # Per-user data: browsers may keep it but must revalidate every time.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
+@rate_limit('ticket_create')
 def ticket_create(request):
     if request.method == 'POST':
         form = TicketCreateForm(request.POST, request.FILES)
         if form.is_valid():
             ticket = form.save(commit=False)
             ticket.created_by = request.user
-            ticket.save()
+            with write_transaction(using=router.db_for_write(Ticket, instance=ticket)):
+                ticket.save()
 
             # Save attachments
             files = request.FILES.getlist('attachments')
             _save_attachments(files, request.user, ticket=ticket)
 
-            logger.info(f'Ticket created: "{ticket.title}" by {request.user.username} (Priority: {ticket.get_priority_display()})')
+            logger.info('Ticket created: "%s" by %s (Priority: %s)', ticket.title, request.user.username,
+                        ticket.get_priority_display(), extra=event(request, 'ticket_create', ticket))
             messages.success(request, f'Ticket "{ticket.title}" created successfully!')
             return redirect('ticket_detail', pk=ticket.id)
     else:
@@ -158,16 +258,62 @@ def ticket_create(request):
     return render(request, 'tickets/ticket_create.html', {'form': form})
 
 
+def ticket_comments(ticket, is_employee):
+    """Comments visible to the viewer, with authors and attachments prefetched."""
+    # Filter comments based on user role and prefetch attachments
+    comments = ticket.comments.select_related('author').prefetch_related('attachments')
+    if not is_employee:
+        comments = comments.filter(is_internal=False)
+    return comments
+
+
+def can_view_ticket(ticket, user, is_employee):
+    """Users can only view their own tickets; employees can view every ticket."""
+    return is_employee or ticket.created_by_id == user.pk
+
+
+def deny_ticket(request):
+    messages.error(request, 'You can only view your own tickets.')
+    return redirect('dashboard')
+
+
+def ticket_detail_queries(ticket, is_employee):
+    """Return the ticket page's independent queries as ``{context name: callable}``.
+
+    Like ``dashboard_queries``: the async view runs them concurrently.
+    """
+    return {
+        'comments': lambda: list(ticket_comments(ticket, is_employee)),
+        'ticket_attachments': lambda: list(ticket.attachments.all()),
+    }
+
+
+def ticket_detail_context(ticket, is_employee, results):
+    """The ticket page's context, given the results of ``ticket_detail_queries``."""
+    return {
+        **results,
+        'ticket': ticket,
+        'is_employee': is_employee,
+        'update_form': TicketUpdateForm(instance=ticket) if is_employee else None,
+        'comment_form': CommentForm(is_employee=is_employee),
+    }
+
+
 @login_required
 def ticket_detail(request, pk):
-    ticket = get_object_or_404(Ticket, pk=pk)
+    try:
+        if request.method == 'POST':
+            # Updates always start from the database row, never a cached copy.
+            ticket = ticket_queryset(pk).select_related('created_by', 'assigned_to').get(pk=pk)
+        else:
+            ticket = ticket_cache.get_ticket(pk)
+    except Ticket.DoesNotExist:
+        return _archived_ticket_detail(request, pk)
     user = request.user
-    is_employee = user.profile.is_employee
+    is_employee = request.viewer.is_employee
 
-    # Access control: users can only view their own tickets
-    if not is_employee and ticket.created_by != user:
-        messages.error(request, 'You can only view your own tickets.')
-        return redirect('dashboard')
+    if not can_view_ticket(ticket, user, is_employee):
+        return deny_ticket(request)
 
     # Handle forms
     if request.method == 'POST':
@@ -177,12 +323,15 @@ def ticket_detail(request, pk):
                 old_status = ticket.status
                 old_priority = ticket.priority
                 old_assigned = ticket.assigned_to
-                updated_ticket = update_form.save()
-                ticket.refresh_from_db()
-                logger.info(f'Ticket updated: "{ticket.title}" by {user.username} (Status: {old_status}->{ticket.status}, Priority: {old_priority}->{ticket.priority}, Assigned: {old_assigned}->{ticket.assigned_to})')
+                with write_transaction(using=ticket._state.db):
+                    update_form.save()
+                logger.info('Ticket updated: "%s" by %s (Status: %s->%s, Priority: %s->%s, Assigned: %s->%s)',
+                            ticket.title, user.username, old_status, ticket.status, old_priority, ticket.priority,
+                            old_assigned, ticket.assigned_to, extra=event(request, 'ticket_update', ticket))
                 messages.success(request, 'Ticket updated successfully!')
                 return redirect('ticket_detail', pk=pk)
         elif 'add_comment' in request.POST:
+            check_rate(request, 'comment')
             comment_form = CommentForm(request.POST, request.FILES, is_employee=is_employee)
             if comment_form.is_valid():
                 comment = comment_form.save(commit=False)
@@ -191,46 +340,60 @@ def ticket_detail(request, pk):
                 # Ensure only employees can create internal comments
                 if not is_employee:
                     comment.is_internal = False
-                comment.save()
+                # Automatically change status from "Waiting on Asker" to "In Progress"
+                # when the ticket creator adds a comment
+                reopen = user == ticket.created_by and ticket.status == 'waiting_on_asker'
+                with write_transaction(using=ticket._state.db):
+                    comment.save()
+                    if reopen:
+                        ticket.status = 'in_progress'
+                        ticket.save()
+                if reopen:
+                    logger.info('Ticket "%s" status automatically changed from %s to %s after comment by asker',
+                                ticket.title, 'waiting_on_asker', ticket.status,
+                                extra=event(request, 'ticket_reopen', ticket))
 
                 # Save attachments
                 files = request.FILES.getlist('attachments')
                 _save_attachments(files, user, comment=comment)
 
-                # Automatically change status from "Waiting on Asker" to "In Progress"
-                # when the ticket creator adds a comment
-                if user == ticket.created_by and ticket.status == 'waiting_on_asker':
-                    old_status = ticket.status
-                    ticket.status = 'in_progress'
-                    ticket.save()
-                    logger.info(f'Ticket "{ticket.title}" status automatically changed from {old_status} to {ticket.status} after comment by asker')
-
-                comment_type = "internal" if comment.is_internal else "public"
-                logger.info(f'{comment_type.capitalize()} comment added to ticket "{ticket.title}" by {user.username}')
+                comment_type = "Internal" if comment.is_internal else "Public"
+                logger.info('%s comment added to ticket "%s" by %s', comment_type, ticket.title, user.username,
+                            extra=event(request, 'comment_add', ticket))
                 messages.success(request, 'Comment added successfully!')
-                send_comment_notification(comment, ticket)
+                # Outside the write lock: a slow mail server must not hold up other writers.
+                transaction.on_commit(lambda: send_comment_notification(comment, ticket))
                 return redirect('ticket_detail', pk=pk)
 
-    # Initialize forms for GET request
-    update_form = TicketUpdateForm(instance=ticket) if is_employee else None
-    comment_form = CommentForm(is_employee=is_employee)
+    results = {name: query() for name, query in ticket_detail_queries(ticket, is_employee).items()}
+    return render(request, 'tickets/ticket_detail.html', ticket_detail_context(ticket, is_employee, results))
 
-    # Filter comments based on user role and prefetch attachments
-    if is_employee:
-        comments = ticket.comments.select_related('author').prefetch_related('attachments')
-    else:
-        comments = ticket.comments.select_related('author').prefetch_related('attachments').filter(is_internal=False)
 
-    # Get ticket attachments
-    ticket_attachments = ticket.attachments.all()
+def _archived_ticket_detail(request, pk):
+    """Read-only view of a ticket that has been moved to the archive tables."""
+    ticket = get_object_or_404(ticket_queryset(pk, model=ArchivedTicket).select_related('created_by', 'assigned_to'), pk=pk)
+    user = request.user
+    is_employee = request.viewer.is_employee
+
+    if not is_employee and ticket.created_by_id != user.pk:
+        messages.error(request, 'You can only view your own tickets.')
+        return redirect('dashboard')
+
+    if request.method == 'POST':
+        messages.error(request, 'This ticket is archived and can no longer be changed.')
+        return redirect('ticket_detail', pk=pk)
+
+    comments = ticket.comments.select_related('author').prefetch_related('attachments')
+    if not is_employee:
+        comments = comments.filter(is_internal=False)
 
     context = {
         'ticket': ticket,
         'is_employee': is_employee,
-        'update_form': update_form,
-        'comment_form': comment_form,
+        'update_form': None,
+        'comment_form': None,
         'comments': comments,
-        'ticket_attachments': ticket_attachments,
+        'ticket_attachments': ticket.attachments.all(),
     }
 
     return render(request, 'tickets/ticket_detail.html', context)
@@ -239,11 +402,14 @@ def ticket_detail(request, pk):
 @employee_required
 @require_POST
 def ticket_assign_self(request, pk):
-    ticket = get_object_or_404(Ticket, pk=pk)
-    ticket.assigned_to = request.user
-    if ticket.status == 'open':
-        ticket.status = 'in_progress'
-    ticket.save()
-    logger.info(f'Ticket "{ticket.title}" assigned to {request.user.username}')
+    queryset = ticket_queryset(pk)
+    with write_transaction(using=queryset.db):
+        ticket = get_object_or_404(queryset, pk=pk)
+        ticket.assigned_to = request.user
+        if ticket.status == 'open':
+            ticket.status = 'in_progress'
+        ticket.save()
+    logger.info('Ticket "%s" assigned to %s', ticket.title, request.user.username,
+                extra=event(request, 'ticket_assign_self', ticket))
     messages.success(request, f'Ticket "{ticket.title}" assigned to you!')
     return redirect('ticket_detail', pk=pk)
@@ -0,0 +1,155 @@
+"""Worker warmup (``WARMUP``).
+
+A fresh worker pays several one-off costs on its first requests: building
+the URL resolvers, compiling templates into the cached loader, and loading
+the translation catalogs and the form widget templates. ``run`` pays them
+up front. Under gunicorn it runs before each worker accepts requests, or
+once in the master before forking when the app is preloaded, so workers
+start with the work already done (see ``gunicorn.conf.py``). ``manage.py
+warmup`` runs it by hand and reports where startup import time goes.
+
+Database connections are left alone: Django keeps one per thread, and
+requests are served on other threads than the one running the warmup.
+"""
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import Resolver404, get_resolver, resolve
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+# Paths resolved during warmup, one per hot view.
+WARM_PATHS = ('/', '/dashboard/', '/tickets/', '/tickets/create/', '/login/', '/admin/')
+# Roughly what a worker imports before serving its first request.
+IMPORT_PROBE = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def warm_urls():
+    resolver = get_resolver()
+    resolver.url_patterns  # imports every view module
+    resolver.reverse_dict  # builds the reverse lookup tables
+    for path in WARM_PATHS:
+        try:
+            resolve(path)
+        except Resolver404:
+            pass
+    return len(resolver.reverse_dict)
+
+
+def project_templates():
+    """Yield ``(engine, name)`` for every template under the project's own directories."""
+    base = Path(settings.BASE_DIR).resolve()
+    for engine in engines.all():
+        for directory in map(Path, engine.template_dirs):
+            directory = directory.resolve()
+            if not directory.is_relative_to(base) or not directory.is_dir():
+                continue
+            for path in sorted(directory.rglob('*.html')):
+                yield engine, path.relative_to(directory).as_posix()
+
+
+def warm_templates():
+    count = 0
+    for engine, name in project_templates():
+        engine.get_template(name)  # compiled and kept by the cached loader
+        count += 1
+    return count
+
+
+def warm_forms():
+    """Render each form once, compiling Django's widget templates."""
+    from .forms import CommentForm, RegistrationForm, TicketCreateForm, TicketUpdateForm
+
+    forms = (RegistrationForm(), TicketCreateForm(), CommentForm(is_employee=True), TicketUpdateForm())
+    for form in forms:
+        str(form)
+    return len(forms)
+
+
+def warm_translations():
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext('Tickets')
+    translation.deactivate()
+    return 1
+
+
+def warm_caches():
+    """Compute the shared dashboard results, if they are kept (SINGLEFLIGHT_STALE_SECONDS)."""
+    if not settings.SINGLEFLIGHT_STALE_SECONDS:
+        return 0
+    from .views import dashboard_queries
+
+    queries = dashboard_queries(None, is_employee=True)
+    for name in ('tickets', 'unassigned_tickets', 'stats'):
+        queries[name]()
+    return 3
+
+
+STEPS = (
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('forms', warm_forms),
+    ('translations', warm_translations),
+    ('caches', warm_caches),
+)
+
+
+def run(pre_fork=False):
+    """Run every warmup step; return ``[(step, items, seconds)]``.
+
+    With ``pre_fork`` the database connections the steps opened are closed
+    afterwards, since forked workers must not share them.
+    """
+    results = []
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            items = step()
+        except Exception:
+            # A warmup problem must never stop a worker from starting.
+            logger.exception('Warmup step %s failed', name)
+            items = None
+        results.append((name, items, time.perf_counter() - started))
+    if pre_fork:
+        connections.close_all()
+    logger.info('Warmup done in %.0f ms (%s)', sum(seconds for _, _, seconds in results) * 1000,
+                ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, _, seconds in results))
+    return results
+
+
+def import_times(probe=IMPORT_PROBE):
+    """Import the app in a fresh interpreter with ``-X importtime``.
+
+    Returns ``(total, packages, modules)``: total microseconds, self time
+    summed per top-level package, and each module's cumulative time.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    packages, modules, total = {}, {}, 0
+    for line in result.stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if not match:
+            continue
+        own, cumulative, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0) + own
+        modules[module] = cumulative
+        if len(indent) == 1:
+            total += cumulative
+    return total, packages, modules